@@ -13,8 +13,11 @@ from app import CreatorRequest
 from app import Subscription
 from app import Purchase
 from app import Cashout
+from app import WebhookEvent
+from app import LedgerEntry
+from app import UploadBlob
 
-models = [User, CreatorRequest, Subscription, Purchase, Cashout]
+models = [User, CreatorRequest, Subscription, Purchase, Cashout, WebhookEvent, LedgerEntry, UploadBlob]
 
 for model in models:
     print(f"Recognized {model.__name__} Model")
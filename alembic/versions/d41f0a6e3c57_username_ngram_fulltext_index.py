@@ -0,0 +1,30 @@
+"""username ngram fulltext index
+
+Revision ID: d41f0a6e3c57
+Revises: 7c2e91d4b8a3
+Create Date: 2026-10-17 10:03:54.118630
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41f0a6e3c57'
+down_revision: Union[str, None] = '7c2e91d4b8a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The "ngram" parser throws away every token that CONTAINS a stopword, and the default InnoDB stopword list has single
+    # letters like "a" and "i" in it. So we turn stopwords off for this session before building the index, otherwise a
+    # search for "ab" would never match anything.
+    op.execute('SET SESSION innodb_ft_enable_stopword = 0')
+    op.create_index('ix_users_username_fulltext', 'users', ['username'], unique=False, mysql_prefix='FULLTEXT', mysql_with_parser='ngram')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_users_username_fulltext', table_name='users')
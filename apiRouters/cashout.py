@@ -13,12 +13,12 @@ from pydanticModels.cashout import CreateCashoutBody, UpdateCashoutBody
 from middleware.authentication import Authentication, authentication
     
 @cashout_router.get("/")
-async def handleGetAllUserCashouts(username: str = '', page: int = 1, limit: int = 10, databaseInformation: DatabaseInformation = Depends(getDatabaseInformation), authentication: Authentication = Depends(authentication(['ADMIN']))):
-    return await getAllCashouts(username, page, limit, databaseInformation, authentication)
+async def handleGetAllUserCashouts(username: str = '', page: int = 1, limit: int = 10, cursor: str = '', databaseInformation: DatabaseInformation = Depends(getDatabaseInformation), authentication: Authentication = Depends(authentication(['ADMIN']))):
+    return await getAllCashouts(username, page, limit, cursor, databaseInformation, authentication)
 
 @cashout_router.get("/personal")
-async def handleGetAllUserCashouts(page: int = 1, limit: int = 10, databaseInformation: DatabaseInformation = Depends(getDatabaseInformation), authentication: Authentication = Depends(authentication(['CREATOR']))):
-    return await getAllUserCashouts(page, limit, databaseInformation, authentication)
+async def handleGetAllUserCashouts(page: int = 1, limit: int = 10, cursor: str = '', databaseInformation: DatabaseInformation = Depends(getDatabaseInformation), authentication: Authentication = Depends(authentication(['CREATOR']))):
+    return await getAllUserCashouts(page, limit, cursor, databaseInformation, authentication)
 
 @cashout_router.post("/")
 async def handleCreateCashout(createCashoutBody: CreateCashoutBody = Form(), databaseInformation: DatabaseInformation = Depends(getDatabaseInformation), authentication: Authentication = Depends(authentication(['CREATOR']))):
@@ -13,8 +13,8 @@ from utils.getDatabaseInformation import DatabaseInformation, getDatabaseInforma
 from pydanticModels.creator_request import CreateCreatorRequestBody, UpdateCreatorRequestBody
 
 @creator_request_router.get("/")
-async def handleGetAllCreatorRequests(username: str = '', status: str = '', page: int = 1, limit: int = 10, databaseInformation: DatabaseInformation = Depends(getDatabaseInformation), authentication: Authentication = Depends(authentication(['ADMIN']))):
-    return await getAllCreatorRequests(username, status, page, limit, databaseInformation, authentication)
+async def handleGetAllCreatorRequests(username: str = '', status: str = '', page: int = 1, limit: int = 10, cursor: str = '', databaseInformation: DatabaseInformation = Depends(getDatabaseInformation), authentication: Authentication = Depends(authentication(['ADMIN']))):
+    return await getAllCreatorRequests(username, status, page, limit, cursor, databaseInformation, authentication)
 
 # To check if the user is authenticated we will use the "authentication" middleware function. 
 # And it will automatically throw an error and prevent the user from accessing this route if
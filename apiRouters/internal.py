@@ -0,0 +1,41 @@
+from fastapi import APIRouter
+
+# Routes that are only meant for us (the people running the application) and not the frontend.
+internal_router = APIRouter(
+    prefix = "/api/v1/internal",
+    tags = ["Internal"]
+)
+
+from controllers.internal import getPoolStatistics, getTokenCacheStatistics, getEmailOutboxStatistics, getSideEffectStatistics, getStaticFilesStatistics, getResponseCacheStatistics, getWebhookQueueStatistics
+
+from fastapi import Depends
+from utils.getDatabaseInformation import DatabaseInformation, getDatabaseInformation
+from middleware.authentication import Authentication, authentication
+
+@internal_router.get("/pool")
+async def handleGetPoolStatistics(authentication: Authentication = Depends(authentication(['ADMIN']))):
+    return await getPoolStatistics(authentication)
+
+@internal_router.get("/token-cache")
+async def handleGetTokenCacheStatistics(authentication: Authentication = Depends(authentication(['ADMIN']))):
+    return await getTokenCacheStatistics(authentication)
+
+@internal_router.get("/email-outbox")
+async def handleGetEmailOutboxStatistics(authentication: Authentication = Depends(authentication(['ADMIN']))):
+    return await getEmailOutboxStatistics(authentication)
+
+@internal_router.get("/side-effects")
+async def handleGetSideEffectStatistics(authentication: Authentication = Depends(authentication(['ADMIN']))):
+    return await getSideEffectStatistics(authentication)
+
+@internal_router.get("/static")
+async def handleGetStaticFilesStatistics(authentication: Authentication = Depends(authentication(['ADMIN']))):
+    return await getStaticFilesStatistics(authentication)
+
+@internal_router.get("/response-cache")
+async def handleGetResponseCacheStatistics(authentication: Authentication = Depends(authentication(['ADMIN']))):
+    return await getResponseCacheStatistics(authentication)
+
+@internal_router.get("/webhook-events")
+async def handleGetWebhookQueueStatistics(databaseInformation: DatabaseInformation = Depends(getDatabaseInformation), authentication: Authentication = Depends(authentication(['ADMIN']))):
+    return await getWebhookQueueStatistics(databaseInformation, authentication)
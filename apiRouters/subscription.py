@@ -5,7 +5,7 @@ subscription_router = APIRouter(
     tags = ["Subscription"]
 )
 
-from controllers.subscription import getAllSubscriptions, createSubscription, updateSubscription, deleteSubscription
+from controllers.subscription import getAllSubscriptions, createSubscription, updateSubscription, deleteSubscription, getSubscriptionDeletionProgress
 
 from fastapi import Depends, Form
 from utils.getDatabaseInformation import DatabaseInformation, getDatabaseInformation
@@ -13,8 +13,8 @@ from middleware.authentication import Authentication, authentication
 from pydanticModels.subscription import CreateSubscriptionBody, UpdateSubscriptionBody
 
 @subscription_router.get("/")
-async def handleGetAllSubscriptions(username: str = '', page: int = 1, limit: int = 10, databaseInformation: DatabaseInformation = Depends(getDatabaseInformation)):
-    return await getAllSubscriptions(username, page, limit, databaseInformation)
+async def handleGetAllSubscriptions(username: str = '', page: int = 1, limit: int = 10, cursor: str = '', databaseInformation: DatabaseInformation = Depends(getDatabaseInformation)):
+    return await getAllSubscriptions(username, page, limit, cursor, databaseInformation)
 
 @subscription_router.post("/")
 async def handleCreateSubscription(createSubscriptionBody: CreateSubscriptionBody = Form(), databaseInformation: DatabaseInformation = Depends(getDatabaseInformation), authentication: Authentication = Depends(authentication(['CREATOR']))):
@@ -26,4 +26,8 @@ async def handleUpdateSubscription(subscription_id: str, updateSubscriptionBody:
 
 @subscription_router.delete("/{subscription_id}")
 async def handleDeleteSubscription(subscription_id: str, databaseInformation: DatabaseInformation = Depends(getDatabaseInformation), authentication: Authentication = Depends(authentication(['CREATOR']))):
-    return await deleteSubscription(subscription_id, databaseInformation, authentication)
\ No newline at end of file
+    return await deleteSubscription(subscription_id, databaseInformation, authentication)
+
+@subscription_router.get("/{subscription_id}/deletion")
+async def handleGetSubscriptionDeletionProgress(subscription_id: str, databaseInformation: DatabaseInformation = Depends(getDatabaseInformation), authentication: Authentication = Depends(authentication(['CREATOR']))):
+    return await getSubscriptionDeletionProgress(subscription_id, databaseInformation, authentication)
\ No newline at end of file
@@ -5,21 +5,25 @@ user_router = APIRouter(
     tags = ["User"]
 )
 
-from controllers.user import getAllUsers, showCurrentUser, updateUser
+from controllers.user import getAllUsers, showCurrentUser, updateUser, getCreatorProfile
 
-from fastapi import Depends, Form
+from fastapi import Depends, Form, Request
 from utils.getDatabaseInformation import DatabaseInformation, getDatabaseInformation
 from middleware.authentication import Authentication, authentication
 from pydanticModels.user import UpdateUserBody
 
 @user_router.get("/")
-async def handleGetAllUsers(username: str = '', limit: int = 10, page: int = 1, databaseInformation: DatabaseInformation = Depends(getDatabaseInformation)):
-    return await getAllUsers(username, limit, page, databaseInformation)
+async def handleGetAllUsers(username: str = '', limit: int = 10, page: int = 1, cursor: str = '', databaseInformation: DatabaseInformation = Depends(getDatabaseInformation)):
+    return await getAllUsers(username, limit, page, cursor, databaseInformation)
 
 @user_router.get("/showCurrentUser")
 async def handleShowCurrentUser(databaseInformation: DatabaseInformation = Depends(getDatabaseInformation), authentication: Authentication = Depends(authentication(['USER', 'CREATOR', 'ADMIN']))):
     return await showCurrentUser(databaseInformation, authentication)
 
+@user_router.get("/{username}/profile")
+async def handleGetCreatorProfile(username: str, request: Request, databaseInformation: DatabaseInformation = Depends(getDatabaseInformation)):
+    return await getCreatorProfile(username, request.headers.get('if-none-match'), databaseInformation)
+
 @user_router.patch("/updateUser")
 async def handleUpdateUser(updateUserBody: UpdateUserBody = Form(), databaseInformation: DatabaseInformation = Depends(getDatabaseInformation), authentication: Authentication = Depends(authentication(['USER', 'CREATOR', 'ADMIN']))):
     return await updateUser(updateUserBody, databaseInformation, authentication)
\ No newline at end of file
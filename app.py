@@ -1,25 +1,58 @@
 from fastapi import FastAPI, Request
+from fastapi.responses import ORJSONResponse
 from dotenv import load_dotenv 
 load_dotenv()
 from middleware.not_found import notFound # Not Found Middleware
 from middleware.request_validation_error import requestValidationErrorHandler # Error Handler Middleware
 from middleware.custom_error import customErrorErrorHandler # CustomError Error Handler
 from middleware.integrity_error import integrityError # Integrity Error Handler
+from middleware.upload_size_limit import UploadSizeLimit, payloadTooLarge # Upload Size Limit Middleware
 from utils.status_codes import StatusCodes
 from database.models.User import User # User Model
 from database.models.CreatorRequest import CreatorRequest # CreatorRequest Model
 from database.models.Subscription import Subscription # Subscription Model
 from database.models.Purchase import Purchase # Purchase Model
 from database.models.Cashout import Cashout # Cashout Model
+from database.models.WebhookEvent import WebhookEvent # WebhookEvent Model
+from database.models.LedgerEntry import LedgerEntry # LedgerEntry Model
+from database.models.UploadBlob import UploadBlob # UploadBlob Model
 from apiRouters.auth import auth_router # Auth APIRouter
 from apiRouters.user import user_router # User APIRouter
 from apiRouters.creator_request import creator_request_router # Creator Request APIRouter
 from apiRouters.subscription import subscription_router # Subscription APIRouter
 from apiRouters.purchase import purchase_router # Purchase APIRouter
 from apiRouters.cashout import cashout_router # Cashout APIRouter
+from apiRouters.internal import internal_router # Internal APIRouter
+from utils.getDatabaseInformation import setupDatabaseInformation
+from utils.emailOutbox import emailOutbox
+from utils.webhookQueue import webhookQueue
+from utils.sideEffects import sideEffectDispatcher
+from utils.imageVariants import imageExecutor
+from utils.responseCache import responseCache
+from database.Session import engine
+from contextlib import asynccontextmanager
 import uvicorn
 import os
 
+# The "lifespan" is code that runs once when a worker starts up (everything before the "yield") and once
+# when it shuts down (everything after the "yield"). We use it to build the session factory and Models a 
+# single time, instead of on every request, and to start the background tasks that send emails, process
+# Stripe webhook events and run the side effects registered with "afterCommit". And on shutdown we stop those tasks and close all the pooled database connections
+# (and the Redis connections of the response cache, if it uses Redis).
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    setupDatabaseInformation()
+    await emailOutbox.start()
+    await sideEffectDispatcher.start()
+    await webhookQueue.start()
+    yield
+    await webhookQueue.stop()
+    await sideEffectDispatcher.stop()
+    imageExecutor.shutdown(wait = False, cancel_futures = True)
+    await emailOutbox.stop()
+    await responseCache.close()
+    await engine.dispose()
+
 # To initialize a FastAPI application invoke the FastAPI constructor located on the "fastapi"
 # third party package
 app = FastAPI(
@@ -28,7 +61,12 @@ app = FastAPI(
     # docs_url = None,
     # redoc_url = None
     # By setting the keyword argument of "title" we can set a name for the SwaggerUI documentation
-    title = "Support Me"
+    title = "Support Me",
+    # By setting the keyword argument of "lifespan" we can run code on startup and shutdown
+    lifespan = lifespan,
+    # By setting the keyword argument of "default_response_class" to "ORJSONResponse" any route that just returns
+    # a dictionary gets serialized with "orjson", which is a lot faster than the built in "json" module.
+    default_response_class = ORJSONResponse
 )
 
 # By default FastAPI does not serve static files at a folder called "static" at the root of your project. Instead
@@ -40,11 +78,15 @@ app = FastAPI(
 # of the static files
 # name - is equal to a value that is used internally by FastAPI, just set it to "static" as its descriptive of what
 # this is for.
-from fastapi.staticfiles import StaticFiles
+# We use our own "CachedStaticFiles" instead of the plain "StaticFiles", it adds the caching headers that let browsers
+# (and any CDN in front of us) keep the uploaded images instead of asking for them again, check out
+# "utils/cachedStaticFiles.py" for the details. Note - with STORAGE_BACKEND set to "s3" the uploads are loaded straight
+# from the bucket instead (see "utils/storage.py"), and this only serves whatever else is in the "static" folder.
+from utils.cachedStaticFiles import CachedStaticFiles
 
 app.mount(
     path = "/static",
-    app = StaticFiles(directory = "static"),
+    app = CachedStaticFiles(directory = "static"),
     name = "static"
 )
 
@@ -63,6 +105,10 @@ app.mount(
 #     directory = "templates"
 # )
 
+# Refuses forms (uploads) that are too big while they are still coming in, instead of after Starlette has received and
+# spooled the whole thing, check out "middleware/upload_size_limit.py" for the details
+app.add_middleware(UploadSizeLimit)
+
 # To apply a APIRouter to be used in your program which promotes code modularity use the 
 # include_router() method located on the app instance. 
 app.include_router(auth_router)
@@ -71,10 +117,11 @@ app.include_router(creator_request_router)
 app.include_router(subscription_router)
 app.include_router(purchase_router)
 app.include_router(cashout_router)
+app.include_router(internal_router)
 
 # To make sure the Models are Recognized we can import/iterate over them
 # to see if they work. Makes debugging/development easier.
-models = [User, CreatorRequest, Subscription, Purchase, Cashout]
+models = [User, CreatorRequest, Subscription, Purchase, Cashout, WebhookEvent, LedgerEntry, UploadBlob]
 
 if os.getenv('FASTAPI_ENV') == "development":
     for model in models:
@@ -103,6 +150,11 @@ async def handleGlobalException(_, error: Exception):
 async def handleNotFound(_, __):
     return await notFound()
 
+# An upload that went over the limit while it was being received (see "middleware/upload_size_limit.py")
+@app.exception_handler(StatusCodes.PAYLOAD_TOO_LARGE)
+async def handlePayloadTooLarge(_, __):
+    return await payloadTooLarge()
+
 # To create a Error Handler in your FastAPI application use the "exception_handler" method located
 # on the "app" object. And inside of it pass the type of error it should handle. The RequestValidationError
 # is used for handling errors like the request body, query parameters, path parameters, or headers
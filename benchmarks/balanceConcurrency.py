@@ -0,0 +1,88 @@
+# Fires hundreds of credits at the same user at the same time, each on its own session (like webhooks being processed
+# by different workers), and checks that not a single one got lost. Then does the same with cashouts and checks that the
+# balance never went negative, and that the ledger still adds up to the balance. It needs a real database, so it runs
+# against DATABASE_URL_ASYNC_VERSION and cleans up the user it creates (its ledger entries go with it). Run it from the root of the project with "python -m benchmarks.balanceConcurrency"
+from dotenv import load_dotenv
+load_dotenv()
+from utils.getDatabaseInformation import getDatabaseInformation
+from utils.balance import creditUser, debitUser
+from utils.password import hashPassword
+from database.Session import engine
+from sqlalchemy import select, delete, func
+from uuid import uuid4
+import asyncio
+import time
+
+CREDITS = 500
+CREDIT_AMOUNT = 500
+DEBITS = 200
+DEBIT_AMOUNT = 2000
+
+async def main():
+    Session, Models = getDatabaseInformation()
+    async with Session() as session:
+        user = Models.User(
+            fullName = "Balance Check",
+            username = f"balance{uuid4().hex[:12]}",
+            email = f"{uuid4().hex}@example.com",
+            # Passwords are hashed by the controllers (see utils/password.py), never by the model, so hash it here. It's random,
+            # so nobody can log in as this user while the check runs.
+            password = await hashPassword(uuid4().hex),
+            bio = "Created by benchmarks/balanceConcurrency.py",
+            profilePicture = "/static/uploads/profile_pictures/none.png",
+            coverPicture = ""
+        )
+        session.add(user)
+        await session.commit()
+        user_id = user.id
+
+    async def credit():
+        async with Session() as session:
+            await creditUser(session, user_id, CREDIT_AMOUNT, f"benchmark:{uuid4()}")
+            await session.commit()
+
+    async def debit():
+        async with Session() as session:
+            debited = await debitUser(session, user_id, DEBIT_AMOUNT, f"benchmark:{uuid4()}")
+            await session.commit()
+            return debited
+
+    async def balance():
+        async with Session() as session:
+            return (await session.execute(
+                select(Models.User.amount).filter(Models.User.id == user_id)
+            )).scalar()
+
+    async def ledgerBalance():
+        async with Session() as session:
+            return (await session.execute(
+                select(func.coalesce(func.sum(Models.LedgerEntry.amount), 0)).filter(Models.LedgerEntry.user_id == user_id)
+            )).scalar()
+
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(*[credit() for _ in range(CREDITS)])
+        elapsed = time.perf_counter() - start
+        expected = CREDITS * CREDIT_AMOUNT
+        actual = await balance()
+        print(f"{CREDITS} parallel credits in {elapsed:.2f}s: expected {expected}, got {actual}")
+        assert actual == expected, "Credits were lost!"
+        # 200 cashouts of 2000 is 400,000, more than the 250,000 we have, so only 125 of them can succeed
+        results = await asyncio.gather(*[debit() for _ in range(DEBITS)])
+        succeeded = sum(results)
+        actual = await balance()
+        print(f"{DEBITS} parallel cashouts: {succeeded} succeeded, balance left {actual}")
+        assert actual == expected - succeeded * DEBIT_AMOUNT, "Cashouts were lost!"
+        assert actual >= 0, "The balance went negative!"
+        assert succeeded == expected // DEBIT_AMOUNT, "Cashouts were refused while there was money left!"
+        ledger = await ledgerBalance()
+        print(f"users.amount is {actual}, the ledger adds up to {ledger}")
+        assert actual == ledger, "The balance doesn't match the ledger!"
+    finally:
+        async with Session() as session:
+            await session.execute(delete(Models.User).filter(Models.User.id == user_id))
+            await session.commit()
+        await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
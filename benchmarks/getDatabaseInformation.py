@@ -0,0 +1,32 @@
+# Compares the cost of the "getDatabaseInformation" dependency before and after building the Models registry
+# once at startup. Run it from the root of the project with "python -m benchmarks.getDatabaseInformation"
+from dotenv import load_dotenv
+load_dotenv()
+import app # Makes sure every model is loaded, just like when the server runs
+from utils.getDatabaseInformation import getDatabaseInformation, setupDatabaseInformation
+import timeit
+
+# The old version of the dependency, which re-ran the imports and created a brand new "Models" class every call
+def oldGetDatabaseInformation():
+    from database.Session import Session
+    from app import User as UserModel
+    from app import CreatorRequest as CreatorRequestModel
+    from app import Subscription as SubscriptionModel
+    from app import Purchase as PurchaseModel
+    from app import Cashout as CashoutModel
+    class Models:
+        User = UserModel
+        CreatorRequest = CreatorRequestModel
+        Subscription = SubscriptionModel
+        Purchase = PurchaseModel
+        Cashout = CashoutModel
+    return (Session, Models)
+
+if __name__ == '__main__':
+    setupDatabaseInformation()
+    iterations = 100_000
+    before = timeit.timeit(oldGetDatabaseInformation, number = iterations)
+    after = timeit.timeit(getDatabaseInformation, number = iterations)
+    print(f"Before: {before / iterations * 1_000_000:.3f}µs per call")
+    print(f"After: {after / iterations * 1_000_000:.3f}µs per call")
+    print(f"Speedup: {before / after:.1f}x")
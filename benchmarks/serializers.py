@@ -0,0 +1,86 @@
+# Compares serializing a page of 1,000 subscriptions (with their users) the old way, a hand written dictionary
+# sent through the built in "json" module like "JSONResponse" does, against "utils/serializers.py" and "orjson"
+# like "ORJSONResponse" does. Run it from the root of the project with "python -m benchmarks.serializers"
+from utils.serializers import serializeMany, serializeSubscription
+from utils.enums import Role
+from types import SimpleNamespace
+from datetime import datetime
+from uuid import uuid4
+import timeit
+import orjson
+import json
+
+def createSubscriptions(amount: int):
+    subscriptions = []
+    for index in range(amount):
+        user = SimpleNamespace(
+            id = str(uuid4()),
+            fullName = f"Creator {index}",
+            username = f"creator{index}",
+            email = f"creator{index}@example.com",
+            bio = "Just a creator making things " * 5,
+            profilePicture = f"/static/uploads/profile_pictures/creator{index}_{uuid4()}_avatar.png",
+            profilePictureVariants = None,
+            coverPicture = "",
+            coverPictureVariants = None,
+            role = Role.CREATOR,
+            createdAt = datetime.now(),
+            updatedAt = datetime.now()
+        )
+        subscriptions.append(SimpleNamespace(
+            id = str(uuid4()),
+            title = f"Tier {index}",
+            description = "All the perks of this tier " * 10,
+            price = 500,
+            image = f"/static/uploads/subscription_images/creator{index}_{uuid4()}_tier.png",
+            imageVariants = None,
+            user_id = user.id,
+            user = user
+        ))
+    return subscriptions
+
+def oldSerialize(subscriptions):
+    content = {
+        "subscriptions": [
+            {
+                "id": subscription.id,
+                "title": subscription.title,
+                "description": subscription.description,
+                "price": subscription.price,
+                "image": subscription.image,
+                "imageVariants": subscription.imageVariants,
+                "user_id": subscription.user_id,
+                "user": {
+                    "id": subscription.user.id,
+                    "fullName": subscription.user.fullName,
+                    "username": subscription.user.username,
+                    "email": subscription.user.email,
+                    "bio": subscription.user.bio,
+                    "profilePicture": subscription.user.profilePicture,
+                    "profilePictureVariants": subscription.user.profilePictureVariants,
+                    "coverPicture": subscription.user.coverPicture,
+                    "coverPictureVariants": subscription.user.coverPictureVariants,
+                    "role": subscription.user.role.name,
+                    "createdAt": str(subscription.user.createdAt),
+                    "updatedAt": str(subscription.user.updatedAt)
+                }
+            }
+            for subscription in subscriptions
+        ]
+    }
+    # The exact same settings "JSONResponse" uses internally
+    return json.dumps(content, ensure_ascii = False, allow_nan = False, indent = None, separators = (",", ":")).encode("utf-8")
+
+def newSerialize(subscriptions):
+    return orjson.dumps({"subscriptions": serializeMany(serializeSubscription, subscriptions)})
+
+if __name__ == '__main__':
+    subscriptions = createSubscriptions(1000)
+    # Both approaches MUST produce the same JSON
+    assert json.loads(oldSerialize(subscriptions)) == json.loads(newSerialize(subscriptions))
+    iterations = 200
+    before = timeit.timeit(lambda: oldSerialize(subscriptions), number = iterations)
+    after = timeit.timeit(lambda: newSerialize(subscriptions), number = iterations)
+    print(f"Before: {before / iterations * 1000:.3f}ms per 1,000 subscriptions")
+    print(f"After: {after / iterations * 1000:.3f}ms per 1,000 subscriptions")
+    print(f"Speedup: {before / after:.1f}x")
@@ -0,0 +1,69 @@
+# Runs the same checks against both storage backends in "utils/storage.py": saving a file, reading it back (streamed and as
+# a local copy), listing, moving, deleting and the URL the frontend gets. The "s3" backend runs against a fake S3 made by
+# "moto" (pip install moto), so no bucket or credentials are needed. Run it from the root of the project with
+# "python -m benchmarks.storageBackends"
+from utils.storage import LocalStorage, S3Storage
+from moto import mock_aws
+import tempfile
+import asyncio
+import boto3
+import os
+
+KEY = "static/uploads/blobs/ab/ab12check.png"
+MOVED_KEY = "quarantine/static/uploads/blobs/ab/ab12check.png"
+CONTENT = b"not really a png " * 10000
+
+def writeSource(directory: str) -> str:
+    path = os.path.join(directory, "source.png")
+    with open(path, "wb") as file:
+        file.write(CONTENT)
+    return path
+
+async def check(name: str, storage, sourceDirectory: str) -> None:
+    sourcePath = writeSource(sourceDirectory)
+    assert not await storage.exists(KEY)
+    await storage.putFile(KEY, sourcePath, "image/png")
+    assert await storage.exists(KEY)
+    # The source file is moved (or uploaded and removed), never left behind
+    assert not os.path.exists(sourcePath)
+    # Saving the same content again is a no op
+    await storage.putFile(KEY, writeSource(sourceDirectory), "image/png")
+    assert b"".join([chunk async for chunk in storage.get(KEY)]) == CONTENT
+    async with storage.localCopy(KEY) as path:
+        with open(path, "rb") as file:
+            assert file.read() == CONTENT
+    listed = [storedFile async for storedFile in storage.list("static/uploads/")]
+    assert [storedFile.key for storedFile in listed] == [KEY]
+    assert listed[0].size == len(CONTENT)
+    await storage.move(KEY, MOVED_KEY)
+    assert not await storage.exists(KEY)
+    assert await storage.exists(MOVED_KEY)
+    await storage.delete(MOVED_KEY)
+    assert not await storage.exists(MOVED_KEY)
+    print(f"{name}: OK ({storage.url(KEY)})")
+
+async def main():
+    with tempfile.TemporaryDirectory() as directory:
+        sourceDirectory = os.path.join(directory, "sources")
+        os.makedirs(sourceDirectory)
+        local = LocalStorage(os.path.join(directory, "local"))
+        await check("local", local, sourceDirectory)
+        assert local.url(KEY) == f"/{KEY}"
+        assert local.stableUrls
+
+        with mock_aws():
+            os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+            os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+            boto3.client("s3", region_name = "us-east-1").create_bucket(Bucket = "uploads-check")
+            presigned = S3Storage("uploads-check", None, "us-east-1", None, 3600)
+            await check("s3 (presigned)", presigned, sourceDirectory)
+            assert "X-Amz-Signature=" in presigned.url(KEY)
+            # Presigned URLs can't go in cached responses (see "utils/responseCache.py")
+            assert not presigned.stableUrls
+            public = S3Storage("uploads-check", None, "us-east-1", "https://cdn.example.com/", 3600)
+            await check("s3 (public)", public, sourceDirectory)
+            assert public.url(KEY) == f"https://cdn.example.com/{KEY}"
+            assert public.stableUrls
+
+if __name__ == "__main__":
+    asyncio.run(main())
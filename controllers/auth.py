@@ -1,19 +1,21 @@
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from utils.getDatabaseInformation import DatabaseInformation
 from pydanticModels.auth import RegisterBody, VerifyEmailBody, LoginBody
 from utils.custom_error import CustomError
 from utils.status_codes import StatusCodes
 from utils.token import createToken, createCookieWithToken
-from utils.sendgrid import sendEmail
+from utils.emailOutbox import emailOutbox
 from utils.stripe import getStripe
-import aiofiles
+from utils.password import hashPassword, needsRehash
+from utils.upload import saveImageUpload
+from utils.sideEffects import afterCommit
+from utils.imageVariants import createImageVariantsSideEffect
 from uuid import uuid4
 from sqlalchemy import select, or_
-from werkzeug.utils import secure_filename
 from datetime import datetime
 import os
 
-async def register(registerBody: RegisterBody, databaseInformation: DatabaseInformation) -> JSONResponse:
+async def register(registerBody: RegisterBody, databaseInformation: DatabaseInformation) -> ORJSONResponse:
     Session, Models = databaseInformation
     async with Session() as session:
         # If a User with the username or email exists already throw an error
@@ -26,27 +28,15 @@ async def register(registerBody: RegisterBody, databaseInformation: DatabaseInfo
             )
         )
         userAlreadyExists = userAlreadyExistsRawQuery.scalars().all()
-        print('profilePicture size', registerBody.profilePicture.size)
         # In Python an empty list/array is Falsy
         if userAlreadyExists:
             raise CustomError('A user with this username/email already exists!', StatusCodes.BAD_REQUEST)
-        # If a Profile Picture is not provided throw an error, profilePicture.size is equal to bytes
-        if registerBody.profilePicture.size == 0:
-            raise CustomError('Please check all inputs!', StatusCodes.BAD_REQUEST)
-        # Check if File is of type Image, if not throw an error
-        if not registerBody.profilePicture.content_type.startswith('image'):
-            raise CustomError('Profile Picture must be an Image!', StatusCodes.BAD_REQUEST)
-        if registerBody.profilePicture.size > (1024 * 1024) * 2:
-            raise CustomError('The profile picture size must not exceed 2MB!', StatusCodes.BAD_REQUEST)
-        # Save File - we won't be using the built in "open()" method because it is syncronous and blocking.
-        # Instead we will have to use something called "aiofiles" which is asyncronous, so non blocking
-        file_location = f"static/uploads/profile_pictures/{registerBody.username}_{uuid4()}_{secure_filename(registerBody.profilePicture.filename)}"
-        # If the file at this location does not exist create one, and we wan't to set the mode to "wb" for
-        # write bytes. Because we are dealing with an image not some text. And things like images, videos,
-        # and pdfs require it to be done in binary.
-        async with aiofiles.open(file_location, "wb") as file:
-            content = await registerBody.profilePicture.read()
-            await file.write(content) 
+        # Save the Profile Picture, it throws an error if it's missing, not an image or bigger than 2MB (see utils/upload.py)
+        file_location = await saveImageUpload(
+            session = session,
+            upload = registerBody.profilePicture,
+            name = "Profile Picture"
+        )
         # Create a Verification Token - just some unique string value basically
         verificationToken = str(uuid4())
         # Check if no users, so we can dynamically set Role type
@@ -54,12 +44,15 @@ async def register(registerBody: RegisterBody, databaseInformation: DatabaseInfo
             select(Models.User)
         )
         noUsers = noUsersRawQuery.scalars().all()
+        # Before creating a User we want to hash the password. Because making it human readable allows bad
+        # actors to easily steal account information. Hashing is slow so it runs on a separate thread.
+        hashedPassword = await hashPassword(registerBody.password)
         # Now that the verification token and users check is completed we can create the user with the location of the profile picture.
         user = Models.User(
             fullName = registerBody.fullName,
             username = registerBody.username,
             email = registerBody.email,
-            password = registerBody.password,
+            password = hashedPassword,
             bio = registerBody.bio,
             profilePicture = f"/{file_location}",
             coverPicture = "",
@@ -69,6 +62,8 @@ async def register(registerBody: RegisterBody, databaseInformation: DatabaseInfo
             verifiedAt = datetime.now() if not len(noUsers) else None
         )
         session.add(user)
+        # Make the resized copies of the Profile Picture once the User is saved (see utils/imageVariants.py)
+        afterCommit(session, 'createImageVariants', createImageVariantsSideEffect, Models.User.profilePicture, Models.User.profilePictureVariants, file_location)
         await session.commit()
         await session.refresh(user)
         # Create the Stripe Customer for "customer_id" if not an "ADMIN"
@@ -89,15 +84,15 @@ async def register(registerBody: RegisterBody, databaseInformation: DatabaseInfo
             user.customer_id = customer.id
             await session.commit()
         if not len(noUsers):
-            return JSONResponse(
+            return ORJSONResponse(
                 content = {"msg": "Successfully Created Admin Account!"},
                 status_code = StatusCodes.CREATED
             )
         else:
-            # Send Email
+            # Send Email, it gets put in the outbox and sent in the background so the user doesn't have to wait on it
             baseUrl = os.getenv('BASE_URL')
-            sendEmail(
-                data = {
+            emailOutbox.enqueue(
+                message = {
                     "to_emails": registerBody.email,
                     "subject": 'Support Me - Verify Email Address',
                     "html_content": f"""
@@ -110,12 +105,12 @@ async def register(registerBody: RegisterBody, databaseInformation: DatabaseInfo
                     """
                 }
             )
-            return JSONResponse(
+            return ORJSONResponse(
                 content = {"msg": "Success! Please check your email to verify account"},
                 status_code = StatusCodes.CREATED
             )
         
-async def verifyEmail(verifyEmailBody: VerifyEmailBody, databaseInformation: DatabaseInformation) -> JSONResponse:
+async def verifyEmail(verifyEmailBody: VerifyEmailBody, databaseInformation: DatabaseInformation) -> ORJSONResponse:
     Session, Models = databaseInformation
     async with Session() as session:
         userExistsRawQuery = await session.execute(select(Models.User).filter(Models.User.email == verifyEmailBody.email))
@@ -132,20 +127,20 @@ async def verifyEmail(verifyEmailBody: VerifyEmailBody, databaseInformation: Dat
         userExists.verifiedAt = datetime.now()
         userExists.verificationToken = ''
         await session.commit()
-        response = JSONResponse(
+        response = ORJSONResponse(
             content = {"msg": "Verified Email Address!"},
             status_code = StatusCodes.OK
         )
         return response
 
-async def login(loginBody: LoginBody, databaseInformation: DatabaseInformation) -> JSONResponse:
+async def login(loginBody: LoginBody, databaseInformation: DatabaseInformation) -> ORJSONResponse:
     Session, Models = databaseInformation
     async with Session() as session:
         userExistsRawQuery = await session.execute(select(Models.User).filter(Models.User.email == loginBody.email))
         userExists = userExistsRawQuery.scalar()
         if not userExists:
             raise CustomError('No User Found with the Email Provided!', StatusCodes.NOT_FOUND)
-        isCorrect = userExists.comparePassword(loginBody.password)
+        isCorrect = await userExists.comparePassword(loginBody.password)
         if not isCorrect:
             raise CustomError('Incorrect Password!', StatusCodes.BAD_REQUEST)
         if not userExists.isVerified:
@@ -153,7 +148,7 @@ async def login(loginBody: LoginBody, databaseInformation: DatabaseInformation)
         # Create Token
         token = createToken(userExists)
         # Create Response
-        response = JSONResponse(
+        response = ORJSONResponse(
             content = {
                 "user": {
                     "id": userExists.id,
@@ -166,10 +161,16 @@ async def login(loginBody: LoginBody, databaseInformation: DatabaseInformation)
         )
         # Attach Cookie to Response
         createCookieWithToken(token, response)
+        # If the password was hashed with a different cost than the current "BCRYPT_ROUNDS", now is our only chance
+        # to rehash it because this is the only time we have the plain text password. We do this last because
+        # committing expires all the data on "userExists".
+        if needsRehash(userExists.password):
+            userExists.password = await hashPassword(loginBody.password)
+            await session.commit()
         return response
 
-async def logout() -> JSONResponse:
-    response = JSONResponse(
+async def logout() -> ORJSONResponse:
+    response = ORJSONResponse(
         content = {"msg": "Successfully Logged Out!"},
         status_code = StatusCodes.OK
     )
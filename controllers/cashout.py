@@ -1,134 +1,97 @@
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from utils.getDatabaseInformation import DatabaseInformation
 from middleware.authentication import Authentication
 from pydanticModels.cashout import CreateCashoutBody, UpdateCashoutBody
 from utils.custom_error import CustomError
 from utils.status_codes import StatusCodes
+from utils.serializers import serializeMany, serializeCashout
+from utils.paginate import paginate
+from utils.search import usernameSearch
+from utils.balance import debitUser
 from sqlalchemy import select
-from sqlalchemy.orm import joinedload
-import math
+from sqlalchemy.orm import joinedload, contains_eager
+from uuid import uuid4
 
-async def getAllCashouts(username: str, page: int, limit: int, databaseInformation: DatabaseInformation, authentication: Authentication) -> JSONResponse:
+async def getAllCashouts(username: str, page: int, limit: int, cursor: str, databaseInformation: DatabaseInformation, authentication: Authentication) -> ORJSONResponse:
     Session, Models = databaseInformation
     async with Session() as session:
         filters = []
-        skip = (page - 1) * limit
         if username:
-            filters.append(Models.Cashout.user.has(Models.User.username.ilike(f"%{username}%")))
-        # In simple terms when you use "joinedload" inside of the "options" method its similar to using the "populate" method
-        # from Mongoose. You are asking it to be filled with the associated data. 
-        cashoutsRawQuery = await session.execute(
-            select(Models.Cashout).filter(*filters).options(joinedload(Models.Cashout.user)).offset(skip).limit(limit)
-        )
-        cashouts = cashoutsRawQuery.scalars().all()
-        totalCashoutsRawQuery = await session.execute(
-            select(Models.Cashout).filter(*filters)
+            filters.append(usernameSearch(Models.User.username, username))
+        # Instead of filtering with "has()" (a correlated subquery that runs once per cashout) we join the users table a single
+        # time. And "contains_eager" tells SQLAlchemy to fill "cashout.user" from that same join.
+        cashouts, totalCashouts, numberOfPages, nextCursor = await paginate(
+            session = session,
+            query = select(Models.Cashout).join(Models.Cashout.user).filter(*filters),
+            model = Models.Cashout,
+            page = page,
+            limit = limit,
+            cursor = cursor,
+            options = [contains_eager(Models.Cashout.user)]
         )
-        totalCashouts = len(totalCashoutsRawQuery.scalars().all())
-        numberOfPages = math.ceil(totalCashouts / limit)
-        return JSONResponse(
+        return ORJSONResponse(
             content = {
-                "cashouts": [
-                    {
-                        "id": cashout.id,
-                        "amount": cashout.amount,
-                        "user_id": cashout.user_id,
-                        "user": {
-                            "id": cashout.user.id,
-                            "fullName": cashout.user.fullName,
-                            "username": cashout.user.username,
-                            "email": cashout.user.email,
-                            "bio": cashout.user.bio,
-                            "profilePicture": cashout.user.profilePicture,
-                            "coverPicture": cashout.user.coverPicture,
-                            "role": cashout.user.role.name,
-                            "createdAt": str(cashout.user.createdAt),
-                            "updatedAt": str(cashout.user.updatedAt)
-                        }
-                    }
-                    for cashout in cashouts
-                ],
+                "cashouts": serializeMany(serializeCashout, cashouts),
                 "totalCashouts": totalCashouts,
-                "numberOfPages": numberOfPages
+                "numberOfPages": numberOfPages,
+                "nextCursor": nextCursor
             },
             status_code = StatusCodes.OK
         )
     
-async def getAllUserCashouts(page: int, limit: int, databaseInformation: DatabaseInformation, authentication: Authentication) -> JSONResponse:
+async def getAllUserCashouts(page: int, limit: int, cursor: str, databaseInformation: DatabaseInformation, authentication: Authentication) -> ORJSONResponse:
     Session, Models = databaseInformation
     async with Session() as session:
         filters = [
             Models.Cashout.user_id == authentication.get('userId')
         ]
-        skip = (page - 1) * limit
         # In simple terms when you use "joinedload" inside of the "options" method its similar to using the "populate" method
         # from Mongoose. You are asking it to be filled with the associated data. 
-        cashoutsRawQuery = await session.execute(
-            select(Models.Cashout).filter(*filters).options(joinedload(Models.Cashout.user)).offset(skip).limit(limit)
+        cashouts, totalCashouts, numberOfPages, nextCursor = await paginate(
+            session = session,
+            query = select(Models.Cashout).filter(*filters),
+            model = Models.Cashout,
+            page = page,
+            limit = limit,
+            cursor = cursor,
+            options = [joinedload(Models.Cashout.user)]
         )
-        cashouts = cashoutsRawQuery.scalars().all()
-        totalCashoutsRawQuery = await session.execute(
-            select(Models.Cashout).filter(*filters)
-        )
-        totalCashouts = len(totalCashoutsRawQuery.scalars().all())
-        numberOfPages = math.ceil(totalCashouts / limit)
-        return JSONResponse(
+        return ORJSONResponse(
             content = {
-                "cashouts": [
-                    {
-                        "id": cashout.id,
-                        "amount": cashout.amount,
-                        "user_id": cashout.user_id,
-                        "user": {
-                            "id": cashout.user.id,
-                            "fullName": cashout.user.fullName,
-                            "username": cashout.user.username,
-                            "email": cashout.user.email,
-                            "bio": cashout.user.bio,
-                            "profilePicture": cashout.user.profilePicture,
-                            "coverPicture": cashout.user.coverPicture,
-                            "role": cashout.user.role.name,
-                            "createdAt": str(cashout.user.createdAt),
-                            "updatedAt": str(cashout.user.updatedAt)
-                        }
-                    }
-                    for cashout in cashouts
-                ],
+                "cashouts": serializeMany(serializeCashout, cashouts),
                 "totalCashouts": totalCashouts,
-                "numberOfPages": numberOfPages
+                "numberOfPages": numberOfPages,
+                "nextCursor": nextCursor
             },
             status_code = StatusCodes.OK
         )
     
-async def createCashout(createCashoutBody: CreateCashoutBody, databaseInformation: DatabaseInformation, authentication: Authentication) -> JSONResponse:
+async def createCashout(createCashoutBody: CreateCashoutBody, databaseInformation: DatabaseInformation, authentication: Authentication) -> ORJSONResponse:
     Session, Models = databaseInformation
     async with Session() as session:
         # This is an irreversible action so make sure the user is conscious of this.
-        userRawQuery = await session.execute(
-            select(Models.User).filter(
-                Models.User.id == authentication.get('userId')
-            )
-        )
-        user = userRawQuery.scalar()
         # We will recognize the amount as NOT the lowest current format. And they must cashout a integer not a float. 
         # So someone can't just create cashouts for 10cents repeatedly.
         deductAmount = createCashoutBody.amount * 100
-        if not (user.amount >= deductAmount):
+        # Only takes the money if there is enough of it, checking and deducting in the same UPDATE, and records it in the
+        # ledger (see utils/balance.py)
+        cashout_id = str(uuid4())
+        if not await debitUser(session, authentication.get('userId'), deductAmount, f"cashout:{cashout_id}"):
             raise CustomError(f"You don't have enough money to process this cashout!", StatusCodes.BAD_REQUEST)
-        user.amount = user.amount - deductAmount
         # Create Cashout 
         cashout = Models.Cashout(
+            id = cashout_id,
             amount = deductAmount,
             user_id = authentication.get('userId')
         )
         session.add(cashout)
         await session.commit()
-        return JSONResponse(
+        return ORJSONResponse(
             content = {"msg": "Created Cashout"},
             status_code = StatusCodes.CREATED
         )
     
-async def updateCashout(cashout_id: str, updateCashoutBody: UpdateCashoutBody, databaseInformation: DatabaseInformation, authentication: Authentication) -> JSONResponse:
+async def updateCashout(cashout_id: str, updateCashoutBody: UpdateCashoutBody, databaseInformation: DatabaseInformation, authentication: Authentication) -> ORJSONResponse:
     Session, Models = databaseInformation
     async with Session() as session:
         # First check if this cashout_id even exists
@@ -146,7 +109,7 @@ async def updateCashout(cashout_id: str, updateCashoutBody: UpdateCashoutBody, d
         cashout.status = updateCashoutBody.status
         await session.commit()
         await session.refresh(cashout)
-        return JSONResponse(
+        return ORJSONResponse(
             content = {
                 "cashout": {
                     "id": cashout.id,
@@ -1,28 +1,27 @@
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from utils.getDatabaseInformation import DatabaseInformation
 from middleware.authentication import Authentication
 from pydanticModels.creator_request import CreateCreatorRequestBody, UpdateCreatorRequestBody
 from utils.custom_error import CustomError
 from utils.status_codes import StatusCodes
+from utils.serializers import serializeMany, serializeCreatorRequest
+from utils.paginate import paginate
+from utils.search import usernameSearch
 from sqlalchemy import select
-from sqlalchemy.orm import joinedload
-import math
+from sqlalchemy.orm import joinedload, contains_eager
 
-async def getAllCreatorRequests(username: str, status: str, page: int, limit: int, databaseInformation: DatabaseInformation, authentication: Authentication) -> JSONResponse:
+async def getAllCreatorRequests(username: str, status: str, page: int, limit: int, cursor: str, databaseInformation: DatabaseInformation, authentication: Authentication) -> ORJSONResponse:
     Session, Models = databaseInformation
     async with Session() as session:
         filters = []
-        skip = (page - 1) * limit
         if username:
             # If you try to query on the related data fields like so
             # filters.append(Models.CreatorRequest.user.username.ilike(f"%{username}%")) -> Error 
             # AttributeError: Neither 'InstrumentedAttribute' object nor 'Comparator' object associated with CreatorRequest.user has an attribute 'username'
-            # And that's because SQLAlchemy doesn't allow filtering on fields of a related model this way. In 
-            # SQLAlchemy, when filtering on fields from related models, you need to access them through the 
-            # relationship using the has() or any() methods for conditions. Since user is a one-to-one 
-            # relationship, you can use the has() method to filter based on the fields from the related User 
-            # model.
-            filters.append(Models.CreatorRequest.user.has(Models.User.username.ilike(f"%{username}%")))
+            # And that's because SQLAlchemy doesn't allow filtering on fields of a related model this way. We used to get around
+            # that with "has()", but that creates a correlated subquery which runs once for every creator request. Instead we join
+            # the users table (see the query below) and then we can filter on "Models.User" directly.
+            filters.append(usernameSearch(Models.User.username, username))
         if status:
             filters.append(Models.CreatorRequest.status == status)
         # Notice how instead of just being able to access the relationship data (One to One from "user") we
@@ -33,47 +32,26 @@ async def getAllCreatorRequests(username: str, status: str, page: int, limit: in
         # But the problem with that in an Asyncronous setup is that it won't work. Because it would need to be
         # awaited and and lazy loading does not support that. So by using the "options" approach we do all the 
         # fetching at once.
-        creatorRequestsRawQuery = await session.execute(
-            select(Models.CreatorRequest).filter(*filters).options(joinedload(Models.CreatorRequest.user)).offset(skip).limit(limit)
+        creatorRequests, totalCreatorRequests, numberOfPages, nextCursor = await paginate(
+            session = session,
+            query = select(Models.CreatorRequest).join(Models.CreatorRequest.user).filter(*filters),
+            model = Models.CreatorRequest,
+            page = page,
+            limit = limit,
+            cursor = cursor,
+            options = [contains_eager(Models.CreatorRequest.user)]
         )
-        creatorRequests = creatorRequestsRawQuery.scalars().all()
-        totalCreatorRequestsRawQuery = await session.execute(
-            select(Models.CreatorRequest).filter(*filters)
-        )
-        totalCreatorRequests = len(totalCreatorRequestsRawQuery.scalars().all())
-        numberOfPages = math.ceil(totalCreatorRequests / limit)
-        return JSONResponse(
+        return ORJSONResponse(
             content = {
-                "creatorRequests": [
-                    {
-                        "id": creatorRequest.id,
-                        "explanation": creatorRequest.explanation,
-                        "status": creatorRequest.status.name,
-                        "user_id": creatorRequest.user_id,
-                        "user": {
-                            "id": creatorRequest.user.id,
-                            "fullName": creatorRequest.user.fullName,
-                            "username": creatorRequest.user.username,
-                            "email": creatorRequest.user.email,
-                            "bio": creatorRequest.user.bio,
-                            "profilePicture": creatorRequest.user.profilePicture,
-                            "coverPicture": creatorRequest.user.coverPicture,
-                            "role": creatorRequest.user.role.name,
-                            "createdAt": str(creatorRequest.user.createdAt),
-                            "updatedAt": str(creatorRequest.user.updatedAt)
-                        },
-                        "createdAt": str(creatorRequest.createdAt),
-                        "updatedAt": str(creatorRequest.updatedAt)
-                    }
-                    for creatorRequest in creatorRequests
-                ],
+                "creatorRequests": serializeMany(serializeCreatorRequest, creatorRequests),
                 "totalCreatorRequests": totalCreatorRequests,
-                "numberOfPages": numberOfPages
+                "numberOfPages": numberOfPages,
+                "nextCursor": nextCursor
             },
             status_code = StatusCodes.OK
         )
 
-async def createCreatorRequest(createCreatorRequestBody: CreateCreatorRequestBody, databaseInformation: DatabaseInformation, authentication: Authentication) -> JSONResponse:
+async def createCreatorRequest(createCreatorRequestBody: CreateCreatorRequestBody, databaseInformation: DatabaseInformation, authentication: Authentication) -> ORJSONResponse:
     Session, Models = databaseInformation
     async with Session() as session:
         alreadyCreatedCreatorRequestRawQuery = await session.execute(
@@ -89,7 +67,7 @@ async def createCreatorRequest(createCreatorRequestBody: CreateCreatorRequestBod
         session.add(creator_request)
         await session.commit()
         await session.refresh(creator_request)
-        return JSONResponse(
+        return ORJSONResponse(
             content = {
                 "creatorRequest": {
                     "id": creator_request.id,
@@ -101,7 +79,7 @@ async def createCreatorRequest(createCreatorRequestBody: CreateCreatorRequestBod
             status_code = StatusCodes.CREATED
         )
     
-async def updateCreatorRequest(updateCreatorRequestBody: UpdateCreatorRequestBody, creator_request_id: str, databaseInformation: DatabaseInformation, authentication: Authentication) -> JSONResponse:
+async def updateCreatorRequest(updateCreatorRequestBody: UpdateCreatorRequestBody, creator_request_id: str, databaseInformation: DatabaseInformation, authentication: Authentication) -> ORJSONResponse:
     Session, Models = databaseInformation
     async with Session() as session:
         creatorRequestRawQuery = await session.execute(
@@ -134,33 +112,14 @@ async def updateCreatorRequest(updateCreatorRequestBody: UpdateCreatorRequestBod
         # To prevent that error we have to use the "refresh" method on the "session" object. This will refetch the data
         # associated with it so you can use it.
         await session.refresh(creatorRequest)
-        return JSONResponse(
+        return ORJSONResponse(
             content = {
-                "creatorRequest": {
-                    "id": creatorRequest.id,
-                    "explanation": creatorRequest.explanation,
-                    "status": creatorRequest.status.name,
-                    "user_id": creatorRequest.user_id,
-                    "user": {
-                        "id": creatorRequest.user.id,
-                        "fullName": creatorRequest.user.fullName,
-                        "username": creatorRequest.user.username,
-                        "email": creatorRequest.user.email,
-                        "bio": creatorRequest.user.bio,
-                        "profilePicture": creatorRequest.user.profilePicture,
-                        "coverPicture": creatorRequest.user.coverPicture,
-                        "role": creatorRequest.user.role.name,
-                        "createdAt": str(creatorRequest.user.createdAt),
-                        "updatedAt": str(creatorRequest.user.updatedAt)
-                    },
-                    "createdAt": str(creatorRequest.createdAt),
-                    "updatedAt": str(creatorRequest.updatedAt)
-                }
+                "creatorRequest": serializeCreatorRequest(creatorRequest)
             },
             status_code = StatusCodes.OK
         )
     
-async def deleteCreatorRequest(creator_request_id: str, databaseInformation: DatabaseInformation, authentication: Authentication) -> JSONResponse:
+async def deleteCreatorRequest(creator_request_id: str, databaseInformation: DatabaseInformation, authentication: Authentication) -> ORJSONResponse:
     Session, Models = databaseInformation
     async with Session() as session:
         creatorRequestRawQuery = await session.execute(
@@ -180,7 +139,7 @@ async def deleteCreatorRequest(creator_request_id: str, databaseInformation: Dat
         await session.delete(creatorRequest)
         # And finally the "commit()" method, which will perform the actual deletion.
         await session.commit()
-        return JSONResponse(
+        return ORJSONResponse(
             content = {"msg": "Deleted Creator Request"},
             status_code = StatusCodes.CREATED
         )
\ No newline at end of file
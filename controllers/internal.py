@@ -0,0 +1,102 @@
+from fastapi.responses import ORJSONResponse
+from middleware.authentication import Authentication, verifiedTokenCache
+from utils.status_codes import StatusCodes
+from database.Session import engine
+from database.Pool import poolStatistics
+from utils.emailOutbox import emailOutbox
+from utils.webhookQueue import webhookQueue
+from utils.sideEffects import sideEffectDispatcher
+from utils.cachedStaticFiles import staticFilesStatistics
+from utils.responseCache import responseCache
+from utils.getDatabaseInformation import DatabaseInformation
+from sqlalchemy import select, func
+import os
+
+async def getPoolStatistics(authentication: Authentication) -> ORJSONResponse:
+    # The "pool" lives on the syncronous engine that the async engine wraps.
+    pool = engine.sync_engine.pool
+    return ORJSONResponse(
+        content = {
+            # Every uvicorn worker has its own pool, so let the caller know which worker answered.
+            "pid": os.getpid(),
+            "pool": {
+                "size": pool.size(),
+                "checkedIn": pool.checkedin(),
+                "checkedOut": pool.checkedout(),
+                "overflow": pool.overflow(),
+                "timeout": pool.timeout()
+            },
+            "statistics": poolStatistics.toDict()
+        },
+        status_code = StatusCodes.OK
+    )
+
+async def getTokenCacheStatistics(authentication: Authentication) -> ORJSONResponse:
+    return ORJSONResponse(
+        content = {
+            "pid": os.getpid(),
+            "tokenCache": verifiedTokenCache.toDict()
+        },
+        status_code = StatusCodes.OK
+    )
+
+async def getEmailOutboxStatistics(authentication: Authentication) -> ORJSONResponse:
+    return ORJSONResponse(
+        content = {
+            "pid": os.getpid(),
+            "emailOutbox": emailOutbox.toDict()
+        },
+        status_code = StatusCodes.OK
+    )
+
+async def getSideEffectStatistics(authentication: Authentication) -> ORJSONResponse:
+    return ORJSONResponse(
+        content = {
+            "pid": os.getpid(),
+            "sideEffects": sideEffectDispatcher.toDict()
+        },
+        status_code = StatusCodes.OK
+    )
+
+async def getStaticFilesStatistics(authentication: Authentication) -> ORJSONResponse:
+    return ORJSONResponse(
+        content = {
+            "pid": os.getpid(),
+            "staticFiles": staticFilesStatistics.toDict()
+        },
+        status_code = StatusCodes.OK
+    )
+
+async def getResponseCacheStatistics(authentication: Authentication) -> ORJSONResponse:
+    return ORJSONResponse(
+        content = {
+            "pid": os.getpid(),
+            "responseCache": responseCache.toDict()
+        },
+        status_code = StatusCodes.OK
+    )
+
+async def getWebhookQueueStatistics(databaseInformation: DatabaseInformation, authentication: Authentication) -> ORJSONResponse:
+    Session, Models = databaseInformation
+    async with Session() as session:
+        # The amount of events in each status, across every worker
+        statusCountsRawQuery = await session.execute(
+            select(Models.WebhookEvent.status, func.count()).group_by(Models.WebhookEvent.status)
+        )
+        statusCounts = {status.name: count for status, count in statusCountsRawQuery.all()}
+        # How long the oldest event that still needs processing has been waiting
+        oldestWaitingRawQuery = await session.execute(
+            select(func.min(Models.WebhookEvent.createdAt)).filter(
+                Models.WebhookEvent.status.in_(['PENDING', 'PROCESSING', 'FAILED'])
+            )
+        )
+        oldestWaiting = oldestWaitingRawQuery.scalar()
+        return ORJSONResponse(
+            content = {
+                "pid": os.getpid(),
+                "statusCounts": statusCounts,
+                "oldestWaiting": str(oldestWaiting) if oldestWaiting else None,
+                "worker": webhookQueue.toDict()
+            },
+            status_code = StatusCodes.OK
+        )
@@ -1,14 +1,16 @@
 from fastapi import Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from utils.getDatabaseInformation import DatabaseInformation
 from middleware.authentication import Authentication
 from utils.custom_error import CustomError
 from utils.status_codes import StatusCodes
 from utils.stripe import getStripe
+from utils.purchaseStatus import isPurchaseStatusFresh, createStripeSubscriptionMirror
 from sqlalchemy import select
+from datetime import datetime
 import os
     
-async def createStripeCheckoutSessionForSubscription(subscription_id: str, databaseInformation: DatabaseInformation, authentication: Authentication) -> JSONResponse:
+async def createStripeCheckoutSessionForSubscription(subscription_id: str, databaseInformation: DatabaseInformation, authentication: Authentication) -> ORJSONResponse:
     Session, Models = databaseInformation
     async with Session() as session:
         # Get access to the Stripe API 
@@ -23,10 +25,16 @@ async def createStripeCheckoutSessionForSubscription(subscription_id: str, datab
         purchase = purchaseRawQuery.scalar()
         # Check if a Purchase has been made for this specific subscription
         if purchase:
-            # Get a hold of the Stripe Subscription Data
-            stripeSubscriptionData = await stripe.Subscription.retrieve_async(purchase.stripe_subscription_id)
+            # The Stripe webhooks keep a copy of the Stripe Subscription's "status" on the Purchase. We only ask Stripe for
+            # it when that copy is too old to trust (see "utils/purchaseStatus.py").
+            if not isPurchaseStatusFresh(purchase):
+                # Get a hold of the Stripe Subscription Data
+                stripeSubscriptionData = await stripe.Subscription.retrieve_async(purchase.stripe_subscription_id)
+                # Refresh our copy (it gets saved along with everything else at the end)
+                for key, value in createStripeSubscriptionMirror(stripeSubscriptionData, datetime.now()).items():
+                    setattr(purchase, key, value)
             # If the Subscription is currently "active"
-            if stripeSubscriptionData.status == "active":
+            if purchase.stripe_status == "active":
                 raise CustomError('You cannot create a checkout session for something you are already subscribed to!', StatusCodes.BAD_REQUEST)
         subscriptionRawQuery = await session.execute(
             select(Models.Subscription).filter(
@@ -49,12 +57,17 @@ async def createStripeCheckoutSessionForSubscription(subscription_id: str, datab
         user = userRawQuery.scalar()
         # Get a hold of the users "customer_id"
         customer_id = user.customer_id
-        # Get a hold of the subscriptions "price_id" which can be found from the "product_id"
-        all_prices_from_product = await stripe.Price.list_async(
-            product = subscription.product_id
-        )
-        # There will only ever be ONE price associated with a product. Because of how we setup our Product creation.
-        price_id = all_prices_from_product.data[0].id
+        # Get a hold of the subscriptions "price_id", which we save when creating the Subscription
+        price_id = subscription.price_id
+        if not price_id:
+            # Subscriptions created before we saved the "price_id" need to find it from the "product_id". There will only
+            # ever be ONE price associated with a product. Because of how we setup our Product creation. And then we save
+            # it (the commit happens once the checkout session is created) so this only ever happens once per Subscription.
+            all_prices_from_product = await stripe.Price.list_async(
+                product = subscription.product_id
+            )
+            price_id = all_prices_from_product.data[0].id
+            subscription.price_id = price_id
         # Base URL for Success/Cancel Handling
         baseUrl = os.getenv('BASE_URL')
         # If a Purchase has already been made for this AND its "status" is set to "CANCELED" you need to create a "Stripe Checkout Session" that starts billing
@@ -77,14 +90,16 @@ async def createStripeCheckoutSessionForSubscription(subscription_id: str, datab
                 success_url = f"{baseUrl}/success",
                 cancel_url = f"{baseUrl}/subscriptions/{subscription_id}"
             )
+            # Save the "price_id" and the copy of the Stripe Subscription's "status" if we had to look them up
+            await session.commit()
             # Provide the Client with the "url" on the "Stripe Checkout Session Object" so they can go to a page hosted by "Stripe" to securely
             # enter in the payment information!
-            return JSONResponse(
+            return ORJSONResponse(
                 content = {"checkout_link": stripeCheckoutSession.url},
                 status_code = StatusCodes.CREATED
             )
         
-async def manageSubscriptions(databaseInformation: DatabaseInformation, authentication: Authentication) -> JSONResponse:
+async def manageSubscriptions(databaseInformation: DatabaseInformation, authentication: Authentication) -> ORJSONResponse:
     Session, Models = databaseInformation
     async with Session() as session:
         # Get access to Stripe object
@@ -104,16 +119,17 @@ async def manageSubscriptions(databaseInformation: DatabaseInformation, authenti
         )
         # If you fail to go to the "https://dashboard.stripe.com/test/settings/billing/portal" site and click on the "Save changes" button you
         # won't be able to generate "customer_portal_sessions" so make sure you go to this link. Its just one button. And then your set.
-        return JSONResponse(
+        return ORJSONResponse(
             content = {"customer_portal_session_url": customer_portal_session.url},
             status_code = StatusCodes.OK
         )
     
-# Stripe Web Hook Event Handlers
-from stripeWebhookEventHandlers.subscription_created import subscriptionCreated
-from stripeWebhookEventHandlers.subscription_updated import subscriptionUpdated
+# Stripe Web Hook Event Queue
+from utils.webhookQueue import webhookQueue, webhookEventHandlers
+from sqlalchemy.exc import IntegrityError
+import json
     
-async def stripeWebhooks(request: Request, databaseInformation: DatabaseInformation) -> JSONResponse:
+async def stripeWebhooks(request: Request, databaseInformation: DatabaseInformation) -> ORJSONResponse:
     Session, Models = databaseInformation
     async with Session() as session:
         # Event Variable with Function Global Scope
@@ -136,13 +152,29 @@ async def stripeWebhooks(request: Request, databaseInformation: DatabaseInformat
         # View Event Type
         # print('Event', event)
         # print('Event Type', event.type)
-        # Created Subscription
-        if event.type == 'customer.subscription.created':
-            await subscriptionCreated(event, databaseInformation)
-        # Updated Subscription
-        if event.type == 'customer.subscription.updated':
-            await subscriptionUpdated(event, databaseInformation)
-        return JSONResponse(
+        webhookQueue.received += 1
+        # We don't process the event here. The handlers make several Stripe API calls and database commits, and if that
+        # takes too long Stripe gives up on us and sends the event again. So we just save the event and respond right away,
+        # and the webhook queue (utils/webhookQueue.py) processes it in the background.
+        if event.type in webhookEventHandlers:
+            session.add(
+                Models.WebhookEvent(
+                    id = event.id,
+                    type = event.type,
+                    payload = json.loads(body),
+                    nextAttemptAt = datetime.now()
+                )
+            )
+            try:
+                await session.commit()
+                webhookQueue.notify()
+            except IntegrityError:
+                # We already have this event (Stripe sent it again), so there is nothing left to do
+                await session.rollback()
+                webhookQueue.duplicates += 1
+        else:
+            webhookQueue.ignored += 1
+        return ORJSONResponse(
             content = {"msg": "Stripe Webhooks"},
             status_code = StatusCodes.CREATED
         )
\ No newline at end of file
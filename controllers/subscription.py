@@ -1,68 +1,92 @@
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, Response
 from utils.getDatabaseInformation import DatabaseInformation
 from middleware.authentication import Authentication
 from pydanticModels.subscription import CreateSubscriptionBody, UpdateSubscriptionBody
 from utils.custom_error import CustomError
 from utils.status_codes import StatusCodes
-from utils.stripe import getStripe
-from utils.deleteFile import deleteFile
+from utils.serializers import serializeMany, serializeSubscription, variantUrls
+from utils.storage import fileUrl
+from utils.stripe import getStripe, cancelStripeSubscriptions, STRIPE_CANCEL_BATCH_SIZE
+from utils.sideEffects import afterCommit
+from utils.imageVariants import createImageVariantsSideEffect
+from utils.blobStore import releaseBlob
+from utils.upload import receiveImageUpload, storeImageUpload, discardImageUpload
+from database.models.Subscription import archiveStripeProduct
 from utils.enums import PurchaseStatus
-from sqlalchemy import select
-from sqlalchemy.orm import joinedload
-from werkzeug.utils import secure_filename
-from uuid import uuid4
-import math
-import aiofiles
+from utils.paginate import paginate
+from utils.search import usernameSearch
+from utils.responseCache import responseCache, invalidateSubscriptionListings, invalidateCreatorProfile, SUBSCRIPTION_LIST_CACHE_TTL, SUBSCRIPTIONS_NAMESPACE
+from sqlalchemy import select, update, func, case
+from sqlalchemy.orm import joinedload, contains_eager
+import orjson
 
-async def getAllSubscriptions(username: str, page: int, limit: int, databaseInformation: DatabaseInformation) -> JSONResponse:
+async def getAllSubscriptions(username: str, page: int, limit: int, cursor: str, databaseInformation: DatabaseInformation) -> Response:
     Session, Models = databaseInformation
-    async with Session() as session:
-        filters = []
-        skip = (page - 1) * limit
-        if username:
-            filters.append(Models.Subscription.user.has(Models.User.username.ilike(f"%{username}%")))
-        # In simple terms when you use "joinedload" inside of the "options" method its similar to using the "populate" method
-        # from Mongoose. You are asking it to be filled with the associated data. 
-        subscriptionsRawQuery = await session.execute(
-            select(Models.Subscription).filter(*filters).options(joinedload(Models.Subscription.user)).offset(skip).limit(limit)
-        )
-        subscriptions = subscriptionsRawQuery.scalars().all()
-        totalSubscriptionsRawQuery = await session.execute(
-            select(Models.Subscription).filter(*filters)
-        )
-        totalSubscriptions = len(totalSubscriptionsRawQuery.scalars().all())
-        numberOfPages = math.ceil(totalSubscriptions / limit)
-        return JSONResponse(
-            content = {
-                "subscriptions": [
-                    {
-                        "id": subscription.id,
-                        "title": subscription.title,
-                        "description": subscription.description,
-                        "price": subscription.price,
-                        "user_id": subscription.user_id,
-                        "user": {
-                            "id": subscription.user.id,
-                            "fullName": subscription.user.fullName,
-                            "username": subscription.user.username,
-                            "email": subscription.user.email,
-                            "bio": subscription.user.bio,
-                            "profilePicture": subscription.user.profilePicture,
-                            "coverPicture": subscription.user.coverPicture,
-                            "role": subscription.user.role.name,
-                            "createdAt": str(subscription.user.createdAt),
-                            "updatedAt": str(subscription.user.updatedAt)
-                        }
-                    }
-                    for subscription in subscriptions
-                ],
+    # This is the most requested endpoint and it's the same for every visitor, so the encoded response is cached for a
+    # little while (see utils/responseCache.py). Creating, updating or deleting a subscription and updating a creator's
+    # profile invalidate it.
+    async def listSubscriptions() -> bytes:
+        async with Session() as session:
+            filters = []
+            if username:
+                filters.append(usernameSearch(Models.User.username, username))
+            # Instead of filtering with "has()" (a correlated subquery that runs once per subscription) we join the users table a
+            # single time. And "contains_eager" tells SQLAlchemy to fill "subscription.user" from that same join, so we don't need
+            # a second join from "joinedload" like before.
+            subscriptions, totalSubscriptions, numberOfPages, nextCursor = await paginate(
+                session = session,
+                query = select(Models.Subscription).join(Models.Subscription.user).filter(*filters),
+                model = Models.Subscription,
+                page = page,
+                limit = limit,
+                cursor = cursor,
+                options = [contains_eager(Models.Subscription.user)]
+            )
+            return orjson.dumps({
+                "subscriptions": serializeMany(serializeSubscription, subscriptions),
                 "totalSubscriptions": totalSubscriptions,
-                "numberOfPages": numberOfPages
-            },
-            status_code = StatusCodes.OK
-        )
+                "numberOfPages": numberOfPages,
+                "nextCursor": nextCursor
+            })
+    content, cached = await responseCache.getOrCreate(
+        namespace = SUBSCRIPTIONS_NAMESPACE,
+        key = (username, page, limit, cursor),
+        ttl = SUBSCRIPTION_LIST_CACHE_TTL,
+        create = listSubscriptions
+    )
+    # The JSON is already encoded, so it's sent as is instead of through "ORJSONResponse"
+    return Response(
+        content = content,
+        media_type = "application/json",
+        status_code = StatusCodes.OK,
+        headers = {"X-Cache": "HIT" if cached else "MISS"}
+    )
     
-async def createSubscription(createSubscriptionBody: CreateSubscriptionBody, databaseInformation: DatabaseInformation, authentication: Authentication) -> JSONResponse:
+# At this point we have to make the Stripe Product. This is so that when we create the "Subscription" object we will now
+# have both the customer_id and product_id. 
+async def createStripeProductAndPrice(createSubscriptionBody: CreateSubscriptionBody):
+    stripe = getStripe()
+    product = await stripe.Product.create_async(
+        # The product we are creating here does not require you to input the price, this is simply for defining
+        # what it is your selling/offering to the consumer/customer. As a best practice always provide a name and
+        # description.
+        name = createSubscriptionBody.title,
+        description = createSubscriptionBody.description
+    )
+    # Now we can create a Price object because of the Product ID
+    price = await stripe.Price.create_async(
+        currency = "usd",
+        unit_amount = createSubscriptionBody.price,
+        # Its very important that we add this line of code here, this will make it so that its a payment that needs to be done every month, it
+        # also has awesome type hints.
+        recurring = {"interval": "month"},
+        # You MUST provide either "product" or "product_data"
+        # product - pass in the product_id
+        product = product.id
+    )
+    return product, price
+
+async def createSubscription(createSubscriptionBody: CreateSubscriptionBody, databaseInformation: DatabaseInformation, authentication: Authentication) -> ORJSONResponse:
     Session, Models = databaseInformation
     async with Session() as session:
         amountOfSubscriptionsRawQuery = await session.execute(
@@ -73,70 +97,62 @@ async def createSubscription(createSubscriptionBody: CreateSubscriptionBody, dat
         amountOfSubscriptions = len(amountOfSubscriptionsRawQuery.scalars().all())
         if amountOfSubscriptions == 3:
             raise CustomError('A creator is limited to creating a maximum of 3 subscription types!', StatusCodes.BAD_REQUEST)
-        # If a Image is not provided throw an error, image.size is equal to bytes
-        if createSubscriptionBody.image.size == 0:
-            raise CustomError('Please check all inputs!', StatusCodes.BAD_REQUEST)
-        # Check if File is of type Image, if not throw an error
-        if not createSubscriptionBody.image.content_type.startswith('image'):
-            raise CustomError('File Type must be an Image!', StatusCodes.BAD_REQUEST)
-        # Check if Image Size is not larger than max size of 2MB
-        if createSubscriptionBody.image.size > (1024 * 1024) * 2:
-            raise CustomError('The image size must not exceed 2MB!', StatusCodes.BAD_REQUEST)
-        # Save the Image
-        file_location = f"static/uploads/subscription_images/{authentication.get('username')}_{uuid4()}_{secure_filename(createSubscriptionBody.image.filename)}"
-        # If the file at this location does not exist create one, and we wan't to set the mode to "wb" for
-        # write bytes. Because we are dealing with an image not some text. And things like images, videos,
-        # and pdfs require it to be done in binary.
-        async with aiofiles.open(file_location, "wb") as file:
-            content = await createSubscriptionBody.image.read()
-            await file.write(content)
-        # At this point we have to make the Stripe Product. This is so that when we create the "Subscription" object we will now
-        # have both the customer_id and product_id. 
-        stripe = getStripe()
-        product = await stripe.Product.create_async(
-            # The product we are creating here does not require you to input the price, this is simply for defining
-            # what it is your selling/offering to the consumer/customer. As a best practice always provide a name and
-            # description.
-            name = createSubscriptionBody.title,
-            description = createSubscriptionBody.description
-        )
-        # Now we can create a Price object because of the Product ID
-        await stripe.Price.create_async(
-            currency = "usd",
-            unit_amount = createSubscriptionBody.price,
-            # Its very important that we add this line of code here, this will make it so that its a payment that needs to be done every month, it
-            # also has awesome type hints.
-            recurring = {"interval": "month"},
-            # You MUST provide either "product" or "product_data"
-            # product - pass in the product_id
-            product = product.id
-        )
-        subscription = Models.Subscription(
-            title = createSubscriptionBody.title,
-            description = createSubscriptionBody.description,
-            price = createSubscriptionBody.price,
-            image = f"/{file_location}",
-            product_id = product.id,
-            user_id = authentication.get('userId')
-        )
-        session.add(subscription)
+        # Done reading, give the connection back to the pool instead of holding it (and a transaction) while we wait on Stripe
         await session.commit()
+        # Check the Image first, it throws an error if it's missing, not an image or bigger than 2MB (see utils/upload.py). That way
+        # a bad upload is turned away before we make anything on Stripe.
+        receivedImage = await receiveImageUpload(
+            upload = createSubscriptionBody.image,
+            name = "Image"
+        )
+        try:
+            product, price = await createStripeProductAndPrice(createSubscriptionBody)
+        except BaseException:
+            await discardImageUpload(receivedImage.temporaryLocation)
+            raise
+        # The image is only saved once Stripe is done. Saving it counts a reference to its blob, which locks the blob's row
+        # until we commit (see utils/blobStore.py), and nobody else uploading the same image should have to wait on Stripe.
+        try:
+            file_location = await storeImageUpload(session, receivedImage)
+            subscription = Models.Subscription(
+                title = createSubscriptionBody.title,
+                description = createSubscriptionBody.description,
+                price = createSubscriptionBody.price,
+                image = f"/{file_location}",
+                product_id = product.id,
+                price_id = price.id,
+                user_id = authentication.get('userId')
+            )
+            session.add(subscription)
+            # Make the resized copies of the image once the Subscription is saved (see utils/imageVariants.py)
+            afterCommit(session, 'createImageVariants', createImageVariantsSideEffect, Models.Subscription.image, Models.Subscription.imageVariants, file_location)
+            await session.commit()
+        except Exception:
+            # The Subscription wasn't saved, so nobody should be able to buy its Product
+            try:
+                await archiveStripeProduct(product.id)
+            except Exception as error:
+                print(f"Could not archive Stripe Product {product.id}: {error!r}")
+            raise
+        await invalidateSubscriptionListings()
+        await invalidateCreatorProfile(authentication.get('username'))
         await session.refresh(subscription)
         # Update the "Stripe Product" to include metadata for the "subscription_id"
-        await stripe.Product.modify_async(
+        await getStripe().Product.modify_async(
             product.id,
             metadata = {
                 "subscription_id": subscription.id
             }
         )
-        return JSONResponse(
+        return ORJSONResponse(
             content = {
                 "subscription": {
                     "id": subscription.id,
                     "title": subscription.title,
                     "description": subscription.description,
                     "price": subscription.price,
-                    "image": subscription.image,
+                    "image": fileUrl(subscription.image),
+                    "imageVariants": variantUrls(subscription.imageVariants),
                     "product_id": subscription.product_id,
                     "user_id": subscription.user_id,
                 }
@@ -144,7 +160,7 @@ async def createSubscription(createSubscriptionBody: CreateSubscriptionBody, dat
             status_code = StatusCodes.CREATED
         )
     
-async def updateSubscription(subscription_id: str, updateSubscriptionBody: UpdateSubscriptionBody, databaseInformation: DatabaseInformation, authentication: Authentication) -> JSONResponse:
+async def updateSubscription(subscription_id: str, updateSubscriptionBody: UpdateSubscriptionBody, databaseInformation: DatabaseInformation, authentication: Authentication) -> ORJSONResponse:
     Session, Models = databaseInformation
     async with Session() as session:
         subscriptionRawQuery = await session.execute(
@@ -156,67 +172,108 @@ async def updateSubscription(subscription_id: str, updateSubscriptionBody: Updat
         subscription = subscriptionRawQuery.scalar()
         if not subscription:
             raise CustomError('No Subscription Found with the ID Provided!', StatusCodes.NOT_FOUND)
+        # Check the New Image before touching Stripe, it throws an error if it's not an image or bigger than 2MB (see utils/upload.py)
+        receivedImage = None
+        if updateSubscriptionBody.image:
+            receivedImage = await receiveImageUpload(
+                upload = updateSubscriptionBody.image,
+                name = "Image"
+            )
         # To update the Stripe Product use the "product_id"
         stripe = getStripe()
-        await stripe.Product.modify_async(
-            # id - Stripe Product ID
-            id = subscription.product_id,
-            name = updateSubscriptionBody.title,
-            description = updateSubscriptionBody.description
-        )
+        try:
+            await stripe.Product.modify_async(
+                # id - Stripe Product ID
+                id = subscription.product_id,
+                name = updateSubscriptionBody.title,
+                description = updateSubscriptionBody.description
+            )
+        except BaseException:
+            if receivedImage:
+                await discardImageUpload(receivedImage.temporaryLocation)
+            raise
         subscription.title = updateSubscriptionBody.title
         subscription.description = updateSubscriptionBody.description
         # Check if a Image is Provided
-        if updateSubscriptionBody.image:
-            # Check if File is of type Image, if not throw an error
-            if not updateSubscriptionBody.image.content_type.startswith('image'):
-                raise CustomError('File Type must be an Image!', StatusCodes.BAD_REQUEST)
-            # Check if Image is not exceeding the size limit
-            if updateSubscriptionBody.image.size > (1024 * 1024) * 2:
-                raise CustomError('Image size must not exceed 2MB!', StatusCodes.BAD_REQUEST)
-            # Check if an existing value exists already and if so delete it
+        if receivedImage:
+            # Save the New Image, this locks its blob's row until we commit so it happens after the Stripe call
+            file_location = await storeImageUpload(session, receivedImage)
+            # Check if an existing value exists already and if so let go of it, it gets deleted once nothing uses it (see utils/blobStore.py)
             imageLocationWithoutFirstSlash = subscription.image[1:]
-            deleteFile(imageLocationWithoutFirstSlash)
-            # Upload New Image
-            file_location = f"static/uploads/subscription_images/{authentication.get('username')}_{uuid4()}_{secure_filename(updateSubscriptionBody.image.filename)}"
-            async with aiofiles.open(file_location, "wb") as file:
-                content = await updateSubscriptionBody.image.read()
-                await file.write(content) 
+            await releaseBlob(session, imageLocationWithoutFirstSlash)
+            # Make the resized copies of the new one, once it's saved
+            afterCommit(session, 'createImageVariants', createImageVariantsSideEffect, Models.Subscription.image, Models.Subscription.imageVariants, file_location)
             # Update Subscription Image Value
             subscription.image = f"/{file_location}"
+            subscription.imageVariants = None
         await session.commit()
+        await invalidateSubscriptionListings()
+        await invalidateCreatorProfile(authentication.get('username'))
         await session.refresh(subscription)
-        return JSONResponse(
+        return ORJSONResponse(
             content = {
-                "subscription": {
-                    "id": subscription.id,
-                    "title": subscription.title,
-                    "description": subscription.description,
-                    "price": subscription.price,
-                    "user_id": subscription.user_id,
-                    "user": {
-                        "id": subscription.user.id,
-                        "fullName": subscription.user.fullName,
-                        "username": subscription.user.username,
-                        "email": subscription.user.email,
-                        "bio": subscription.user.bio,
-                        "profilePicture": subscription.user.profilePicture,
-                        "coverPicture": subscription.user.coverPicture,
-                        "role": subscription.user.role.name,
-                        "createdAt": str(subscription.user.createdAt),
-                        "updatedAt": str(subscription.user.updatedAt)
-                    }
-                }
+                "subscription": serializeSubscription(subscription)
             },
             status_code = StatusCodes.OK
         )
     
-async def deleteSubscription(subscription_id: str, databaseInformation: DatabaseInformation, authentication: Authentication) -> JSONResponse:
+async def deleteSubscription(subscription_id: str, databaseInformation: DatabaseInformation, authentication: Authentication) -> ORJSONResponse:
     Session, Models = databaseInformation
+    # This is done in 3 short sessions instead of one, so we never hold a database connection (and an open transaction)
+    # while we wait on Stripe, which can take a while for a Subscription with thousands of Purchases.
+    # 1 - Check this is your Subscription and get what has to be canceled
     async with Session() as session:
-        # Get access to Stripe
-        stripe = getStripe()
         # Check if this is even your subscription to delete
+        subscriptionRawQuery = await session.execute(
+            select(Models.Subscription.id).filter(
+                Models.Subscription.id == subscription_id,
+                Models.Subscription.user_id == authentication.get('userId')
+            )
+        )
+        if not subscriptionRawQuery.scalar():
+            raise CustomError('No Subscription Found with the ID Provided!', StatusCodes.NOT_FOUND)
+        # Every Purchase of this Subscription("referred to Product in Stripe") has to be canceled on Stripe and set to "EXPIRED".
+        # We only need the Stripe Subscription IDs for that, so that's all we load (not entire Purchase objects). And we skip
+        # the ones that are already "EXPIRED", those were canceled by an earlier attempt at deleting this Subscription.
+        stripeSubscriptionIds = (await session.execute(
+            select(Models.Purchase.stripe_subscription_id).filter(
+                Models.Purchase.subscription_id == subscription_id,
+                Models.Purchase.status != PurchaseStatus.EXPIRED
+            )
+        )).scalars().all()
+    # 2 - Cancel them on Stripe a bunch at a time instead of one after the other. After every batch the ones that got canceled
+    # are set to "EXPIRED" with a single UPDATE statement, that's the progress GET /api/v1/subscriptions/:id/deletion reports.
+    canceled = []
+    failed = []
+    for batchStart in range(0, len(stripeSubscriptionIds), STRIPE_CANCEL_BATCH_SIZE):
+        batchCanceled, batchFailed = await cancelStripeSubscriptions(stripeSubscriptionIds[batchStart:batchStart + STRIPE_CANCEL_BATCH_SIZE])
+        canceled.extend(batchCanceled)
+        failed.extend(batchFailed)
+        if batchCanceled:
+            async with Session() as session:
+                await session.execute(
+                    update(Models.Purchase).filter(
+                        Models.Purchase.subscription_id == subscription_id,
+                        Models.Purchase.stripe_subscription_id.in_(batchCanceled)
+                    ).values(status = PurchaseStatus.EXPIRED).execution_options(synchronize_session = False)
+                )
+                await session.commit()
+    if canceled:
+        # Their active subscriber counts went down
+        await invalidateCreatorProfile(authentication.get('username'))
+    # If some of the cancellations failed we keep the Subscription around, otherwise those users would keep getting charged.
+    # Deleting it again only retries the ones that failed.
+    if failed:
+        return ORJSONResponse(
+            content = {
+                "msg": "Some purchases could not be canceled on Stripe, please try deleting the subscription again!",
+                "canceled": len(canceled),
+                "failed": failed
+            },
+            status_code = StatusCodes.BAD_GATEWAY
+        )
+    # 3 - Delete the Subscription
+    async with Session() as session:
         subscriptionRawQuery = await session.execute(
             select(Models.Subscription).filter(
                 Models.Subscription.id == subscription_id,
@@ -224,27 +281,58 @@ async def deleteSubscription(subscription_id: str, databaseInformation: Database
             )
         )
         subscription = subscriptionRawQuery.scalar()
+        # Someone else deleted it while we were talking to Stripe
         if not subscription:
             raise CustomError('No Subscription Found with the ID Provided!', StatusCodes.NOT_FOUND)
-        # Change Status of all Purchases if any for this Subscription("referred to Product in Stripe") to "EXPIRED", because 
-        # internally Stripe stops payment for a product/subscription that has been deleted, so you don't need to worry about
-        # users being charged post product/subscription deletion.
-        purchases = (await session.execute(
-            select(Models.Purchase).filter(
+        # When a Subscription gets deleted its Purchases have to let go of it, do that for all of them in a single UPDATE
+        # statement too (otherwise SQLAlchemy loads every Purchase to do it one at a time).
+        await session.execute(
+            update(Models.Purchase).filter(
                 Models.Purchase.subscription_id == subscription_id
-            )
-        )).scalars().all()
-        # Iterate over each purchase and set the "status" property to "EXPIRED" and cancel the subscription on Stripe
-        for purchase in purchases:
-            purchase.status = "EXPIRED"
-            await stripe.Subscription.cancel_async(purchase.stripe_subscription_id)
-        # Save these changes
-        await session.commit()
+            ).values(subscription_id = None).execution_options(synchronize_session = False)
+        )
         # To keep the controller clean and avoid cluttering it with the image deletion process, we'll 
         # move that logic to the Subscription model instead.
         await session.delete(subscription)
         await session.commit()
-        return JSONResponse(
-            content = {"msg": "Deleted Subscription!"},
+    await invalidateSubscriptionListings()
+    await invalidateCreatorProfile(authentication.get('username'))
+    return ORJSONResponse(
+        content = {
+            "msg": "Deleted Subscription!",
+            "canceled": len(canceled)
+        },
+        status_code = StatusCodes.OK
+    )
+
+# How far along deleting a Subscription is, so the frontend can show progress while "deleteSubscription" works through the
+# Stripe cancellations. It's read from the database, so it doesn't matter which worker is doing the deleting.
+async def getSubscriptionDeletionProgress(subscription_id: str, databaseInformation: DatabaseInformation, authentication: Authentication) -> ORJSONResponse:
+    Session, Models = databaseInformation
+    async with Session() as session:
+        subscriptionRawQuery = await session.execute(
+            select(Models.Subscription.id).filter(
+                Models.Subscription.id == subscription_id,
+                Models.Subscription.user_id == authentication.get('userId')
+            )
+        )
+        if not subscriptionRawQuery.scalar():
+            raise CustomError('No Subscription Found with the ID Provided!', StatusCodes.NOT_FOUND)
+        # Both counts in one pass over the "(subscription_id, status)" index
+        countsRawQuery = await session.execute(
+            select(
+                func.count(),
+                func.coalesce(func.sum(case((Models.Purchase.status == PurchaseStatus.EXPIRED, 1), else_ = 0)), 0)
+            ).filter(
+                Models.Purchase.subscription_id == subscription_id
+            )
+        )
+        total, expired = countsRawQuery.one()
+        return ORJSONResponse(
+            content = {
+                "purchases": total,
+                "canceled": int(expired),
+                "remaining": total - int(expired)
+            },
             status_code = StatusCodes.OK
-        )
\ No newline at end of file
+        )
@@ -1,81 +1,121 @@
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, Response
 from utils.getDatabaseInformation import DatabaseInformation
 from middleware.authentication import Authentication
 from pydanticModels.user import UpdateUserBody
 from utils.custom_error import CustomError
 from utils.status_codes import StatusCodes
-from utils.deleteFile import deleteFile
-import aiofiles
-from uuid import uuid4
-from sqlalchemy import select, or_
-from werkzeug.utils import secure_filename
-import math
+from utils.serializers import serializeMany, serializeUser, serializeSubscriptionTier
+from utils.sideEffects import afterCommit
+from utils.imageVariants import createImageVariantsSideEffect
+from utils.blobStore import releaseBlob
+from utils.upload import saveImageUpload
+from utils.paginate import paginate
+from utils.search import usernameSearch
+from utils.responseCache import responseCache, invalidateSubscriptionListings, invalidateCreatorProfile, profileNamespace, PROFILE_CACHE_TTL
+from utils.cachedStaticFiles import etagMatches
+from utils.enums import Role, PurchaseStatus
+from sqlalchemy import select, or_, func
+from typing import Optional
+import hashlib
+import orjson
 
-async def showCurrentUser(databaseInformation: DatabaseInformation, authentication: Authentication) -> JSONResponse:
+async def showCurrentUser(databaseInformation: DatabaseInformation, authentication: Authentication) -> ORJSONResponse:
     Session, Models = databaseInformation
     async with Session() as session:
         userRawQuery = await session.execute(
             select(Models.User).filter(Models.User.id == authentication.get('userId'))
         )
         user = userRawQuery.scalar()
-        return JSONResponse(
+        return ORJSONResponse(
             content = {
-                "user": {
-                    "id": user.id,
-                    "fullName": user.fullName,
-                    "username": user.username,
-                    "email": user.email,
-                    "bio": user.bio,
-                    "profilePicture": user.profilePicture,
-                    "coverPicture": user.coverPicture,
-                    "role": user.role.name,
-                    "createdAt": str(user.createdAt),
-                    "updatedAt": str(user.updatedAt)
-                }
+                "user": serializeUser(user)
             },
             status_code = StatusCodes.OK
         )
 
-async def getAllUsers(username, limit, page, databaseInformation: DatabaseInformation) -> JSONResponse:
+async def getAllUsers(username, limit, page, cursor, databaseInformation: DatabaseInformation) -> ORJSONResponse:
     Session, Models = databaseInformation
     async with Session() as session:
         filters = [
             Models.User.role != 'ADMIN'
         ]
-        skip = (page - 1) * limit
         if username:
-            filters.append(Models.User.username.ilike(f"%{username}%"))
-        usersRawQuery = await session.execute(
-            select(Models.User).filter(*filters).offset(skip).limit(limit)
+            filters.append(usernameSearch(Models.User.username, username))
+        users, totalUsers, numberOfPages, nextCursor = await paginate(
+            session = session,
+            query = select(Models.User).filter(*filters),
+            model = Models.User,
+            page = page,
+            limit = limit,
+            cursor = cursor
         )
-        users = usersRawQuery.scalars().all()
-        totalUsersRawQuery = await session.execute(
-            select(Models.User).filter(*filters)
-        )
-        totalUsers = len(totalUsersRawQuery.scalars().all())
-        numberOfPages = math.ceil(totalUsers / limit)
-        return JSONResponse(
+        return ORJSONResponse(
             content = {
-                "users": [
-                    {
-                        "id": user.id,
-                        "fullName": user.fullName,
-                        "username": user.username,
-                        "email": user.email,
-                        "bio": user.bio,
-                        "profilePicture": user.profilePicture,
-                        "coverPicture": user.coverPicture,
-                        "role": user.role.name,
-                        "createdAt": str(user.createdAt),
-                        "updatedAt": str(user.updatedAt)
-                    }
-                    for user in users
-                ],
+                "users": serializeMany(serializeUser, users),
                 "totalUsers": totalUsers,
-                "numberOfPages": numberOfPages
+                "numberOfPages": numberOfPages,
+                "nextCursor": nextCursor
             }
         )
     
+# Everything the frontend needs for a creator's page (the creator, their subscriptions and how many people are subscribed
+# to each one) in a single query, instead of searching the users and then the subscriptions by the same username.
+async def getCreatorProfile(username: str, ifNoneMatch: Optional[str], databaseInformation: DatabaseInformation) -> Response:
+    Session, Models = databaseInformation
+    async def buildProfile() -> Optional[bytes]:
+        async with Session() as session:
+            # Counted per Subscription with the "(subscription_id, status)" index on purchases, without reading the purchases
+            activeSubscribers = select(func.count()).select_from(Models.Purchase).filter(
+                Models.Purchase.subscription_id == Models.Subscription.id,
+                Models.Purchase.status == PurchaseStatus.ACTIVE
+            ).correlate(Models.Subscription).scalar_subquery()
+            # One row per Subscription (at most 3), or a single row with no Subscription for someone who has none. The user is
+            # found with the unique index on "username" and their Subscriptions with the index on "user_id", and every row
+            # gives back the same User object, so nothing gets loaded lazily afterwards.
+            profileRawQuery = await session.execute(
+                select(Models.User, Models.Subscription, activeSubscribers).outerjoin(
+                    Models.Subscription, Models.Subscription.user_id == Models.User.id
+                ).filter(
+                    Models.User.username == username,
+                    Models.User.role != Role.ADMIN
+                ).order_by(Models.Subscription.createdAt, Models.Subscription.id)
+            )
+            rows = profileRawQuery.all()
+            if not rows:
+                return None
+            subscriptions = [serializeSubscriptionTier(subscription, count) for _, subscription, count in rows if subscription is not None]
+            return orjson.dumps({
+                "user": serializeUser(rows[0][0]),
+                "subscriptions": subscriptions,
+                "totalActiveSubscribers": sum(subscription["activeSubscribers"] for subscription in subscriptions)
+            })
+    # Cached per creator (see utils/responseCache.py), a change to one creator only invalidates theirs. A username that
+    # doesn't exist isn't cached, so it's not stuck as missing once someone signs up with it.
+    content, cached = await responseCache.getOrCreate(
+        namespace = profileNamespace(username),
+        key = username,
+        ttl = PROFILE_CACHE_TTL,
+        create = buildProfile
+    )
+    if content is None:
+        raise CustomError('No User Found with the Username Provided!', StatusCodes.NOT_FOUND)
+    # The ETag is a hash of the response, so the browser (or a CDN) can ask "has it changed?" with "If-None-Match" and get a
+    # 304 without the body if it hasn't. "no-cache" means it has to ask every time instead of showing a profile that's out of date.
+    etag = f'"{hashlib.sha256(content).hexdigest()[:32]}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "public, no-cache",
+        "X-Cache": "HIT" if cached else "MISS"
+    }
+    if etagMatches(ifNoneMatch, etag):
+        return Response(status_code = StatusCodes.NOT_MODIFIED, headers = headers)
+    return Response(
+        content = content,
+        media_type = "application/json",
+        status_code = StatusCodes.OK,
+        headers = headers
+    )
+
 async def updateUser(updateUserBody: UpdateUserBody, databaseInformation: DatabaseInformation, authentication: Authentication):
     Session, Models = databaseInformation
     async with Session() as session:
@@ -103,57 +143,47 @@ async def updateUser(updateUserBody: UpdateUserBody, databaseInformation: Databa
                 raise CustomError('Someone is already using the provided username/email!', StatusCodes.BAD_REQUEST)
         # Check if a Profile Picture or Cover Picture is Provided
         if updateUserBody.profilePicture:
-            # Check if File is of type Image, if not throw an error
-            if not updateUserBody.profilePicture.content_type.startswith('image'):
-                raise CustomError('Profile Picture must be an Image!', StatusCodes.BAD_REQUEST)
-            # Check if Image is not exceeding the size limit
-            if updateUserBody.profilePicture.size > (1024 * 1024) * 2:
-                raise CustomError('The profile picture size must not exceed 2MB!', StatusCodes.BAD_REQUEST)
-            # Check if an existing value exists already and if so delete it
+            # Upload New Image, it throws an error if it's not an image or bigger than 2MB (see utils/upload.py)
+            file_location = await saveImageUpload(
+                session = session,
+                upload = updateUserBody.profilePicture,
+                name = "Profile Picture"
+            )
+            # Check if an existing value exists already and if so let go of it, it gets deleted once nothing uses it (see utils/blobStore.py)
             profilePictureLocationWithoutFirstSlash = user.profilePicture[1:]
-            deleteFile(profilePictureLocationWithoutFirstSlash)
-            # Upload New Image
-            file_location = f"static/uploads/profile_pictures/{updateUserBody.username}_{uuid4()}_{secure_filename(updateUserBody.profilePicture.filename)}"
-            async with aiofiles.open(file_location, "wb") as file:
-                content = await updateUserBody.profilePicture.read()
-                await file.write(content) 
+            await releaseBlob(session, profilePictureLocationWithoutFirstSlash)
+            # Make the resized copies of the new one, once it's saved
+            afterCommit(session, 'createImageVariants', createImageVariantsSideEffect, Models.User.profilePicture, Models.User.profilePictureVariants, file_location)
             # Update Instition Image Value
             user.profilePicture = f"/{file_location}"
+            user.profilePictureVariants = None
             await session.commit()
             await session.refresh(user)
         if updateUserBody.coverPicture:
-            # Check if File is of type Image, if not throw an error
-            if not updateUserBody.coverPicture.content_type.startswith('image'):
-                raise CustomError('Cover Picture must be an Image!', StatusCodes.BAD_REQUEST)
-            # Check if Image is not exceeding the size limit
-            if updateUserBody.coverPicture.size > (1024 * 1024) * 2:
-                raise CustomError('The cover picture size must not exceed 2MB!', StatusCodes.BAD_REQUEST)
-            # Check if an existing value exists already and if so delete it
+            # Upload New Image, it throws an error if it's not an image or bigger than 2MB (see utils/upload.py)
+            file_location = await saveImageUpload(
+                session = session,
+                upload = updateUserBody.coverPicture,
+                name = "Cover Picture"
+            )
+            # Check if an existing value exists already and if so let go of it, it gets deleted once nothing uses it (see utils/blobStore.py)
             coverPictureLocationWithoutFirstSlash = user.coverPicture[1:]
-            deleteFile(coverPictureLocationWithoutFirstSlash)
-            # Upload New Image
-            file_location = f"static/uploads/cover_pictures/{updateUserBody.username}_{uuid4()}_{secure_filename(updateUserBody.coverPicture.filename)}"
-            async with aiofiles.open(file_location, "wb") as file:
-                content = await updateUserBody.coverPicture.read()
-                await file.write(content) 
+            await releaseBlob(session, coverPictureLocationWithoutFirstSlash)
+            # Make the resized copies of the new one, once it's saved
+            afterCommit(session, 'createImageVariants', createImageVariantsSideEffect, Models.User.coverPicture, Models.User.coverPictureVariants, file_location)
             # Update Instition Image Value
             user.coverPicture = f"/{file_location}"
+            user.coverPictureVariants = None
             await session.commit()
             await session.refresh(user)
-        return JSONResponse(
+        # A creator's pictures are shown next to each of their subscriptions in the cached listing
+        if (updateUserBody.profilePicture or updateUserBody.coverPicture) and user.role == Role.CREATOR:
+            await invalidateSubscriptionListings()
+        if updateUserBody.profilePicture or updateUserBody.coverPicture:
+            await invalidateCreatorProfile(user.username)
+        return ORJSONResponse(
             content = {
-                "user": {
-                    "id": user.id,
-                    "fullName": user.fullName,
-                    "username": user.username,
-                    "email": user.email,
-                    "bio": user.bio,
-                    "profilePicture": user.profilePicture,
-                    "coverPicture": user.coverPicture,
-                    "role": user.role.name,
-                    "createdAt": str(user.createdAt),
-                    "updatedAt": str(user.updatedAt)
-                }
+                "user": serializeUser(user)
             },
             status_code = StatusCodes.OK
         )
\ No newline at end of file
@@ -0,0 +1,62 @@
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.exc import TimeoutError
+from typing import TypedDict, Dict
+import bisect
+import time
+
+# Upper bounds (in milliseconds) of the buckets for the checkout wait time histogram. Anything slower than the last bucket
+# lands in "+Inf".
+WAIT_TIME_BUCKETS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+class PoolStatisticsDictionary(TypedDict):
+    checkouts: int
+    timeouts: int
+    totalWaitTime: float
+    maxWaitTime: float
+    waitTimeHistogram: Dict[str, int]
+
+class PoolStatistics:
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.totalWaitTime = 0.0
+        self.maxWaitTime = 0.0
+        self.waitTimeHistogram = [0] * (len(WAIT_TIME_BUCKETS) + 1)
+
+    def recordCheckout(self, waitTime: float) -> None:
+        self.checkouts += 1
+        self.totalWaitTime += waitTime
+        self.maxWaitTime = max(self.maxWaitTime, waitTime)
+        self.waitTimeHistogram[bisect.bisect_left(WAIT_TIME_BUCKETS, waitTime)] += 1
+
+    def recordTimeout(self) -> None:
+        self.timeouts += 1
+
+    def toDict(self) -> PoolStatisticsDictionary:
+        labels = [f"<={bucket}ms" for bucket in WAIT_TIME_BUCKETS] + ["+Inf"]
+        return {
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "totalWaitTime": round(self.totalWaitTime, 3),
+            "maxWaitTime": round(self.maxWaitTime, 3),
+            "waitTimeHistogram": dict(zip(labels, self.waitTimeHistogram))
+        }
+
+# There is one of these per process, and because "app.py" runs 4 uvicorn workers each worker has its own pool and its own
+# statistics. So the real amount of connections to MySQL is up to 4 * (pool size + max overflow).
+poolStatistics = PoolStatistics()
+
+# The pool that "create_async_engine" uses by default is the "AsyncAdaptedQueuePool". We extend it so we can time how long
+# each checkout takes. "_do_get" is the method that hands out a connection, so it includes any time spent waiting for a free
+# connection (and opening a new one if the pool has room to grow). If nothing frees up within "pool_timeout" seconds it
+# raises a "TimeoutError", which we count.
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except TimeoutError:
+            poolStatistics.recordTimeout()
+            raise
+        poolStatistics.recordCheckout((time.perf_counter() - start) * 1000)
+        return connection
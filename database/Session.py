@@ -4,18 +4,34 @@
 # pip install "sqlalchemy[async]"
 
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from database.Pool import InstrumentedPool
 import os
 
-# The "create_async_engine" method is used to define the settings for the database you will connect 
+# The "create_async_engine" method is used to define the settings for the database you will connect
 # to. The keyword argument of "url" allows us to set the location to the database we want to connect
-# to.
+# to. The rest of the keyword arguments configure the connection pool, and they can all be changed
+# from the environment. Keep in mind every uvicorn worker gets its own pool, so with 4 workers the
+# amount of connections can go up to 4 * (DATABASE_POOL_SIZE + DATABASE_MAX_OVERFLOW), which has to
+# stay under the "max_connections" of your MySQL server.
 engine = create_async_engine(
-    url = os.getenv('DATABASE_URL_ASYNC_VERSION')
+    url = os.getenv('DATABASE_URL_ASYNC_VERSION'),
+    # poolclass - our own version of the default pool that keeps track of checkout wait times
+    poolclass = InstrumentedPool,
+    # pool_size - the amount of connections kept open in the pool
+    pool_size = int(os.getenv('DATABASE_POOL_SIZE') or 5),
+    # max_overflow - the amount of extra connections that can be opened when the pool is all checked out
+    max_overflow = int(os.getenv('DATABASE_MAX_OVERFLOW') or 10),
+    # pool_timeout - how many seconds to wait for a connection before giving up
+    pool_timeout = float(os.getenv('DATABASE_POOL_TIMEOUT') or 30),
+    # pool_recycle - connections older than this many seconds get replaced, so MySQL's "wait_timeout" never closes one on us
+    pool_recycle = int(os.getenv('DATABASE_POOL_RECYCLE') or 3600),
+    # pool_pre_ping - test each connection before using it, so a dropped connection never makes it to a request
+    pool_pre_ping = (os.getenv('DATABASE_POOL_PRE_PING') or 'true').lower() == 'true'
 )
 
-# Think of a session as a temporary holding area where you prepare changes before making them 
+# Think of a session as a temporary holding area where you prepare changes before making them
 # permanent in the database. When we invoke the "async_sessionmaker" method and pass in the engine
 # to the keyword argument of "bind" we get returned to us a constructor for making sessions.
 Session = async_sessionmaker(
     bind = engine
-)
\ No newline at end of file
+)
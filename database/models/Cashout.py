@@ -1,5 +1,5 @@
 from database.models.Base import Base
-from sqlalchemy import String, Integer, DateTime, ForeignKey, func, Enum
+from sqlalchemy import String, Integer, DateTime, ForeignKey, func, Enum, Index
 from sqlalchemy.orm import Mapped, mapped_column, validates, relationship
 from utils.enums import CashoutStatus
 import uuid
@@ -7,6 +7,11 @@ import uuid
 class Cashout(Base):
     # To set a table name 
     __tablename__ = "cashouts"
+    # The list endpoints order by "(createdAt, id)" and seek on it for cursor pagination, so we index that exact tuple.
+    __table_args__ = (
+        Index('ix_cashouts_createdAt_id', 'createdAt', 'id'),
+        Index('ix_cashouts_user_id_createdAt_id', 'user_id', 'createdAt', 'id'),
+    )
 
     # To define your columns, follow this format
     # column_name = Mapped[type for column] = mapped_column(specific details about type for column, constraints)
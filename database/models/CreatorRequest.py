@@ -1,5 +1,5 @@
 from database.models.Base import Base
-from sqlalchemy import String, DateTime, func, Enum, ForeignKey
+from sqlalchemy import String, DateTime, func, Enum, ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column, validates, relationship
 from utils.enums import CreatorRequestStatus
 import uuid
@@ -7,6 +7,10 @@ import uuid
 class CreatorRequest(Base):
     # To set a table name 
     __tablename__ = "creator_requests"
+    # The list endpoints order by "(createdAt, id)" and seek on it for cursor pagination, so we index that exact tuple.
+    __table_args__ = (
+        Index('ix_creator_requests_createdAt_id', 'createdAt', 'id'),
+    )
 
     # To define your columns, follow this format
     # column_name = Mapped[type for column] = mapped_column(specific details about type for column, constraints)
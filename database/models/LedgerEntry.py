@@ -0,0 +1,40 @@
+from database.models.Base import Base
+from sqlalchemy import String, Integer, DateTime, ForeignKey, func, Enum, Index
+from sqlalchemy.orm import Mapped, mapped_column
+from utils.enums import LedgerEntryType
+import uuid
+
+class LedgerEntry(Base):
+    # To set a table name 
+    __tablename__ = "ledger_entries"
+    # Rebuilding a balance sums the entries of one user, and listing them goes by "(createdAt, id)" like everything else.
+    __table_args__ = (
+        Index('ix_ledger_entries_user_id_createdAt_id', 'user_id', 'createdAt', 'id'),
+    )
+
+    # Every change to a creator's balance is saved here as its own row, and rows are never updated or deleted. "User.amount"
+    # is just the sum of these kept up to date as they get added (see utils/balance.py), and "python -m utils.ledger" can
+    # always recompute it from scratch.
+    # To define your columns, follow this format
+    # column_name = Mapped[type for column] = mapped_column(specific details about type for column, constraints)
+    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=uuid.uuid4)
+    # OPENING - the balance a user had before the ledger existed
+    # CREDIT - a paid Stripe invoice for one of their Subscriptions
+    # DEBIT - a cashout
+    type: Mapped[LedgerEntryType] = mapped_column(Enum(LedgerEntryType), nullable=False)
+    # In the Stripe Lowest Currency Format, positive for a CREDIT and negative for a DEBIT
+    amount: Mapped[int] = mapped_column(Integer, nullable=False)
+    # What caused the entry, like "invoice:in_..." or "cashout:<id>". It's unique, so when a webhook event gets processed twice
+    # the creator still only gets paid once.
+    reference: Mapped[str] = mapped_column(String(255), nullable=False, unique=True)
+
+    createdAt: Mapped[DateTime] = mapped_column(DateTime, nullable=False, default=func.now())
+
+    # Assocations
+
+    # A Ledger Entry must be tied to a Single User
+    user_id: Mapped[str] = mapped_column(String(36), ForeignKey('users.id', ondelete="CASCADE"), nullable=False)
+
+    # To define the string representation of an instance/object of type LedgerEntry
+    def __repr__(self):
+        return f"LedgerEntry('{self.id}', '{self.type}', '{self.amount}')"
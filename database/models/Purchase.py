@@ -1,5 +1,5 @@
 from database.models.Base import Base
-from sqlalchemy import String, DateTime, ForeignKey, func, Enum
+from sqlalchemy import String, DateTime, ForeignKey, func, Enum, Index
 from sqlalchemy.orm import Mapped, mapped_column, validates, relationship
 from utils.enums import PurchaseStatus
 import uuid
@@ -7,6 +7,11 @@ import uuid
 class Purchase(Base):
     # To set a table name 
     __tablename__ = "purchases"
+    # Counting the active subscribers of a Subscription (see "getCreatorProfile" in controllers/user.py) only has to read this
+    # index, not the rows. It also serves the foreign key on "subscription_id", which used to get an index of its own.
+    __table_args__ = (
+        Index('ix_purchases_subscription_id_status', 'subscription_id', 'status'),
+    )
 
     # To define your columns, follow this format
     # column_name = Mapped[type for column] = mapped_column(specific details about type for column, constraints)
@@ -15,6 +20,11 @@ class Purchase(Base):
     stripe_subscription_id: Mapped[str] = mapped_column(String(36), nullable=False)
     # By default when you purchase a subscription the status will be set to "ACTIVE"
     status: Mapped[PurchaseStatus] = mapped_column(Enum(PurchaseStatus), nullable=False, default=PurchaseStatus.ACTIVE)
+    # A copy of the Stripe Subscription's "status" and "current_period_end", kept up to date by the Stripe webhooks. Along with
+    # when that copy was made ("stripe_synced_at"), so we know how much we can trust it. Check out "utils/purchaseStatus.py".
+    stripe_status: Mapped[str] = mapped_column(String(32), nullable=True, default=None)
+    current_period_end: Mapped[DateTime] = mapped_column(DateTime, nullable=True, default=None)
+    stripe_synced_at: Mapped[DateTime] = mapped_column(DateTime, nullable=True, default=None)
 
     # Note - Think of the "createdAt" now as the "startDate" for when the subscription payment started happening
     createdAt: Mapped[DateTime] = mapped_column(DateTime, nullable=False, default=func.now())
@@ -1,7 +1,8 @@
 from database.models.Base import Base
-from sqlalchemy import String, Integer, DateTime, ForeignKey, func, event
-from sqlalchemy.orm import Mapped, mapped_column, validates, relationship
-from utils.deleteFile import deleteFile
+from sqlalchemy import String, Integer, DateTime, JSON, ForeignKey, func, event, Index
+from sqlalchemy.orm import Mapped, mapped_column, validates, relationship, object_session
+from utils.sideEffects import afterCommit
+from utils.blobStore import releaseBlobSync
 from utils.stripe import getStripe
 import uuid
 from typing import List
@@ -9,11 +10,19 @@ from typing import List
 class Subscription(Base):
     # To set a table name 
     __tablename__ = "subscriptions"
+    # The list endpoints order by "(createdAt, id)" and seek on it for cursor pagination, so we index that exact tuple.
+    __table_args__ = (
+        Index('ix_subscriptions_createdAt_id', 'createdAt', 'id'),
+        # Stripe webhooks find the Subscription from the Stripe Product, see "utils/stripeLookup.py"
+        Index('ix_subscriptions_product_id', 'product_id'),
+    )
 
     # To define your columns, follow this format
     # column_name = Mapped[type for column] = mapped_column(specific details about type for column, constraints)
     id: Mapped[str] = mapped_column(String(36), primary_key=True, default=uuid.uuid4)
     image: Mapped[str] = mapped_column(String(256), nullable=False)
+    # The URLs of the resized copies of "image", made in the background after the upload (see utils/imageVariants.py)
+    imageVariants: Mapped[dict] = mapped_column(JSON, nullable=True, default=None)
     title: Mapped[str] = mapped_column(String(256), nullable=False)
     description: Mapped[str] = mapped_column(String(1000), nullable=False)
     # Stripe API requires that when creating a PaymentIntent the "amount" should be an integer value representing 
@@ -22,6 +31,9 @@ class Subscription(Base):
     # Stripe Product ID is needed to extract the price_id within it for Stripe to then create the "Subscription"
     # object.
     product_id: Mapped[str] = mapped_column(String(256), nullable=False)
+    # The Stripe Price ID that gets created along with the Product. We save it so the checkout doesn't have to ask Stripe
+    # for the prices of the Product every single time. It's only empty for Subscriptions created before we saved it.
+    price_id: Mapped[str] = mapped_column(String(256), nullable=True, default=None)
 
     createdAt: Mapped[DateTime] = mapped_column(DateTime, nullable=False, default=func.now())
     updatedAt: Mapped[DateTime] = mapped_column(DateTime, nullable=False, default=func.now(), onupdate=func.now())
@@ -57,17 +69,22 @@ class Subscription(Base):
     def __repr__(self):
         return f"Subscription('{self.id}', '{self.createdAt}', '{self.updatedAt}')"
     
-# Before Deleting a Subscription Remove Image and Product from Stripe
-# Note - SQLAlchemy's event listeners do not natively support asynchronous functions.
-def beforeDeletingSubscriptionListener(mapper, connection, target):
-    # Delete Image
-    imageLocationWithoutFirstSlash = target.image[1:]
-    deleteFile(imageLocationWithoutFirstSlash)
+async def archiveStripeProduct(product_id: str) -> None:
     # Set Status of Stripe Product to False
     stripe = getStripe()
-    stripe.Product.modify(
-        id = target.product_id,
+    await stripe.Product.modify_async(
+        id = product_id,
         active = False
-    )    
+    )
+
+# Before Deleting a Subscription Remove Image and Product from Stripe
+# Note - SQLAlchemy's event listeners do not natively support asynchronous functions. So instead of doing the work here
+# we register it as a side effect, which runs in the background once the deletion is committed (see "utils/sideEffects.py").
+def beforeDeletingSubscriptionListener(mapper, connection, target):
+    session = object_session(target)
+    # Let go of the Image, it gets deleted (along with its resized copies) once nothing uses it (see utils/blobStore.py)
+    imageLocationWithoutFirstSlash = target.image[1:]
+    releaseBlobSync(session, connection, imageLocationWithoutFirstSlash)
+    afterCommit(session, 'archiveStripeProduct', archiveStripeProduct, target.product_id)
 
 event.listen(Subscription, 'before_delete', beforeDeletingSubscriptionListener)
\ No newline at end of file
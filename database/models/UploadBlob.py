@@ -0,0 +1,27 @@
+from database.models.Base import Base
+from sqlalchemy import String, Integer, DateTime, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+class UploadBlob(Base):
+    # To set a table name 
+    __tablename__ = "upload_blobs"
+
+    # Every uploaded image is saved a single time under "static/uploads/blobs", named after the SHA-256 of its content. This
+    # table counts how many rows (profile pictures, cover pictures and subscription images) use each one, so the same image
+    # uploaded twice is only stored once, and the file only gets deleted once nothing uses it anymore (see utils/blobStore.py)
+    # To define your columns, follow this format
+    # column_name = Mapped[type for column] = mapped_column(specific details about type for column, constraints)
+    hash: Mapped[str] = mapped_column(String(64), primary_key=True)
+    # Like "static/uploads/blobs/ab/ab12...ef.png", without the first slash
+    location: Mapped[str] = mapped_column(String(256), nullable=False, unique=True)
+    # In bytes
+    size: Mapped[int] = mapped_column(Integer, nullable=False)
+    # How many rows point at this blob ("references" is a reserved word in MySQL)
+    refCount: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    createdAt: Mapped[DateTime] = mapped_column(DateTime, nullable=False, default=func.now())
+    updatedAt: Mapped[DateTime] = mapped_column(DateTime, nullable=False, default=func.now(), onupdate=func.now())
+
+    # To define the string representation of an instance/object of type UploadBlob
+    def __repr__(self):
+        return f"UploadBlob('{self.hash}', '{self.refCount}')"
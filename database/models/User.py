@@ -1,15 +1,24 @@
 from database.models.Base import Base
-from sqlalchemy import String, Integer, Boolean, DateTime, func, event, Enum
+from sqlalchemy import String, Integer, Boolean, DateTime, JSON, func, Enum, Index
 from sqlalchemy.orm import Mapped, mapped_column, validates, relationship
 from utils.isValidEmail import isValidEmail
 from utils.enums import Role
+from utils.password import checkPassword
 from typing import List
-import bcrypt
 import uuid
 
 class User(Base):
     # To set a table name 
     __tablename__ = "users"
+    # The list endpoints order by "(createdAt, id)" and seek on it for cursor pagination, so we index that exact tuple.
+    __table_args__ = (
+        Index('ix_users_createdAt_id', 'createdAt', 'id'),
+        # Username searches go through this FULLTEXT index (using the "ngram" parser) instead of scanning the whole table with
+        # "ilike('%username%')". Check out "utils/search.py" for how it gets used.
+        Index('ix_users_username_fulltext', 'username', mysql_prefix = 'FULLTEXT', mysql_with_parser = 'ngram'),
+        # Stripe webhooks find the User from the Stripe Customer, see "utils/stripeLookup.py"
+        Index('ix_users_customer_id', 'customer_id'),
+    )
 
     # To define your columns, follow this format
     # column_name = Mapped[type for column] = mapped_column(specific details about type for column, constraints)
@@ -21,6 +30,10 @@ class User(Base):
     bio: Mapped[str] = mapped_column(String(1000), nullable=False)
     profilePicture: Mapped[str] = mapped_column(String(256), nullable=False)
     coverPicture: Mapped[str] = mapped_column(String(256), nullable=False)
+    # The URLs of the resized copies of "profilePicture" and "coverPicture", like {"thumbnail": ..., "card": ..., "full": ...}.
+    # They are made in the background after the upload (see utils/imageVariants.py), so they are empty until then.
+    profilePictureVariants: Mapped[dict] = mapped_column(JSON, nullable=True, default=None)
+    coverPictureVariants: Mapped[dict] = mapped_column(JSON, nullable=True, default=None)
     verificationToken: Mapped[str] = mapped_column(String(256), nullable=True)
     isVerified: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
     verifiedAt: Mapped[DateTime] = mapped_column(DateTime, nullable=True, default=None)
@@ -69,29 +82,12 @@ class User(Base):
 
     # To define an instance method just use the "def" keyword as you usually do. This is super useful when you are 
     # trying to execute some logic within your objet. For example if you are comparing password this would be 
-    # awesome. 
-    def comparePassword(self, guess: str) -> bool:
-        isCorrect = bcrypt.checkpw(guess.encode('utf-8'), self.password.encode('utf-8'))
+    # awesome. Checking a bcrypt password is slow, so it happens on a separate thread and we "await" it.
+    async def comparePassword(self, guess: str) -> bool:
+        isCorrect = await checkPassword(guess, self.password)
         return isCorrect
 
     # To define the string representation of an instance/object of type User
     def __repr__(self):
         return f"User('{self.id}', '{self.createdAt}', '{self.updatedAt}')"
 
-# To define any "Events" also known as "Middleware Hooks", you first need to define a listener function 
-# which is defined by it having these 3 paramters: mapper, connection, and target. Once you have successfully 
-# created that function you then need to load in "sqlalchemy.event" and pass into it the 3 arguments of model, 
-# mapper event, and listener function. This does the actual linking to the model.  
-
-def beforeCreatingUserListener(mapper, connection, target):
-    # Before creating a User we want to hash the password. Because making it human readable allows bad
-    # actors to easily steal account information
-    randomBytes = bcrypt.gensalt(10)
-    # Note: In Pythons version of "bcrypt" you don't have access to the "hash" method, instead we use
-    # whats called the "hashpw()" method. And the first argument is the value you would like to hash, and 
-    # the second is the salt (randombytes). The important thing to keep in mind is that the first argument
-    # MUST be in the form of a byte object. So use the "encode()" method along with a character encoding
-    # type to use the "hashpw()" method.
-    target.password = bcrypt.hashpw(target.password.encode('utf-8'), randomBytes)
-
-event.listen(User, 'before_insert', beforeCreatingUserListener)
\ No newline at end of file
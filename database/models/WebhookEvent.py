@@ -0,0 +1,35 @@
+from database.models.Base import Base
+from sqlalchemy import String, Integer, DateTime, JSON, func, Enum, Index
+from sqlalchemy.orm import Mapped, mapped_column
+from utils.enums import WebhookEventStatus
+
+class WebhookEvent(Base):
+    # To set a table name 
+    __tablename__ = "webhook_events"
+    # The worker looks for events by "status" that are due by "nextAttemptAt", so we index that exact pair.
+    __table_args__ = (
+        Index('ix_webhook_events_status_nextAttemptAt', 'status', 'nextAttemptAt'),
+    )
+
+    # To define your columns, follow this format
+    # column_name = Mapped[type for column] = mapped_column(specific details about type for column, constraints)
+    # The "id" is the Stripe Event ID (evt_...). Stripe sends the same event again if it doesn't get a response in time, so
+    # using it as the primary key means the same event can only ever be saved once.
+    id: Mapped[str] = mapped_column(String(255), primary_key=True)
+    type: Mapped[str] = mapped_column(String(256), nullable=False)
+    # The entire verified event, exactly how Stripe sent it
+    payload: Mapped[dict] = mapped_column(JSON, nullable=False)
+    status: Mapped[WebhookEventStatus] = mapped_column(Enum(WebhookEventStatus), nullable=False, default=WebhookEventStatus.PENDING)
+    # How many times a worker has tried to process this event
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    lastError: Mapped[str] = mapped_column(String(1000), nullable=True, default=None)
+    # The event will not be picked up by a worker before this time. It's used for waiting between retries, and while an event
+    # is "PROCESSING" it's how long the worker has it for, so if that worker dies another one can pick the event back up.
+    nextAttemptAt: Mapped[DateTime] = mapped_column(DateTime, nullable=False, default=func.now())
+
+    createdAt: Mapped[DateTime] = mapped_column(DateTime, nullable=False, default=func.now())
+    updatedAt: Mapped[DateTime] = mapped_column(DateTime, nullable=False, default=func.now(), onupdate=func.now())
+
+    # To define the string representation of an instance/object of type WebhookEvent
+    def __repr__(self):
+        return f"WebhookEvent('{self.id}', '{self.type}', '{self.status}')"
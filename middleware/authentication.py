@@ -1,7 +1,10 @@
 from fastapi import Request
 from typing import TypedDict, Literal, List
+from collections import OrderedDict
 from utils.status_codes import StatusCodes
 from utils.custom_error import CustomError
+import hashlib
+import time
 import jwt
 import os
 
@@ -13,6 +16,58 @@ class Authentication(TypedDict):
     role: Literal["USER", "CREATOR", "ADMIN"]
     exp: int
 
+# A browser sends the exact same cookie on every request, so verifying the JWT signature (and reading the secret from
+# the environment) again each time is wasted work. Instead we remember the decoded value of tokens we already verified.
+# The key is a SHA-256 digest of the token so we never keep the raw tokens around, and each entry is dropped once the
+# token's "exp" has passed. It's an LRU (least recently used) cache, so once it's full the token that was used the
+# longest time ago gets removed first.
+class VerifiedTokenCache:
+    def __init__(self, maxSize: int):
+        self.maxSize = maxSize
+        self.entries: "OrderedDict[bytes, Authentication]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str):
+        key = hashlib.sha256(token.encode('utf-8')).digest()
+        decoded = self.entries.get(key)
+        if decoded is None:
+            self.misses += 1
+            return key, None
+        if decoded['exp'] <= time.time():
+            # The token expired, so it has to go through "jwt.decode" again (which will throw the expired error)
+            del self.entries[key]
+            self.misses += 1
+            return key, None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return key, decoded
+
+    def set(self, key: bytes, decoded: Authentication) -> None:
+        self.entries[key] = decoded
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxSize:
+            self.entries.popitem(last = False)
+
+    def toDict(self):
+        return {
+            "size": len(self.entries),
+            "maxSize": self.maxSize,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+verifiedTokenCache = VerifiedTokenCache(int(os.getenv('JWT_CACHE_SIZE') or 10000))
+
+# Only read the secret from the environment once, instead of on every request.
+jwtSecret = None
+
+def getJwtSecret() -> str:
+    global jwtSecret
+    if jwtSecret is None:
+        jwtSecret = os.getenv('JWT_SECRET')
+    return jwtSecret
+
 async def authenticationMiddleware(request: Request, roles: List[str]) -> Authentication:
     try:
         # Check if the Request has the Token
@@ -20,12 +75,16 @@ async def authenticationMiddleware(request: Request, roles: List[str]) -> Authen
         # If no token is provided we know for sure they are not authorized
         if not token:
             raise CustomError('Missing Token', StatusCodes.UNAUTHORIZED)
-        # We wan't to get the decoded value from the JWT
-        decoded: Authentication = jwt.decode(
-            jwt = token,
-            key = os.getenv('JWT_SECRET'),
-            algorithms = ['HS256']
-        )
+        # Check if we already verified this token
+        key, decoded = verifiedTokenCache.get(token)
+        if decoded is None:
+            # We wan't to get the decoded value from the JWT
+            decoded: Authentication = jwt.decode(
+                jwt = token,
+                key = getJwtSecret(),
+                algorithms = ['HS256']
+            )
+            verifiedTokenCache.set(key, decoded)
         # Access the role 
         role = decoded.get('role')
         # If they are not authorized to access this route because of their role let them know of it
@@ -41,7 +100,7 @@ async def authenticationMiddleware(request: Request, roles: List[str]) -> Authen
             message = error.args[0],
             statusCode = error.statusCode
         )
-    
+
 # Instead of directly calling "authenticationMiddleware" with "Depends" we will use this function instead. 
 # So that we can pass in a value for roles only instead of request. Because providing request will make it 
 # so that its recognized as a Query Parameter which we don't want. So this approach not only removes the need
@@ -49,4 +108,4 @@ async def authenticationMiddleware(request: Request, roles: List[str]) -> Authen
 def authentication(roles: List[str]):
     async def authenticatedUserValue(request: Request):
         return await authenticationMiddleware(request, roles)
-    return authenticatedUserValue
\ No newline at end of file
+    return authenticatedUserValue
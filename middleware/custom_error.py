@@ -1,9 +1,9 @@
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 
-async def customErrorErrorHandler(error: Exception) -> JSONResponse:
+async def customErrorErrorHandler(error: Exception) -> ORJSONResponse:
     # Because we know how the CustomError is constructred we can extract the two pieces of information we 
     # need which is the message and status code.
-    return JSONResponse(
+    return ORJSONResponse(
         content = {"msg": error.args[0]},
         status_code = error.statusCode
     )
\ No newline at end of file
@@ -1,8 +1,8 @@
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from utils.status_codes import StatusCodes
 
 async def integrityError():
-    return JSONResponse(
+    return ORJSONResponse(
         content = {"msg": "Please check all inputs!"},
         status_code = StatusCodes.BAD_REQUEST
     )
\ No newline at end of file
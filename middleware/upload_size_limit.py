@@ -0,0 +1,51 @@
+from fastapi import HTTPException
+from fastapi.responses import ORJSONResponse
+from utils.status_codes import StatusCodes
+from utils.upload import MAX_IMAGE_SIZE
+import os
+
+# "saveImageUpload" (see utils/upload.py) stops reading an upload once it's bigger than the limit, but by the time a route
+# handler runs Starlette has already received the whole request and spooled every file in it to memory or a temporary
+# file. So this sits in front of everything and refuses a form (the only kind of request that carries files) that's too
+# big while it's still coming in:
+# 1 - If the client says how big the body is ("Content-Length") and that's too big, we answer right away without reading any of it.
+# 2 - Otherwise (or if the client lied) we count the bytes as the application reads them, and stop with a 413 as soon as
+#     there are more than the limit.
+# The default fits the biggest form we accept, a profile and a cover picture (see "updateUser") plus the text fields.
+MAX_UPLOAD_REQUEST_SIZE = int(os.getenv('MAX_UPLOAD_REQUEST_SIZE') or (MAX_IMAGE_SIZE * 2 + 1024 * 64))
+
+async def payloadTooLarge() -> ORJSONResponse:
+    return ORJSONResponse(
+        content = {"msg": f"The request must not exceed {MAX_UPLOAD_REQUEST_SIZE // (1024 * 1024)}MB!"},
+        status_code = StatusCodes.PAYLOAD_TOO_LARGE
+    )
+
+class UploadSizeLimit:
+    def __init__(self, app, maxSize: int = MAX_UPLOAD_REQUEST_SIZE):
+        self.app = app
+        self.maxSize = maxSize
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope["headers"])
+        if not headers.get(b"content-type", b"").startswith(b"multipart/form-data"):
+            return await self.app(scope, receive, send)
+        contentLength = headers.get(b"content-length")
+        if contentLength is not None and contentLength.isdigit() and int(contentLength) > self.maxSize:
+            response = await payloadTooLarge()
+            return await response(scope, receive, send)
+        received = 0
+
+        async def limitedReceive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.maxSize:
+                    # An "HTTPException" makes it through FastAPI's form parsing untouched (anything else becomes a 400), and
+                    # ends up in the 413 handler in "app.py"
+                    raise HTTPException(status_code = StatusCodes.PAYLOAD_TOO_LARGE)
+            return message
+
+        await self.app(scope, limitedReceive, send)
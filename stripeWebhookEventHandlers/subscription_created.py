@@ -1,9 +1,13 @@
 from utils.getDatabaseInformation import DatabaseInformation
-from utils.stripe import getStripe
+from utils.stripeLookup import resolveUserId, resolveSubscriptionId
+from utils.purchaseStatus import createStripeSubscriptionMirror
+from utils.balance import creditSubscriptionCreator
 from stripe import Event
 from sqlalchemy import select
+from datetime import datetime
 
-# In depth explanation of how we got access to the "user_id" and "subscription_id" from the event object
+# In depth explanation of how we got access to the "user_id" and "subscription_id" from the event object. We now look
+# these up in our own database first (see utils/stripeLookup.py), and this is only what happens when we can't find them.
 # Get access to the "user_id" located on the meta data of the "customer" object.
 # customer_id = event.data.object.customer
 # customer = await stripe.Customer.retrieve_async(customer_id)
@@ -16,36 +20,33 @@ from sqlalchemy import select
 async def subscriptionCreated(event: Event, databaseInformation: DatabaseInformation) -> None:
     Session, Models = databaseInformation
     async with Session() as session:
-        # Get access to the "Stripe" object
-        stripe = getStripe()
-        # Get "user_id"
-        user_id = (await stripe.Customer.retrieve_async(event.data.object.customer)).metadata.user_id
-        # Get "subscription_id"
-        subscription_id = (await stripe.Product.retrieve_async(event["data"]["object"]["items"]["data"][0]["price"]["product"])).metadata.subscription_id
+        # Get "user_id", from our own "users" table and only from Stripe if we can't find it
+        user_id = await resolveUserId(session, event.data.object.customer)
+        # Get "subscription_id", from our own "subscriptions" table and only from Stripe if we can't find it
+        subscription_id = await resolveSubscriptionId(session, event["data"]["object"]["items"]["data"][0]["price"]["product"])
         # Get "Stripe Subscription ID"
         stripeSubscriptionId = event.data.object.id
+        # The webhook queue can run this more than once for the same event (when it gets retried), so if the Purchase
+        # already exists there is nothing left to do.
+        alreadyCreated = (await session.execute(
+            select(Models.Purchase.id).filter(
+                Models.Purchase.stripe_subscription_id == stripeSubscriptionId
+            )
+        )).scalar()
+        if alreadyCreated:
+            return
         # Create the Purchase
         purchase = Models.Purchase(
             stripe_subscription_id = stripeSubscriptionId,
             user_id = user_id,
             subscription_id = subscription_id,
-            status = "ACTIVE"
+            status = "ACTIVE",
+            # Keep a copy of the Stripe Subscription's "status" and "current_period_end"
+            **createStripeSubscriptionMirror(event.data.object, datetime.fromtimestamp(event.created))
         )
         session.add(purchase)
-        await session.commit()
-        # Update Amount on User who created the "Subscription" for people to purchase
-        subscriptionData = (await session.execute(
-            select(Models.Subscription).filter(
-                Models.Subscription.id == subscription_id
-            )
-        )).scalar()
-        price = subscriptionData.price
-        user_who_created_subscription_for_people_to_purchase = subscriptionData.user_id
-        user = (await session.execute(
-            select(Models.User).filter(
-                Models.User.id == user_who_created_subscription_for_people_to_purchase
-            )
-        )).scalar()
-        user.amount = user.amount + price
+        # Update Amount on User who created the "Subscription" for people to purchase, and record it in the ledger (see
+        # utils/balance.py). The first invoice is what's being paid for.
+        await creditSubscriptionCreator(session, subscription_id, f"invoice:{event.data.object.latest_invoice or event.id}")
         await session.commit()
         # The amount is in the Stripe Lowest Currency Format
\ No newline at end of file
@@ -1,10 +1,14 @@
 from utils.getDatabaseInformation import DatabaseInformation
-from utils.stripe import getStripe
+from utils.stripeLookup import resolveUserId, resolveSubscriptionId
+from utils.purchaseStatus import createStripeSubscriptionMirror
+from utils.balance import creditSubscriptionCreator
 from stripe import Event
-from sqlalchemy import select
+from sqlalchemy import select, update, or_
+from datetime import datetime
 import time
 
-# In depth explanation of how we got access to the "user_id" and "subscription_id" from the event object
+# In depth explanation of how we got access to the "user_id" and "subscription_id" from the event object. We now look
+# these up in our own database first (see utils/stripeLookup.py), and this is only what happens when we can't find them.
 # Get access to the "user_id" located on the meta data of the "customer" object.
 # customer_id = event.data.object.customer
 # customer = await stripe.Customer.retrieve_async(customer_id)
@@ -17,14 +21,34 @@ import time
 async def subscriptionUpdated(event: Event, databaseInformation: DatabaseInformation) -> None:
     Session, Models = databaseInformation
     async with Session() as session:
-        # Get access to the "Stripe" object
-        stripe = getStripe()
-        # Get "user_id"
-        user_id = (await stripe.Customer.retrieve_async(event.data.object.customer)).metadata.user_id
-        # Get "subscription_id"
-        subscription_id = (await stripe.Product.retrieve_async(event["data"]["object"]["items"]["data"][0]["price"]["product"])).metadata.subscription_id
+        # Get "user_id", from our own "users" table and only from Stripe if we can't find it
+        user_id = await resolveUserId(session, event.data.object.customer)
+        # Get "subscription_id", from our own "subscriptions" table and only from Stripe if we can't find it
+        subscription_id = await resolveSubscriptionId(session, event["data"]["object"]["items"]["data"][0]["price"]["product"])
         # Get "Stripe Subscription ID"
         stripeSubscriptionId = event.data.object.id     
+        # Events can show up out of order, so this can run before "customer.subscription.created" has saved the Purchase. If
+        # we carried on, the update below would change nothing and the event would be marked processed, leaving the Purchase
+        # "incomplete" forever. Failing makes the webhook queue try it again later (see utils/webhookQueue.py).
+        purchaseExists = (await session.execute(
+            select(Models.Purchase.id).filter(Models.Purchase.stripe_subscription_id == stripeSubscriptionId)
+        )).scalar()
+        if purchaseExists is None:
+            raise LookupError(f"No Purchase for the Stripe Subscription {stripeSubscriptionId} yet!")
+        # Update our copy of the Stripe Subscription's "status" and "current_period_end". Events can show up out of order, so
+        # we only overwrite the copy if it's older than this event.
+        eventCreatedAt = datetime.fromtimestamp(event.created)
+        await session.execute(
+            update(Models.Purchase).filter(
+                Models.Purchase.stripe_subscription_id == stripeSubscriptionId,
+                or_(
+                    Models.Purchase.stripe_synced_at.is_(None),
+                    Models.Purchase.stripe_synced_at <= eventCreatedAt
+                )
+            ).values(**createStripeSubscriptionMirror(event.data.object, eventCreatedAt))
+        )
+        # Not committed yet, the copy and the credit below are saved together. The webhook queue runs this again when it fails
+        # (or when the worker dies before marking the event processed), so a retry must never apply half of it a second time.
         # Now we need to handle three cases
         # Case 0 - a user has already made the purchase and is being charged again (so 1 month has passed)
         # Case 1 - a user has successfully payed the subscription (this is an extra event that occurs post "customer.subscription.created")
@@ -40,25 +64,16 @@ async def subscriptionUpdated(event: Event, databaseInformation: DatabaseInforma
         )).scalar()
         # For recurring payments only logic (so like a month ahead they will collect payment again)
         if alreadyMadePurchase and previous_attributes.get('latest_invoice'):
-            # Update Amount on User who created the "Subscription" for people to purchase
-            subscriptionData = (await session.execute(
-                select(Models.Subscription).filter(
-                    Models.Subscription.id == subscription_id
-                )
-            )).scalar()
-            price = subscriptionData.price
-            user_who_created_subscription_for_people_to_purchase = subscriptionData.user_id
-            user = (await session.execute(
-                select(Models.User).filter(
-                    Models.User.id == user_who_created_subscription_for_people_to_purchase
-                )
-            )).scalar()
-            user.amount = user.amount + price
+            # Update Amount on User who created the "Subscription" for people to purchase, and record it in the ledger (see
+            # utils/balance.py). "latest_invoice" is the new invoice for this month. The ledger entry's reference is unique,
+            # so each invoice can only be credited once, and a retried (or redelivered) event doesn't pay the creator twice.
+            await creditSubscriptionCreator(session, subscription_id, f"invoice:{event.data.object.latest_invoice}")
             await session.commit()
             # The amount is in the Stripe Lowest Currency Format
             return
         # Case 1
         if not previous_attributes.get('default_payment_method') and previous_attributes.get('status') == "incomplete":
+            await session.commit()
             return
         # Case 2
         elif not previous_attributes.get('cancel_at') and not previous_attributes.get('cancel_at_period_end') and not previous_attributes.get('canceled_at') and not previous_attributes.get('cancellation_details').get('reason'):
@@ -83,4 +98,6 @@ async def subscriptionUpdated(event: Event, databaseInformation: DatabaseInforma
             )
             purchase = purchaseRawQuery.scalar()
             purchase.status = "ACTIVE"
-            await session.commit()
\ No newline at end of file
+            await session.commit()
+        else:
+            await session.commit()
@@ -0,0 +1,86 @@
+from database.models.User import User
+from database.models.Subscription import Subscription
+from database.models.LedgerEntry import LedgerEntry
+from utils.enums import LedgerEntryType
+from sqlalchemy import select, update, literal
+from sqlalchemy.dialects.mysql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from uuid import uuid4
+
+# Every change to a creator's balance goes through here. The "ledger_entries" table is the source of truth, every credit
+# and debit is saved there as its own row and never changed afterwards. "User.amount" is a running total of those rows that
+# we update in the same transaction, so reading a balance is still a single column. If the two ever disagree
+# "python -m utils.ledger" recomputes every "User.amount" from the ledger.
+# We used to read the user, add to "user.amount" in Python and write it back. When two Stripe webhooks for the same creator
+# got processed at the same time (on different workers) both read the same amount, and whichever saved last wiped out the
+# other one's payment. So instead we let MySQL do the math with a single "UPDATE users SET amount = amount + ?", which locks
+# the row while it runs so no update can get lost. It's also the last thing before the commit, so that lock is held as
+# briefly as possible.
+# Note - "synchronize_session = False" because these never load a User, so there is nothing in the session to update.
+
+# Saves a ledger entry, unless one with the same "reference" already exists. Returns the id the entry gets if it's saved.
+# "ON DUPLICATE KEY UPDATE" with nothing to change skips the row instead of failing when the unique "reference" is already
+# taken, that way a retried webhook event doesn't roll back everything else it did. Unlike "INSERT IGNORE" it only skips
+# duplicates, a broken row (a user that doesn't exist, a missing value, ...) still fails like it should.
+async def recordLedgerEntry(session: AsyncSession, user_id: str, type: LedgerEntryType, amount: int, reference: str) -> str:
+    id = str(uuid4())
+    await session.execute(
+        insert(LedgerEntry).values(
+            id = id,
+            user_id = user_id,
+            type = type,
+            amount = amount,
+            reference = reference
+        ).on_duplicate_key_update(id = LedgerEntry.id)
+    )
+    return id
+
+# Adds the amount of the ledger entry "ledgerEntryId" to its user's balance. The number of affected rows of the insert can't
+# tell a new entry from a skipped duplicate (the driver counts a duplicate as 1 "found" row), so instead of reading the entry
+# back the balance update joins on the id we just tried to insert. If the reference was already taken there is no row with
+# that id and nothing gets credited. Returns True if the balance changed.
+async def applyLedgerEntry(session: AsyncSession, ledgerEntryId: str) -> bool:
+    result = await session.execute(
+        update(User).filter(
+            User.id == LedgerEntry.user_id,
+            LedgerEntry.id == ledgerEntryId
+        ).values(amount = User.amount + LedgerEntry.amount).execution_options(synchronize_session = False)
+    )
+    return result.rowcount == 1
+
+async def creditUser(session: AsyncSession, user_id: str, amount: int, reference: str) -> bool:
+    ledgerEntryId = await recordLedgerEntry(session, user_id, LedgerEntryType.CREDIT, amount, reference)
+    # False if we were already credited for this reference
+    return await applyLedgerEntry(session, ledgerEntryId)
+
+# Pays the creator of a Subscription its price, once per "reference" (the Stripe invoice that was paid). The creator and the
+# price are copied straight from the "subscriptions" row by the insert ("INSERT ... SELECT"), so this is 2 statements and no reads.
+async def creditSubscriptionCreator(session: AsyncSession, subscription_id: str, reference: str) -> bool:
+    ledgerEntryId = str(uuid4())
+    await session.execute(
+        insert(LedgerEntry).from_select(
+            ["id", "user_id", "type", "amount", "reference"],
+            select(
+                literal(ledgerEntryId, LedgerEntry.id.type),
+                Subscription.user_id,
+                literal(LedgerEntryType.CREDIT, LedgerEntry.type.type),
+                Subscription.price,
+                literal(reference, LedgerEntry.reference.type)
+            ).filter(Subscription.id == subscription_id)
+        ).on_duplicate_key_update(id = LedgerEntry.id)
+    )
+    return await applyLedgerEntry(session, ledgerEntryId)
+
+# Takes "amount" from the user, but only if they have at least that much. Returns False (and changes nothing) if they don't,
+# so the balance can never go negative, not even when two cashouts are made at the same time.
+async def debitUser(session: AsyncSession, user_id: str, amount: int, reference: str) -> bool:
+    result = await session.execute(
+        update(User).filter(
+            User.id == user_id,
+            User.amount >= amount
+        ).values(amount = User.amount - amount).execution_options(synchronize_session = False)
+    )
+    if result.rowcount != 1:
+        return False
+    await recordLedgerEntry(session, user_id, LedgerEntryType.DEBIT, -amount, reference)
+    return True
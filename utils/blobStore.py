@@ -0,0 +1,75 @@
+from database.models.UploadBlob import UploadBlob
+from utils.sideEffects import afterCommit
+from utils.imageVariants import deleteImageSideEffect, deleteImage
+from sqlalchemy import select, update
+from sqlalchemy.dialects.mysql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Uploads are "content addressed", every image is saved once as "static/uploads/blobs/<first 2 characters>/<sha256>.<ext>"
+# no matter who uploaded it or how many times. The "upload_blobs" table counts how many rows use each blob:
+# - "retainBlob" adds one, in the same transaction that saves the row pointing at it
+# - "releaseBlob" takes one away, in the same transaction that stops pointing at it (replacing or deleting the image)
+# - Once that transaction commits "collectBlobSideEffect" deletes the file (and its resized copies) if the count hit 0
+# Retaining locks the blob's row until the transaction ends, and collecting locks it while it checks the count and deletes
+# the file. So a blob that's being uploaded again can never get deleted out from under the new upload.
+# The first 2 characters of the hash are used as a folder so no single folder ends up with millions of files in it.
+
+BLOB_DIRECTORY = "static/uploads/blobs"
+
+def blobLocation(hash: str, extension: str) -> str:
+    return f"{BLOB_DIRECTORY}/{hash[:2]}/{hash}.{extension}"
+
+async def retainBlob(session: AsyncSession, hash: str, location: str, size: int) -> None:
+    # "INSERT ... ON DUPLICATE KEY UPDATE" creates the row the first time and adds one to the count every time after that,
+    # in a single statement
+    statement = insert(UploadBlob).values(
+        hash = hash,
+        location = location,
+        size = size,
+        refCount = 1
+    )
+    await session.execute(
+        statement.on_duplicate_key_update(refCount = UploadBlob.refCount + 1)
+    )
+
+def releaseBlobStatement(location: str):
+    return update(UploadBlob).filter(
+        UploadBlob.location == location,
+        UploadBlob.refCount > 0
+    ).values(refCount = UploadBlob.refCount - 1).execution_options(synchronize_session = False)
+
+def afterReleasingBlob(session, location: str, released: bool) -> None:
+    if released:
+        afterCommit(session, 'collectBlob', collectBlobSideEffect, location)
+    else:
+        # Images uploaded before the blob store (like "static/uploads/profile_pictures/...") aren't shared, so they just get deleted
+        afterCommit(session, 'deleteImage', deleteImageSideEffect, location)
+
+# "location" is the image column without the first slash, like everywhere else we delete files
+async def releaseBlob(session: AsyncSession, location: str) -> None:
+    if not location:
+        return
+    result = await session.execute(releaseBlobStatement(location))
+    afterReleasingBlob(session, location, result.rowcount == 1)
+
+# The same as "releaseBlob" for SQLAlchemy event listeners, which get a syncronous connection in the middle of a flush
+def releaseBlobSync(session, connection, location: str) -> None:
+    if not location:
+        return
+    result = connection.execute(releaseBlobStatement(location))
+    afterReleasingBlob(session, location, result.rowcount == 1)
+
+async def collectBlobSideEffect(location: str) -> None:
+    # Imported here because the models import this module, and "getDatabaseInformation" imports the models
+    from utils.getDatabaseInformation import getDatabaseInformation
+    Session, Models = getDatabaseInformation()
+    async with Session() as session:
+        blob = (await session.execute(
+            select(UploadBlob).filter(
+                UploadBlob.location == location
+            ).with_for_update()
+        )).scalar()
+        if blob and blob.refCount <= 0:
+            await deleteImage(location)
+            await session.delete(blob)
+        await session.commit()
@@ -0,0 +1,211 @@
+from starlette.staticfiles import StaticFiles
+from starlette.responses import Response, FileResponse
+from starlette.datastructures import Headers
+from starlette.types import Scope, Receive, Send
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+import mimetypes
+import anyio
+import os
+
+# The "StaticFiles" that comes with FastAPI sends every file without a "Cache-Control" header, so browsers keep asking for
+# the same avatars on every list page. This version:
+# - Marks everything under "static/uploads" as "immutable" with a max-age of a year. That's safe because an upload's file
+#   name never gets reused for different content (they are named after the SHA-256 of their content, see
+#   utils/blobStore.py), so a browser or CDN never has to ask for them again. Everything else has to be revalidated.
+# - Sends a strong ETag and answers "If-None-Match" / "If-Modified-Since" with a 304 and no body.
+# - Supports "Range" requests (a single range), so a client can resume a download or ask for part of a file.
+# - Sends "file.br" / "file.gz" with a "Content-Encoding" instead of "file" when it exists next to it and the client
+#   accepts that encoding, so the compression happens once ahead of time instead of on every request.
+# - Counts what it sent, which can be found at GET /api/v1/internal/static (ADMIN only).
+
+CHUNK_SIZE = 1024 * 64
+# Precompressed siblings we look for, in the order we prefer them
+PRECOMPRESSED_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+class StaticFilesStatistics:
+    def __init__(self):
+        self.full = 0
+        self.notModified = 0
+        self.partial = 0
+        self.rangeNotSatisfiable = 0
+        self.precompressed = 0
+        self.bytesSent = 0
+
+    def toDict(self):
+        total = self.full + self.notModified + self.partial + self.rangeNotSatisfiable
+        return {
+            "full": self.full,
+            "notModified": self.notModified,
+            "partial": self.partial,
+            "rangeNotSatisfiable": self.rangeNotSatisfiable,
+            "precompressed": self.precompressed,
+            "bytesSent": self.bytesSent,
+            # How often a client already had the file and we could skip sending it
+            "revalidationHitRate": self.notModified / total if total else None
+        }
+
+staticFilesStatistics = StaticFilesStatistics()
+
+# Sends "length" bytes of a file starting at "start", for a 206 Partial Content response
+class FileRangeResponse(Response):
+    def __init__(self, path: str, start: int, length: int, headers: dict, media_type: str):
+        super().__init__(status_code = 206, headers = headers, media_type = media_type)
+        self.path = path
+        self.start = start
+        self.length = length
+        self.headers["content-length"] = str(length)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        remaining = self.length
+        async with await anyio.open_file(self.path, mode = "rb") as file:
+            await file.seek(self.start)
+            while remaining > 0:
+                chunk = await file.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if remaining > 0:
+            # The file got shorter while we were sending it, end the response anyway
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+# Parses "bytes=start-end", "bytes=start-" and "bytes=-suffix". Returns None for anything we don't support (like more than
+# one range), in which case the whole file is sent, which the HTTP spec allows. Returns (0, 0) if the range can't be satisfied.
+def parseRange(value: str, size: int) -> Optional[Tuple[int, int]]:
+    unit, _, ranges = value.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+    first, _, last = ranges.strip().partition("-")
+    try:
+        if first == "":
+            suffix = int(last)
+            if suffix <= 0:
+                return (0, 0)
+            start = max(size - suffix, 0)
+            end = size - 1
+        else:
+            start = int(first)
+            end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        return (0, 0)
+    end = min(end, size - 1)
+    # (start, length)
+    return (start, end - start + 1)
+
+# Whether an "If-None-Match" header (one or more ETags, or "*") matches "etag", so a 304 can be sent instead of the body
+def etagMatches(ifNoneMatch: Optional[str], etag: str) -> bool:
+    if ifNoneMatch is None:
+        return False
+    return ifNoneMatch.strip() == "*" or etag in [tag.strip().removeprefix("W/") for tag in ifNoneMatch.split(",")]
+
+# Parses "Accept-Encoding" (like "gzip, br;q=0.8, *;q=0") into each encoding and its q-value, which is 1 if it's left out
+def parseAcceptEncoding(value: str) -> Dict[str, float]:
+    accepted = {}
+    for part in value.split(","):
+        name, *parameters = [piece.strip() for piece in part.split(";")]
+        if not name:
+            continue
+        quality = 1.0
+        for parameter in parameters:
+            key, _, number = parameter.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(number)
+                except ValueError:
+                    quality = 0.0
+        accepted[name.lower()] = quality
+    return accepted
+
+# "q=0" means the client refuses that encoding, and "*" stands in for every encoding that isn't listed by name
+def acceptsEncoding(accepted: Dict[str, float], name: str) -> bool:
+    if name in accepted:
+        return accepted[name] > 0
+    return accepted.get("*", 0) > 0
+
+class CachedStaticFiles(StaticFiles):
+    def __init__(self, *args, immutablePrefixes: Tuple[str, ...] = ("uploads/",), immutableMaxAge: int = 31536000, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.immutablePrefixes = immutablePrefixes
+        self.immutableMaxAge = immutableMaxAge
+
+    def cacheControl(self, relativePath: str) -> str:
+        if relativePath.startswith(self.immutablePrefixes):
+            return f"public, max-age={self.immutableMaxAge}, immutable"
+        return "public, no-cache"
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        requestHeaders = Headers(scope = scope)
+        fullPath = str(full_path)
+        relativePath = os.path.relpath(fullPath, str(self.directory)).replace(os.sep, "/")
+        mediaType = mimetypes.guess_type(fullPath)[0] or "text/plain"
+        # Use a precompressed copy if there is one and the client can take it
+        acceptedEncodings = parseAcceptEncoding(requestHeaders.get("accept-encoding", ""))
+        encoding = None
+        for name, suffix in PRECOMPRESSED_ENCODINGS:
+            if acceptsEncoding(acceptedEncodings, name):
+                try:
+                    compressedStat = os.stat(fullPath + suffix)
+                except OSError:
+                    continue
+                encoding = name
+                fullPath = fullPath + suffix
+                stat_result = compressedStat
+                break
+        # A strong ETag, every byte of a different version of the file gives a different one. The compressed copies are
+        # different bytes, so they get their own ETag.
+        etag = f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}{"-" + encoding if encoding else ""}"'
+        headers = {
+            "cache-control": self.cacheControl(relativePath),
+            "etag": etag,
+            "last-modified": formatdate(stat_result.st_mtime, usegmt = True),
+            "accept-ranges": "bytes",
+            "vary": "Accept-Encoding"
+        }
+        if encoding:
+            headers["content-encoding"] = encoding
+        # Conditional requests, "If-None-Match" wins over "If-Modified-Since" when both are sent
+        ifNoneMatch = requestHeaders.get("if-none-match")
+        ifModifiedSince = requestHeaders.get("if-modified-since")
+        notModified = False
+        if ifNoneMatch is not None:
+            notModified = etagMatches(ifNoneMatch, etag)
+        elif ifModifiedSince:
+            try:
+                notModified = int(stat_result.st_mtime) <= parsedate_to_datetime(ifModifiedSince).timestamp()
+            except (TypeError, ValueError):
+                notModified = False
+        if notModified:
+            staticFilesStatistics.notModified += 1
+            return Response(status_code = 304, headers = headers)
+        if encoding:
+            staticFilesStatistics.precompressed += 1
+        # Range requests, only when "If-Range" (if sent) still matches what we have
+        rangeHeader = requestHeaders.get("range")
+        ifRange = requestHeaders.get("if-range")
+        if rangeHeader and (ifRange is None or ifRange.strip() == etag):
+            byteRange = parseRange(rangeHeader, stat_result.st_size)
+            if byteRange == (0, 0):
+                staticFilesStatistics.rangeNotSatisfiable += 1
+                return Response(status_code = 416, headers = {**headers, "content-range": f"bytes */{stat_result.st_size}"})
+            if byteRange:
+                start, length = byteRange
+                staticFilesStatistics.partial += 1
+                staticFilesStatistics.bytesSent += length
+                return FileRangeResponse(
+                    path = fullPath,
+                    start = start,
+                    length = length,
+                    headers = {**headers, "content-range": f"bytes {start}-{start + length - 1}/{stat_result.st_size}"},
+                    media_type = mediaType
+                )
+        staticFilesStatistics.full += 1
+        staticFilesStatistics.bytesSent += stat_result.st_size
+        # "FileResponse" only fills in "etag" and "last-modified" when they aren't set, so ours are kept
+        return FileResponse(fullPath, status_code = status_code, headers = headers, media_type = mediaType, stat_result = stat_result)
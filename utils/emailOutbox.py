@@ -0,0 +1,91 @@
+from utils.sendgrid import MailDictionary, sendEmail
+from utils.retryingQueue import QueueEntry, RetryingQueue
+from datetime import datetime
+from uuid import uuid4
+import asyncio
+import json
+import os
+
+# Instead of sending an email right inside of the route handler (and making the user wait on SendGrid) we put the email
+# in an "outbox" and return right away. A few background tasks then take emails out of the outbox and deliver them,
+# retrying the ones that fail (see utils/retryingQueue.py).
+# Note - the outbox lives in memory, so emails that still haven't gone out when a worker shuts down are lost.
+# Note - every email is its own request to SendGrid. Sending several in one request only works for the same content sent
+# to different people (with "personalizations"), and every email we send (like the verification email) is different.
+
+class OutboxEntry(QueueEntry):
+    def __init__(self, message: MailDictionary):
+        super().__init__()
+        self.message = message
+
+# A "transport" is the thing that actually delivers an email. Anything with an async "send" method works.
+class SendGridTransport:
+    async def send(self, message: MailDictionary) -> None:
+        # The SendGrid client is syncronous, so it runs on a separate thread to keep the event loop free.
+        await asyncio.to_thread(sendEmail, message)
+
+# Writes every email to a JSON file instead of sending it. Useful for development, tests and load runs where we don't
+# want to send real emails.
+class FileTransport:
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok = True)
+
+    def write(self, message: MailDictionary) -> None:
+        location = os.path.join(self.directory, f"{datetime.now().strftime('%Y%m%d%H%M%S%f')}_{uuid4()}.json")
+        with open(location, "w") as file:
+            json.dump(message, file)
+
+    async def send(self, message: MailDictionary) -> None:
+        await asyncio.to_thread(self.write, message)
+
+def createTransport():
+    if os.getenv('EMAIL_TRANSPORT') == 'file':
+        return FileTransport(os.getenv('EMAIL_OUTBOX_DIRECTORY') or 'outbox')
+    return SendGridTransport()
+
+# The retrying, the dead letters and starting/stopping the background tasks come from "RetryingQueue"
+class EmailOutbox(RetryingQueue):
+    entryName = "Email"
+    succeededStatus = "SENT"
+
+    def __init__(self, transport, concurrency: int, maxAttempts: int, retryDelay: float):
+        super().__init__(concurrency, maxAttempts, retryDelay)
+        self.transport = transport
+
+    def enqueue(self, message: MailDictionary) -> OutboxEntry:
+        entry = OutboxEntry(message)
+        self.put(entry)
+        return entry
+
+    async def handle(self, entry: OutboxEntry) -> None:
+        await self.transport.send(entry.message)
+
+    def describe(self, entry: OutboxEntry) -> str:
+        return f"Email {entry.id} to {entry.message.get('to_emails')}"
+
+    def toDict(self):
+        return {
+            "pending": self.pending(),
+            "sent": self.succeeded,
+            "retried": self.retried,
+            "dropped": self.dropped,
+            "deadLetters": [
+                {
+                    "id": entry.id,
+                    "to_emails": entry.message.get('to_emails'),
+                    "subject": entry.message.get('subject'),
+                    "attempts": entry.attempts,
+                    "lastError": entry.lastError,
+                    "createdAt": str(entry.createdAt)
+                }
+                for entry in self.deadLetters
+            ]
+        }
+
+emailOutbox = EmailOutbox(
+    transport = createTransport(),
+    concurrency = int(os.getenv('EMAIL_OUTBOX_CONCURRENCY') or 4),
+    maxAttempts = int(os.getenv('EMAIL_OUTBOX_MAX_ATTEMPTS') or 5),
+    retryDelay = float(os.getenv('EMAIL_OUTBOX_RETRY_DELAY') or 1)
+)
@@ -17,4 +17,16 @@ class PurchaseStatus(Enum):
 
 class CashoutStatus(Enum):
     PENDING = "PENDING"
-    PAID = "PAID"
\ No newline at end of file
+    PAID = "PAID"
+
+class WebhookEventStatus(Enum):
+    PENDING = "PENDING"
+    PROCESSING = "PROCESSING"
+    FAILED = "FAILED"
+    PROCESSED = "PROCESSED"
+    DEAD = "DEAD"
+
+class LedgerEntryType(Enum):
+    OPENING = "OPENING"
+    CREDIT = "CREDIT"
+    DEBIT = "DEBIT"
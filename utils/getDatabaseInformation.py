@@ -1,37 +1,41 @@
-from typing import Tuple, Type, ForwardRef
-from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Tuple, Type, Optional
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from database.models.User import User as UserModel
+from database.models.CreatorRequest import CreatorRequest as CreatorRequestModel
+from database.models.Subscription import Subscription as SubscriptionModel
+from database.models.Purchase import Purchase as PurchaseModel
+from database.models.Cashout import Cashout as CashoutModel
+from database.models.WebhookEvent import WebhookEvent as WebhookEventModel
+from database.models.LedgerEntry import LedgerEntry as LedgerEntryModel
+from database.models.UploadBlob import UploadBlob as UploadBlobModel
 
-# Forward reference to Models Type (defined later in the if block)
-ModelsType = ForwardRef('Models')
+# We load the models straight from "database/models" instead of from "app", that way there is no circular
+# dependency and we can define the "Models" class a single time when this module is first imported. It used
+# to be redefined inside of "getDatabaseInformation" on every single request.
+class Models:
+    User = UserModel
+    CreatorRequest = CreatorRequestModel
+    Subscription = SubscriptionModel
+    Purchase = PurchaseModel
+    Cashout = CashoutModel
+    WebhookEvent = WebhookEventModel
+    LedgerEntry = LedgerEntryModel
+    UploadBlob = UploadBlobModel
 
-# Type Alias with Forward Reference to AsyncSession and ModelsType
-DatabaseInformation = Tuple[AsyncSession, Type['Models']]
+# Type Alias for the session factory and the Models
+DatabaseInformation = Tuple[async_sessionmaker, Type[Models]]
 
-def getDatabaseInformation() -> DatabaseInformation:
-    from database.Session import Session
-    from app import User as UserModel
-    from app import CreatorRequest as CreatorRequestModel
-    from app import Subscription as SubscriptionModel
-    from app import Purchase as PurchaseModel
-    from app import Cashout as CashoutModel
-    class Models:
-        User = UserModel
-        CreatorRequest = CreatorRequestModel
-        Subscription = SubscriptionModel
-        Purchase = PurchaseModel
-        Cashout = CashoutModel
-    return (Session, Models)
+# Built once by "setupDatabaseInformation" when the application starts up (see the "lifespan" in "app.py")
+databaseInformation: Optional[DatabaseInformation] = None
+
+def setupDatabaseInformation() -> DatabaseInformation:
+    global databaseInformation
+    if databaseInformation is None:
+        from database.Session import Session
+        databaseInformation = (Session, Models)
+    return databaseInformation
 
-# By wrapping this code inside of this  we prevent the circular dependency error.
-if __name__ == '__main__':
-    from app import User as UserModel
-    from app import CreatorRequest as CreatorRequestModel
-    from app import Subscription as SubscriptionModel
-    from app import Purchase as PurchaseModel
-    from app import Cashout as CashoutModel
-    class Models:
-        User = UserModel
-        CreatorRequest = CreatorRequestModel
-        Subscription = SubscriptionModel
-        Purchase = PurchaseModel
-        Cashout = CashoutModel
\ No newline at end of file
+# This is the "Depends" used on every route, so all it does is hand back the tuple that was already built. If
+# it gets called outside of the application (like from a script) before the lifespan ran, we build it then.
+def getDatabaseInformation() -> DatabaseInformation:
+    return databaseInformation or setupDatabaseInformation()
@@ -0,0 +1,144 @@
+from utils.deleteFile import deleteFile
+from utils.storage import storage
+from utils.responseCache import invalidateSubscriptionListings, invalidateCreatorProfile
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageOps
+from sqlalchemy import select, update
+from typing import Dict, Optional
+from uuid import uuid4
+import asyncio
+import multiprocessing
+import os
+
+# Uploaded images used to be served exactly as they were uploaded, so a list page could end up sending a few megabytes
+# per profile picture. Now every upload also gets a few smaller copies ("variants") made of it:
+# thumbnail - for avatars in lists
+# card - for subscription cards and profile headers
+# full - the biggest we ever show it
+# Resizing and encoding is CPU heavy, so it happens in a pool of separate processes (threads wouldn't help much because
+# of the GIL) and only once the upload is committed (see "afterCommit" in utils/sideEffects.py), that way the request
+# doesn't wait on it. The variants are saved (see utils/storage.py) next to the original as "<original without extension>_<variant>.<format>",
+# and their URLs get recorded in the "...Variants" column next to the image column. Until that happens the column is
+# empty, so the frontend should fall back to the original image.
+
+# The largest width and height of each variant, images are shrunk to fit inside it (never enlarged)
+IMAGE_VARIANTS = {
+    "thumbnail": (160, 160),
+    "card": (480, 480),
+    "full": (1280, 1280)
+}
+# "webp" is a lot smaller, "jpeg" is there for anything that can't show WebP
+IMAGE_VARIANT_FORMAT = (os.getenv('IMAGE_VARIANT_FORMAT') or 'webp').lower()
+IMAGE_VARIANT_EXTENSIONS = {"webp": "webp", "jpeg": "jpg"}
+# Refuse to decode images with more pixels than this, a tiny file can still decode to gigabytes of pixels
+Image.MAX_IMAGE_PIXELS = int(os.getenv('IMAGE_MAX_PIXELS') or 40_000_000)
+
+# "spawn" starts the processes fresh instead of forking this one, forking a process that already has threads running (the
+# event loop, the password hashing threads, ...) can leave the child stuck on a lock one of those threads was holding.
+imageExecutor = ProcessPoolExecutor(
+    max_workers = int(os.getenv('IMAGE_PROCESSING_WORKERS') or 2),
+    mp_context = multiprocessing.get_context('spawn')
+)
+
+def variantLocation(location: str, name: str, extension: str) -> str:
+    return f"{os.path.splitext(location)[0]}_{name}.{extension}"
+
+# Runs in one of the "imageExecutor" processes. Reads the image at "sourcePath" and writes each variant to the path given for
+# it in "destinations", like {"thumbnail": "/tmp/...webp", ...}
+def createImageVariantsSync(sourcePath: str, destinations: Dict[str, str]) -> None:
+    with Image.open(sourcePath) as original:
+        # Phones save the photo sideways and an EXIF tag that says which way is up, so turn the pixels the right way before
+        # the EXIF (and every other bit of metadata, like GPS location) gets left behind. The variants are saved without it.
+        image = ImageOps.exif_transpose(original)
+        if IMAGE_VARIANT_FORMAT == 'jpeg':
+            # JPEG has no transparency, so put transparent images on a white background
+            if image.mode in ('RGBA', 'LA', 'P'):
+                image = image.convert('RGBA')
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                background.paste(image, mask = image.getchannel('A'))
+                image = background
+            else:
+                image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() or image.mode == 'P' else 'RGB')
+        for name, size in IMAGE_VARIANTS.items():
+            variant = image.copy()
+            variant.thumbnail(size, Image.LANCZOS)
+            variant.save(destinations[name], format = IMAGE_VARIANT_FORMAT.upper(), quality = 80, optimize = True)
+
+def variantKeys(location: str) -> Dict[str, str]:
+    extension = IMAGE_VARIANT_EXTENSIONS[IMAGE_VARIANT_FORMAT]
+    return {name: variantLocation(location, name, extension) for name in IMAGE_VARIANTS}
+
+async def existingImageVariants(location: str) -> Optional[Dict[str, str]]:
+    keys = variantKeys(location)
+    for key in keys.values():
+        if not await storage.exists(key):
+            return None
+    return {name: f"/{key}" for name, key in keys.items()}
+
+# Makes the variants of the image at "location" (a storage key like "static/uploads/blobs/ab/ab12...ef.png") and returns
+# the path of each one, like {"thumbnail": "/static/uploads/blobs/ab/ab12...ef_thumbnail.webp", ...}
+async def createImageVariants(location: str) -> Dict[str, str]:
+    keys = variantKeys(location)
+    extension = IMAGE_VARIANT_EXTENSIONS[IMAGE_VARIANT_FORMAT]
+    # The variants get written to temporary files first, and then handed to the storage, so a half written variant is never served
+    temporaryPaths = {name: os.path.join(storage.temporaryDirectory(), f".{uuid4()}.{extension}") for name in keys}
+    try:
+        async with storage.localCopy(location) as sourcePath:
+            await asyncio.get_running_loop().run_in_executor(imageExecutor, createImageVariantsSync, sourcePath, temporaryPaths)
+        for name, key in keys.items():
+            await storage.putFile(key, temporaryPaths[name], f"image/{IMAGE_VARIANT_FORMAT}")
+    finally:
+        for temporaryPath in temporaryPaths.values():
+            await asyncio.to_thread(deleteFile, temporaryPath)
+    return {name: f"/{key}" for name, key in keys.items()}
+
+# Deletes an image along with all of its variants
+async def deleteImage(location: str) -> None:
+    await storage.delete(location)
+    for name in IMAGE_VARIANTS:
+        for extension in IMAGE_VARIANT_EXTENSIONS.values():
+            await storage.delete(variantLocation(location, name, extension))
+
+# Side effect that deletes an image along with all of its variants
+async def deleteImageSideEffect(location: str) -> None:
+    if location:
+        await deleteImage(location)
+
+# Side effect that makes the variants of a just committed upload and saves their URLs, e.g.
+# afterCommit(session, 'createImageVariants', createImageVariantsSideEffect, Models.User.profilePicture, Models.User.profilePictureVariants, file_location)
+async def createImageVariantsSideEffect(imageColumn, variantsColumn, location: str) -> Optional[Dict[str, str]]:
+    # Imported here because "database/models/Subscription.py" imports this module, and "getDatabaseInformation" imports it
+    from utils.getDatabaseInformation import getDatabaseInformation
+    # The image was already replaced and deleted before we got to it
+    if not await storage.exists(location):
+        return None
+    # The same image can be uploaded more than once (see utils/blobStore.py), so the variants might already be there
+    variants = await existingImageVariants(location)
+    if variants is None:
+        variants = await createImageVariants(location)
+    Session, Models = getDatabaseInformation()
+    async with Session() as session:
+        # Every row using this image gets the variants. If the image already got replaced (or the row deleted) nothing matches,
+        # and the variants get deleted along with the image once nothing uses it.
+        result = await session.execute(
+            update(imageColumn.class_).filter(
+                imageColumn == f"/{location}"
+            ).values({variantsColumn.key: variants}).execution_options(synchronize_session = False)
+        )
+        # The creators whose profile shows this image, either as their own picture or as the image of one of their subscriptions
+        if imageColumn.class_ is Models.User:
+            usernamesQuery = select(Models.User.username).filter(imageColumn == f"/{location}")
+        else:
+            usernamesQuery = select(Models.User.username).join(Models.Subscription, Models.Subscription.user_id == Models.User.id).filter(imageColumn == f"/{location}")
+        usernames = set((await session.execute(usernamesQuery)).scalars().all())
+        await session.commit()
+    # The variants show up in the cached subscription listing and the cached creator profiles (see utils/responseCache.py).
+    # The request that saved the image already invalidated them, but a request in between could have cached them again
+    # without the variants, so it's done again now that they are saved.
+    if result.rowcount:
+        await invalidateSubscriptionListings()
+        for username in usernames:
+            await invalidateCreatorProfile(username)
+    return variants
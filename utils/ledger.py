@@ -0,0 +1,76 @@
+# Recomputes every creator's "User.amount" from the "ledger_entries" table (see utils/balance.py). Run it from the root of
+# the project with "python -m utils.ledger", or with "python -m utils.ledger --check" to only list the balances that don't
+# match without changing anything.
+from dotenv import load_dotenv
+load_dotenv()
+from utils.getDatabaseInformation import getDatabaseInformation
+from database.Session import engine
+from sqlalchemy import select, update, func
+import asyncio
+import sys
+import os
+
+# How many users are checked (and fixed) per transaction, so the rebuild never locks every user at once
+LEDGER_REBUILD_BATCH_SIZE = int(os.getenv('LEDGER_REBUILD_BATCH_SIZE') or 1000)
+
+async def rebuildBalances(check: bool) -> None:
+    Session, Models = getDatabaseInformation()
+    # The sum of the ledger for one user. The "(user_id, createdAt, id)" index means MySQL only reads that user's entries.
+    ledgerBalance = func.coalesce(
+        select(func.sum(Models.LedgerEntry.amount)).filter(
+            Models.LedgerEntry.user_id == Models.User.id
+        ).scalar_subquery(),
+        0
+    )
+    mismatchCount = 0
+    changed = 0
+    lastId = None
+    while True:
+        async with Session() as session:
+            # The next batch of users by id, each batch is its own short transaction
+            idsQuery = select(Models.User.id).order_by(Models.User.id).limit(LEDGER_REBUILD_BATCH_SIZE)
+            if lastId is not None:
+                idsQuery = idsQuery.filter(Models.User.id > lastId)
+            ids = (await session.execute(idsQuery)).scalars().all()
+            if not ids:
+                break
+            inBatch = Models.User.id.between(ids[0], ids[-1])
+            lastId = ids[-1]
+            mismatchesRawQuery = await session.execute(
+                select(Models.User.id, Models.User.username, Models.User.amount, ledgerBalance).filter(
+                    inBatch,
+                    Models.User.amount != ledgerBalance
+                )
+            )
+            mismatches = mismatchesRawQuery.all()
+            mismatchCount += len(mismatches)
+            for user_id, username, amount, balance in mismatches:
+                print(f"{username} ({user_id}): users.amount is {amount}, the ledger adds up to {balance}")
+            if check or not mismatches:
+                continue
+            # One statement for the whole batch, and only the users whose balance is off get written (and locked). "updatedAt"
+            # is set to itself so fixing a balance doesn't look like the user changed their profile (it's "onupdate" otherwise).
+            result = await session.execute(
+                update(Models.User).filter(
+                    inBatch,
+                    Models.User.amount != ledgerBalance
+                ).values(
+                    amount = ledgerBalance,
+                    updatedAt = Models.User.updatedAt
+                ).execution_options(synchronize_session = False)
+            )
+            await session.commit()
+            changed += result.rowcount
+    if check:
+        print(f"{mismatchCount} balance(s) don't match the ledger")
+        return
+    print(f"Rebuilt the balances, {changed} user(s) changed")
+
+async def main():
+    try:
+        await rebuildBalances(check = '--check' in sys.argv[1:])
+    finally:
+        await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,66 @@
+from sqlalchemy import select, func, Select, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Tuple, List, Any, Sequence, Optional
+from utils.custom_error import CustomError
+from utils.status_codes import StatusCodes
+from datetime import datetime
+import base64
+import json
+import math
+
+# Type Alias for what gets returned from "paginate", (items for the current page, total amount of items, number of pages, cursor
+# for the next page). When paginating with a cursor the total and number of pages are "None" because counting them is exactly
+# the O(table) work cursor pagination is trying to avoid.
+Pagination = Tuple[List[Any], Optional[int], Optional[int], Optional[str]]
+
+def encodeCursor(item: Any) -> str:
+    # A cursor is just the "createdAt" and "id" of the last item on the page. We base64 encode it so the client treats it as an
+    # opaque value and simply hands it back to us to get the next page.
+    raw = json.dumps([item.createdAt.isoformat(), item.id])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('utf-8')
+
+def decodeCursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        createdAt, id = json.loads(base64.urlsafe_b64decode(cursor.encode('utf-8')))
+        return (datetime.fromisoformat(createdAt), id)
+    except Exception:
+        raise CustomError('Invalid Value Provided for Cursor!', StatusCodes.BAD_REQUEST)
+
+async def paginate(session: AsyncSession, query: Select, model: Any, page: int, limit: int, cursor: str = '', options: Sequence[Any] = ()) -> Pagination:
+    # Every list is ordered from newest to oldest, and the "id" is used as a tie breaker because "createdAt" only has a precision
+    # of seconds. This ordering matches the "(createdAt, id)" index on each table so MySQL can walk the index instead of sorting.
+    query = query.order_by(model.createdAt.desc(), model.id.desc())
+    if cursor:
+        # Keyset (cursor) pagination, instead of telling MySQL to skip "(page - 1) * limit" rows (which it still has to read and
+        # throw away) we seek directly to the position right after the last item the client saw. So page 10,000 costs the same
+        # as page 1. We fetch one extra row to find out if there is a next page at all.
+        createdAt, id = decodeCursor(cursor)
+        itemsRawQuery = await session.execute(
+            query.filter(
+                or_(
+                    model.createdAt < createdAt,
+                    and_(model.createdAt == createdAt, model.id < id)
+                )
+            ).options(*options).limit(limit + 1)
+        )
+        items = itemsRawQuery.scalars().all()
+        nextCursor = encodeCursor(items[limit - 1]) if len(items) > limit else None
+        return (items[:limit], None, None, nextCursor)
+    # The old approach was to run the filtered query a second time and call "len()" on the result. The problem with that is
+    # that every single row in the table gets turned into an ORM object just so we can count them. Instead we wrap the filtered
+    # query in a subquery and let the database do the counting with "SELECT COUNT(*)", so only a single number comes back.
+    totalRawQuery = await session.execute(
+        select(func.count()).select_from(query.order_by(None).subquery())
+    )
+    total = totalRawQuery.scalar()
+    # The "options" (like "joinedload") are only applied to the query that gets the actual page, because the count does not
+    # care about the related data.
+    skip = (page - 1) * limit
+    itemsRawQuery = await session.execute(
+        query.options(*options).offset(skip).limit(limit)
+    )
+    items = itemsRawQuery.scalars().all()
+    numberOfPages = math.ceil(total / limit)
+    # Hand out a cursor even in page mode, so a client can switch over to cursor pagination from any page.
+    nextCursor = encodeCursor(items[-1]) if items and page < numberOfPages else None
+    return (items, total, numberOfPages, nextCursor)
@@ -0,0 +1,39 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import bcrypt
+import os
+
+# The bcrypt "work factor" (cost). Every +1 doubles how long a hash takes. If you change it, the passwords already in
+# the database keep working, and each one gets rehashed with the new cost the next time that user logs in.
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS') or 10)
+
+# Hashing and checking a password with bcrypt takes tens of milliseconds of pure CPU work. If we did that directly inside
+# of an "async" route handler the whole event loop would be stuck, so every other request on that worker would have to
+# wait. So instead we hand the work to a small pool of threads (bcrypt releases the GIL while it works). The amount of
+# threads is the upper bound of password operations running at once, anything past that waits in line.
+passwordExecutor = ThreadPoolExecutor(
+    max_workers = int(os.getenv('PASSWORD_HASHING_WORKERS') or 4),
+    thread_name_prefix = 'password'
+)
+
+def hashPasswordSync(password: str) -> str:
+    # Note: In Pythons version of "bcrypt" you don't have access to the "hash" method, instead we use
+    # whats called the "hashpw()" method. And the first argument is the value you would like to hash, and
+    # the second is the salt (randombytes). The important thing to keep in mind is that the first argument
+    # MUST be in the form of a byte object. So use the "encode()" method along with a character encoding
+    # type to use the "hashpw()" method.
+    randomBytes = bcrypt.gensalt(BCRYPT_ROUNDS)
+    return bcrypt.hashpw(password.encode('utf-8'), randomBytes).decode('utf-8')
+
+def checkPasswordSync(guess: str, hashedPassword: str) -> bool:
+    return bcrypt.checkpw(guess.encode('utf-8'), hashedPassword.encode('utf-8'))
+
+async def hashPassword(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(passwordExecutor, hashPasswordSync, password)
+
+async def checkPassword(guess: str, hashedPassword: str) -> bool:
+    return await asyncio.get_running_loop().run_in_executor(passwordExecutor, checkPasswordSync, guess, hashedPassword)
+
+def needsRehash(hashedPassword: str) -> bool:
+    # A bcrypt hash looks like "$2b$10$<salt and hash>", where the number in the middle is the cost it was made with.
+    return int(hashedPassword.split('$')[2]) != BCRYPT_ROUNDS
@@ -0,0 +1,30 @@
+from datetime import datetime, timedelta
+from typing import TypedDict, Optional
+import os
+
+# We keep a copy of each Stripe Subscription's "status" and "current_period_end" on the Purchase, and the Stripe webhooks
+# keep that copy up to date. That way the checkout can check if someone is already subscribed without asking Stripe. We
+# only ask Stripe when our copy is older than this many seconds, or when the billing period it's for has already ended.
+PURCHASE_STATUS_MAX_AGE = float(os.getenv('PURCHASE_STATUS_MAX_AGE') or 86400)
+
+class StripeSubscriptionMirror(TypedDict):
+    stripe_status: str
+    current_period_end: Optional[datetime]
+    stripe_synced_at: datetime
+
+def createStripeSubscriptionMirror(stripeSubscription, syncedAt: datetime) -> StripeSubscriptionMirror:
+    # "current_period_end" is a unix timestamp
+    currentPeriodEnd = stripeSubscription.get('current_period_end')
+    return {
+        "stripe_status": stripeSubscription.get('status'),
+        "current_period_end": datetime.fromtimestamp(currentPeriodEnd) if currentPeriodEnd else None,
+        "stripe_synced_at": syncedAt
+    }
+
+def isPurchaseStatusFresh(purchase) -> bool:
+    if not purchase.stripe_status or not purchase.stripe_synced_at:
+        return False
+    now = datetime.now()
+    if purchase.current_period_end and purchase.current_period_end <= now:
+        return False
+    return now - purchase.stripe_synced_at <= timedelta(seconds = PURCHASE_STATUS_MAX_AGE)
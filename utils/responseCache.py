@@ -0,0 +1,216 @@
+from utils.storage import storage
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+import hashlib
+import asyncio
+import orjson
+import time
+import os
+
+# Caches the encoded JSON of public responses that every anonymous visitor asks for, like the subscription listing, so
+# they don't all run the same queries. Entries are grouped in "namespaces" (like "subscriptions"), and when something in
+# the database changes, the whole namespace gets invalidated at once. Any change can move a row from one page to the next
+# and changes the totals, and a username search matches part of a name, so working out exactly which entries a change
+# affects isn't worth it.
+# Invalidating doesn't delete anything. Every namespace has a "generation" number that is part of every key in it, and
+# invalidating just adds one to it, so the old entries are never looked up again and fall out on their own (LRU or TTL).
+# The generation is read before the response is built and that same one is used to save it, so a response built from
+# data that changed halfway through is saved under the old generation and never served.
+# There are 2 backends (RESPONSE_CACHE_BACKEND):
+# memory - an LRU in this process. Fast, but every uvicorn worker has its own, so an invalidation only reaches the
+#          worker that made the change. The other workers can keep serving the old response until its TTL runs out.
+# redis - shared by every worker (and every machine), an invalidation reaches all of them right away.
+# "none" turns caching off. If Redis can't be reached the response is just built like there was no cache.
+
+# Every creator profile is its own namespace, so the generations are an LRU too (as big as the entries) instead of one per
+# username forever. The generations come from one counter shared by every namespace, and a namespace we don't have a
+# generation for gets "floor", the newest generation we ever let go of. So when a namespace is dropped its old entries are
+# never served again, and if it's the one that set "floor", its entries are still up to date since nothing changed after it.
+class MemoryResponseCacheBackend:
+    def __init__(self, maxEntries: int):
+        self.maxEntries = maxEntries
+        self.entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self.generations: "OrderedDict[str, int]" = OrderedDict()
+        self.lastGeneration = 0
+        self.floor = 0
+
+    def generation(self, namespace: str) -> int:
+        generation = self.generations.get(namespace)
+        if generation is None:
+            return self.floor
+        self.generations.move_to_end(namespace)
+        return generation
+
+    async def lookup(self, namespace: str, key: str) -> Tuple[str, Optional[bytes]]:
+        entryKey = f"{namespace}:{self.generation(namespace)}:{key}"
+        entry = self.entries.get(entryKey)
+        if entry is None:
+            return entryKey, None
+        expiresAt, value = entry
+        if expiresAt <= time.monotonic():
+            del self.entries[entryKey]
+            return entryKey, None
+        self.entries.move_to_end(entryKey)
+        return entryKey, value
+
+    async def store(self, entryKey: str, value: bytes, ttl: int) -> None:
+        self.entries[entryKey] = (time.monotonic() + ttl, value)
+        self.entries.move_to_end(entryKey)
+        if len(self.entries) > self.maxEntries:
+            self.entries.popitem(last = False)
+
+    async def invalidate(self, namespace: str) -> None:
+        self.lastGeneration += 1
+        self.generations[namespace] = self.lastGeneration
+        self.generations.move_to_end(namespace)
+        if len(self.generations) > self.maxEntries:
+            _, generation = self.generations.popitem(last = False)
+            self.floor = max(self.floor, generation)
+
+    async def close(self) -> None:
+        pass
+
+    def size(self) -> int:
+        return len(self.entries)
+
+# How long Redis keeps a namespace's generation after its last invalidation, this has to be a lot longer than any entry's TTL
+GENERATION_TTL = 60 * 60 * 24
+
+class RedisResponseCacheBackend:
+    def __init__(self, url: str):
+        # Only needed when this backend is used
+        import redis.asyncio as redis
+        self.client = redis.from_url(url)
+
+    async def lookup(self, namespace: str, key: str) -> Tuple[str, Optional[bytes]]:
+        generation = int(await self.client.get(f"responseCache:{namespace}:generation") or 0)
+        entryKey = f"responseCache:{namespace}:{generation}:{key}"
+        return entryKey, await self.client.get(entryKey)
+
+    async def store(self, entryKey: str, value: bytes, ttl: int) -> None:
+        # Redis deletes the entry once the TTL is up, which is also what gets rid of the ones from old generations
+        await self.client.set(entryKey, value, ex = ttl)
+
+    async def invalidate(self, namespace: str) -> None:
+        # The generation expires too, so there isn't one left behind for every username forever. Once it's gone the namespace
+        # starts over at 0, which is safe because every entry (of any generation) expired long before it.
+        async with self.client.pipeline(transaction = True) as pipeline:
+            pipeline.incr(f"responseCache:{namespace}:generation")
+            pipeline.expire(f"responseCache:{namespace}:generation", GENERATION_TTL)
+            await pipeline.execute()
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+    def size(self) -> Optional[int]:
+        return None
+
+class ResponseCache:
+    def __init__(self, backend):
+        self.backend = backend
+        # Responses that are being built right now, so when an entry is missing (like right after an invalidation) and a
+        # bunch of requests for it come in at once, only the first one runs the queries and the rest wait for its result
+        self.building: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    # Returns the cached response for "key" (anything orjson can encode, like a tuple of the query parameters) in "namespace",
+    # or builds it with "create" (which returns the encoded JSON) and caches it for "ttl" seconds. The second value tells
+    # whether it came from the cache. If "create" returns None (like for something that doesn't exist) nothing is cached.
+    async def getOrCreate(self, namespace: str, key, ttl: int, create: Callable[[], Awaitable[bytes]]) -> Tuple[bytes, bool]:
+        if self.backend is None:
+            return await create(), False
+        # Hashed so a long "username" search can't make a long key
+        key = hashlib.sha256(orjson.dumps(key)).hexdigest()
+        try:
+            entryKey, value = await self.backend.lookup(namespace, key)
+        except Exception as error:
+            self.errors += 1
+            print(f"Response Cache Error: {error!r}")
+            return await create(), False
+        if value is not None:
+            self.hits += 1
+            return value, True
+        self.misses += 1
+        task = self.building.get(entryKey)
+        if task is None:
+            task = asyncio.ensure_future(self.build(entryKey, ttl, create))
+            self.building[entryKey] = task
+            task.add_done_callback(lambda _: self.building.pop(entryKey, None))
+        # "shield" so a client that goes away doesn't cancel the response everyone else is waiting on
+        return await asyncio.shield(task), False
+
+    async def build(self, entryKey: str, ttl: int, create: Callable[[], Awaitable[bytes]]) -> bytes:
+        value = await create()
+        if value is None:
+            return value
+        try:
+            await self.backend.store(entryKey, value, ttl)
+        except Exception as error:
+            self.errors += 1
+            print(f"Response Cache Error: {error!r}")
+        return value
+
+    # Call this once the change is committed, calling it before lets a request that's running at the same time cache the
+    # old data under the new generation
+    async def invalidate(self, namespace: str) -> None:
+        if self.backend is None:
+            return
+        self.invalidations += 1
+        try:
+            await self.backend.invalidate(namespace)
+        except Exception as error:
+            # The change is already committed, so don't fail the request over it. The old entries still expire after their TTL.
+            self.errors += 1
+            print(f"Response Cache Error: {error!r}")
+
+    async def close(self) -> None:
+        if self.backend is not None:
+            await self.backend.close()
+
+    def toDict(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__ if self.backend else None,
+            "size": self.backend.size() if self.backend else 0,
+            "building": len(self.building),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": self.hits / lookups if lookups else None,
+            "invalidations": self.invalidations,
+            "errors": self.errors
+        }
+
+def createResponseCache() -> ResponseCache:
+    backend = (os.getenv('RESPONSE_CACHE_BACKEND') or 'memory').lower()
+    # The cached responses have image URLs in them. Presigned ones would make every rebuilt response (and its ETag) different
+    # and could expire while the response is still being served, so caching needs URLs that never change.
+    if backend != 'none' and not storage.stableUrls:
+        raise ValueError('The response cache needs S3_PUBLIC_BASE_URL (a public bucket or a CDN) when STORAGE_BACKEND is "s3", or set RESPONSE_CACHE_BACKEND to "none"!')
+    if backend == 'redis':
+        return ResponseCache(RedisResponseCacheBackend(os.getenv('REDIS_URL') or 'redis://localhost:6379/0'))
+    if backend == 'none':
+        return ResponseCache(None)
+    return ResponseCache(MemoryResponseCacheBackend(int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES') or 1000)))
+
+responseCache = createResponseCache()
+
+# How long a page of "GET /api/v1/subscriptions" is kept, and the namespace every change to a subscription (or to a user
+# that's shown in it) has to invalidate
+SUBSCRIPTION_LIST_CACHE_TTL = int(os.getenv('SUBSCRIPTION_LIST_CACHE_TTL') or 30)
+SUBSCRIPTIONS_NAMESPACE = "subscriptions"
+
+async def invalidateSubscriptionListings() -> None:
+    await responseCache.invalidate(SUBSCRIPTIONS_NAMESPACE)
+
+# A creator's profile (see "getCreatorProfile" in controllers/user.py) is cached on its own, so a change only invalidates
+# that one creator's entry. The active subscriber counts in it can be up to PROFILE_CACHE_TTL seconds old.
+PROFILE_CACHE_TTL = int(os.getenv('PROFILE_CACHE_TTL') or 30)
+
+def profileNamespace(username: str) -> str:
+    return f"profile:{username}"
+
+async def invalidateCreatorProfile(username: str) -> None:
+    await responseCache.invalidate(profileNamespace(username))
@@ -0,0 +1,146 @@
+from abc import ABC, abstractmethod
+from collections import deque
+from datetime import datetime
+from uuid import uuid4
+from typing import Dict, List, Optional, Set
+import asyncio
+
+# The in-memory queue the email outbox (utils/emailOutbox.py) and the side effects (utils/sideEffects.py) are built on. Something
+# gets "put" in the queue and a few background tasks ("workers") take it out and "handle" it. If handling fails we try again
+# later, waiting longer each time (1s, 2s, 4s, ...). Once it fails "maxAttempts" times we give up and move it to the
+# "dead letters" so we can see what went wrong.
+# While it waits out the delay before a retry it isn't in the queue, so "stop" puts those back in the queue first, that way
+# they get one last try before shutting down instead of quietly disappearing. Whatever still hasn't run once we stop waiting
+# is counted as "dropped" and moved to the dead letters.
+# Note - the queue lives in memory, so anything that's dropped when a worker shuts down is lost.
+
+class QueueEntry:
+    def __init__(self):
+        self.id = str(uuid4())
+        self.attempts = 0
+        # PENDING -> the queue's "succeededStatus" (like "SENT") or PENDING -> DEAD
+        self.status = "PENDING"
+        self.lastError: Optional[str] = None
+        self.createdAt = datetime.now()
+
+class RetryingQueue(ABC):
+    # What the entries are called in log messages, and the status they get once handled
+    entryName = "Entry"
+    succeededStatus = "DONE"
+
+    def __init__(self, concurrency: int, maxAttempts: int, retryDelay: float):
+        self.concurrency = concurrency
+        self.maxAttempts = maxAttempts
+        self.retryDelay = retryDelay
+        self.queue: Optional[asyncio.Queue] = None
+        self.workers: List[asyncio.Task] = []
+        # Entries waiting out the delay before their next attempt, by id
+        self.waitingRetries: Dict[str, asyncio.TimerHandle] = {}
+        self.waitingEntries: Dict[str, QueueEntry] = {}
+        # Entries tried right away because the workers aren't running (see "put"). The event loop only keeps a weak reference
+        # to a task, so we hold on to them here until they finish, that's also how "stop" can wait for them.
+        self.directTasks: Set[asyncio.Task] = set()
+        self.stopping = False
+        self.deadLetters = deque(maxlen = 1000)
+        self.succeeded = 0
+        self.retried = 0
+        self.dropped = 0
+
+    # Does the actual work, raising an error means it failed
+    @abstractmethod
+    async def handle(self, entry: QueueEntry) -> None:
+        ...
+
+    # What an entry is, for the log message when we give up on it
+    def describe(self, entry: QueueEntry) -> str:
+        return f"{self.entryName} {entry.id}"
+
+    def put(self, entry: QueueEntry) -> None:
+        if self.queue is None:
+            # Outside of the application (like from a script) nothing is running the workers, so just try it once right away
+            task = asyncio.get_running_loop().create_task(self.attempt(entry))
+            self.directTasks.add(task)
+            task.add_done_callback(self.directTasks.discard)
+            return
+        self.queue.put_nowait(entry)
+
+    async def attempt(self, entry: QueueEntry) -> None:
+        entry.attempts += 1
+        try:
+            await self.handle(entry)
+            entry.status = self.succeededStatus
+            self.succeeded += 1
+        except Exception as error:
+            entry.lastError = repr(error)
+            if entry.attempts >= self.maxAttempts or self.queue is None or self.stopping:
+                self.giveUp(entry)
+                return
+            # Put it back in the queue once the backoff is over
+            self.retried += 1
+            delay = self.retryDelay * (2 ** (entry.attempts - 1))
+            self.waitingEntries[entry.id] = entry
+            self.waitingRetries[entry.id] = asyncio.get_running_loop().call_later(delay, self.retry, entry)
+
+    def retry(self, entry: QueueEntry) -> None:
+        self.waitingRetries.pop(entry.id, None)
+        self.waitingEntries.pop(entry.id, None)
+        self.queue.put_nowait(entry)
+
+    def giveUp(self, entry: QueueEntry) -> None:
+        entry.status = "DEAD"
+        self.deadLetters.append(entry)
+        print(f"{self.describe(entry)} failed {entry.attempts} times, giving up: {entry.lastError}")
+
+    async def work(self) -> None:
+        while True:
+            entry = await self.queue.get()
+            try:
+                await self.attempt(entry)
+            finally:
+                self.queue.task_done()
+
+    async def start(self) -> None:
+        self.stopping = False
+        self.queue = asyncio.Queue()
+        self.workers = [asyncio.create_task(self.work()) for _ in range(self.concurrency)]
+
+    async def stop(self, timeout: float = 10) -> None:
+        await self.stopDirectTasks(timeout)
+        if self.queue is None:
+            return
+        # No more waiting between retries, everything that's waiting for one gets its last try now
+        self.stopping = True
+        for id, handle in list(self.waitingRetries.items()):
+            handle.cancel()
+            self.retry(self.waitingEntries[id])
+        # Give what's already in the queue a chance to run before shutting down
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions = True)
+        self.workers = []
+        # Whatever didn't get to run in time
+        while not self.queue.empty():
+            entry = self.queue.get_nowait()
+            entry.lastError = entry.lastError or "The worker shut down before it ran"
+            self.dropped += 1
+            self.giveUp(entry)
+        self.queue = None
+
+    # Gives the entries that were tried right away (see "put") a chance to finish, and cancels the ones that don't in time
+    async def stopDirectTasks(self, timeout: float) -> None:
+        if not self.directTasks:
+            return
+        _, unfinished = await asyncio.wait(set(self.directTasks), timeout = timeout)
+        for task in unfinished:
+            task.cancel()
+        await asyncio.gather(*unfinished, return_exceptions = True)
+        if unfinished:
+            self.dropped += len(unfinished)
+            print(f"{len(unfinished)} {self.entryName}(s) didn't finish before shutting down")
+
+    def pending(self) -> int:
+        return (self.queue.qsize() if self.queue else 0) + len(self.waitingRetries) + len(self.directTasks)
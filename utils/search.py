@@ -0,0 +1,23 @@
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.orm import InstrumentedAttribute
+from sqlalchemy import ColumnElement
+import os
+
+# The "users.username" column has a FULLTEXT index built with MySQL's "ngram" parser (see the alembic migration). The ngram
+# parser splits "support" into overlapping chunks of "ngram_token_size" characters ("su", "up", "pp", ...) and a boolean mode
+# phrase search for "ppo" becomes a search for the chunks "pp" and "po" right next to each other. That means we still get
+# "contains" matching like the old "ilike('%username%')" did, except now MySQL looks the chunks up in the index instead of
+# scanning every single row in the table.
+# This MUST match the "ngram_token_size" server variable (MySQL defaults it to 2).
+NGRAM_TOKEN_SIZE = int(os.getenv('NGRAM_TOKEN_SIZE') or 2)
+
+def usernameSearch(column: InstrumentedAttribute, username: str) -> ColumnElement[bool]:
+    # Double quotes would end the phrase early, and they can't be part of a username anyways.
+    term = username.replace('"', '').strip()
+    # A search term shorter than a single ngram can't be looked up in the FULLTEXT index. So for those we fall back to a prefix
+    # match, which CAN use the unique index on "users.username". Note that this means a one letter search only matches usernames
+    # that START with that letter. We use "startswith" instead of "ilike" because "ilike" wraps the column in "lower()" which
+    # stops MySQL from using the index, and the default collation is already case insensitive.
+    if len(term) < NGRAM_TOKEN_SIZE:
+        return column.startswith(term, autoescape = True)
+    return match(column, against = f'"{term}"').in_boolean_mode()
@@ -24,16 +24,15 @@ class MailDictionary(TypedDict):
     subject: str
     html_content: str
 
+# Note - this is syncronous and it raises an error when sending fails. Don't call it from a route handler,
+# instead put the email in the outbox (utils/emailOutbox.py) which calls this on a separate thread and
+# retries it when it fails.
 def sendEmail(data: MailDictionary):
-    try:
-        message = Mail(
-            from_email = Email(os.getenv('SENDGRID_VERIFIED_SENDER')),
-            to_emails = To(data.get('to_emails')),
-            subject = data.get('subject'),
-            html_content = Content('text/html', data.get('html_content'))
-        )
-        response = sg.send(message)
-        return response
-    except Exception as error:
-        print(f"Error: {error}")
-        # print("Something went wrong, when trying to send an email!")
\ No newline at end of file
+    message = Mail(
+        from_email = Email(os.getenv('SENDGRID_VERIFIED_SENDER')),
+        to_emails = To(data.get('to_emails')),
+        subject = data.get('subject'),
+        html_content = Content('text/html', data.get('html_content'))
+    )
+    response = sg.send(message)
+    return response
\ No newline at end of file
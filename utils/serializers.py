@@ -0,0 +1,94 @@
+from utils.storage import fileUrl
+from operator import attrgetter
+from typing import Any, Dict, List, Optional
+
+# Every controller used to build the same dictionaries by hand, especially the nested "user" dictionary which was
+# copied around about 15 times. These functions are the one place where a model gets turned into something we can
+# send back as JSON. The "attrgetter" objects are created once when this module is loaded, and pulling all the
+# attributes out of the object in a single call is quicker than reading them one at a time.
+
+# Images are saved in the database as paths (like "/static/uploads/blobs/..."), the frontend gets the URL to load them from,
+# which depends on the storage being used (see utils/storage.py)
+def variantUrls(variants: Optional[Dict[str, str]]) -> Optional[Dict[str, str]]:
+    if not variants:
+        return variants
+    return {name: fileUrl(path) for name, path in variants.items()}
+
+getUserFields = attrgetter('id', 'fullName', 'username', 'email', 'bio', 'profilePicture', 'profilePictureVariants', 'coverPicture', 'coverPictureVariants', 'role', 'createdAt', 'updatedAt')
+
+def serializeUser(user: Any) -> Dict[str, Any]:
+    id, fullName, username, email, bio, profilePicture, profilePictureVariants, coverPicture, coverPictureVariants, role, createdAt, updatedAt = getUserFields(user)
+    return {
+        "id": id,
+        "fullName": fullName,
+        "username": username,
+        "email": email,
+        "bio": bio,
+        "profilePicture": fileUrl(profilePicture),
+        "profilePictureVariants": variantUrls(profilePictureVariants),
+        "coverPicture": fileUrl(coverPicture),
+        "coverPictureVariants": variantUrls(coverPictureVariants),
+        "role": role.name,
+        "createdAt": str(createdAt),
+        "updatedAt": str(updatedAt)
+    }
+
+getSubscriptionFields = attrgetter('id', 'title', 'description', 'price', 'image', 'imageVariants', 'user_id', 'user')
+
+def serializeSubscription(subscription: Any) -> Dict[str, Any]:
+    id, title, description, price, image, imageVariants, user_id, user = getSubscriptionFields(subscription)
+    return {
+        "id": id,
+        "title": title,
+        "description": description,
+        "price": price,
+        "image": fileUrl(image),
+        "imageVariants": variantUrls(imageVariants),
+        "user_id": user_id,
+        "user": serializeUser(user)
+    }
+
+getSubscriptionTierFields = attrgetter('id', 'title', 'description', 'price', 'image', 'imageVariants', 'user_id')
+
+# A Subscription on its creator's profile, where the creator is sent once next to them instead of inside each of them
+def serializeSubscriptionTier(subscription: Any, activeSubscribers: int) -> Dict[str, Any]:
+    id, title, description, price, image, imageVariants, user_id = getSubscriptionTierFields(subscription)
+    return {
+        "id": id,
+        "title": title,
+        "description": description,
+        "price": price,
+        "image": fileUrl(image),
+        "imageVariants": variantUrls(imageVariants),
+        "user_id": user_id,
+        "activeSubscribers": activeSubscribers
+    }
+
+getCashoutFields = attrgetter('id', 'amount', 'user_id', 'user')
+
+def serializeCashout(cashout: Any) -> Dict[str, Any]:
+    id, amount, user_id, user = getCashoutFields(cashout)
+    return {
+        "id": id,
+        "amount": amount,
+        "user_id": user_id,
+        "user": serializeUser(user)
+    }
+
+getCreatorRequestFields = attrgetter('id', 'explanation', 'status', 'user_id', 'user', 'createdAt', 'updatedAt')
+
+def serializeCreatorRequest(creatorRequest: Any) -> Dict[str, Any]:
+    id, explanation, status, user_id, user, createdAt, updatedAt = getCreatorRequestFields(creatorRequest)
+    return {
+        "id": id,
+        "explanation": explanation,
+        "status": status.name,
+        "user_id": user_id,
+        "user": serializeUser(user),
+        "createdAt": str(createdAt),
+        "updatedAt": str(updatedAt)
+    }
+
+# To serialize a whole page of items in one go, e.g. serializeMany(serializeSubscription, subscriptions)
+def serializeMany(serializer, items: List[Any]) -> List[Dict[str, Any]]:
+    return [serializer(item) for item in items]
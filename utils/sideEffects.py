@@ -0,0 +1,82 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session as SyncSession
+from utils.retryingQueue import QueueEntry, RetryingQueue
+from typing import Any, Awaitable, Callable
+import os
+
+# Some work has to happen because of a change to the database, but isn't part of the database itself. Things like deleting
+# an image, archiving a Product on Stripe or sending an email. Doing that work in the middle of a transaction has two
+# problems: it blocks (SQLAlchemy's event listeners can't await anything) and it still happens if the transaction rolls back.
+# So instead, code that wants one of these "side effects" registers it on the session with "afterCommit". Nothing runs until
+# the session commits, and if it rolls back the side effects are thrown away. Once committed they are handed to a few
+# background tasks that run them, retrying the ones that fail (see utils/retryingQueue.py).
+# Note - like the email outbox this lives in memory, so side effects that still haven't run when a worker shuts down are lost.
+
+SideEffectFunction = Callable[..., Awaitable[Any]]
+
+class SideEffect(QueueEntry):
+    def __init__(self, name: str, function: SideEffectFunction, args: tuple, kwargs: dict):
+        super().__init__()
+        self.name = name
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+
+# The retrying, the dead letters and starting/stopping the background tasks come from "RetryingQueue"
+class SideEffectDispatcher(RetryingQueue):
+    entryName = "Side Effect"
+    succeededStatus = "DONE"
+
+    def __init__(self, concurrency: int, maxAttempts: int, retryDelay: float):
+        super().__init__(concurrency, maxAttempts, retryDelay)
+        self.discarded = 0
+
+    def dispatch(self, sideEffect: SideEffect) -> None:
+        self.put(sideEffect)
+
+    async def handle(self, sideEffect: SideEffect) -> None:
+        await sideEffect.function(*sideEffect.args, **sideEffect.kwargs)
+
+    def describe(self, sideEffect: SideEffect) -> str:
+        return f"Side Effect {sideEffect.id} ({sideEffect.name})"
+
+    def toDict(self):
+        return {
+            "pending": self.pending(),
+            "done": self.succeeded,
+            "retried": self.retried,
+            "discarded": self.discarded,
+            "dropped": self.dropped,
+            "deadLetters": [
+                {
+                    "id": sideEffect.id,
+                    "name": sideEffect.name,
+                    "attempts": sideEffect.attempts,
+                    "lastError": sideEffect.lastError,
+                    "createdAt": str(sideEffect.createdAt)
+                }
+                for sideEffect in self.deadLetters
+            ]
+        }
+
+sideEffectDispatcher = SideEffectDispatcher(
+    concurrency = int(os.getenv('SIDE_EFFECTS_CONCURRENCY') or 4),
+    maxAttempts = int(os.getenv('SIDE_EFFECTS_MAX_ATTEMPTS') or 5),
+    retryDelay = float(os.getenv('SIDE_EFFECTS_RETRY_DELAY') or 1)
+)
+
+# Register a side effect to run after the session commits. "session" can be an "AsyncSession" (in a controller) or the
+# syncronous "Session" SQLAlchemy hands to event listeners, they share the same "info" dictionary.
+def afterCommit(session, name: str, function: SideEffectFunction, *args, **kwargs) -> None:
+    session.info.setdefault('sideEffects', []).append(SideEffect(name, function, args, kwargs))
+
+# An "AsyncSession" runs on top of a syncronous "Session", which is the one that fires these events. Listening on the
+# "Session" class means every session in the application gets them.
+@event.listens_for(SyncSession, 'after_commit')
+def afterCommitListener(session):
+    for sideEffect in session.info.pop('sideEffects', []):
+        sideEffectDispatcher.dispatch(sideEffect)
+
+@event.listens_for(SyncSession, 'after_rollback')
+def afterRollbackListener(session):
+    sideEffectDispatcher.discarded += len(session.info.pop('sideEffects', []))
@@ -0,0 +1,227 @@
+from utils.deleteFile import deleteFile
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, NamedTuple, Optional
+from uuid import uuid4
+import aiofiles
+import asyncio
+import itertools
+import tempfile
+import os
+
+# Where uploaded files live. Everything that reads, writes or deletes an upload goes through "storage" instead of touching
+# the disk itself, so which backend we use is just a setting:
+# local - files are saved on this machine's disk (under "static/") and served by the app at "/static/...". Simple, but every
+#         worker has to share that one disk, so it only works on a single machine.
+# s3 - files are saved in an S3 bucket (or anything that speaks the S3 API, like MinIO or Cloudflare R2) and the frontend
+#      loads them straight from there, using either a public/CDN URL or a presigned URL. The image bytes never pass through
+#      our workers when they are viewed, and any number of machines can share the bucket.
+# A file is identified by its "key", which is the same path we save in the database without the first slash, like
+# "static/uploads/blobs/ab/ab12...ef.png". That way switching backends doesn't change anything in the database.
+
+CHUNK_SIZE = 1024 * 64
+# How many files "list" gets from the disk (or S3) at a time
+LIST_BATCH_SIZE = 1000
+
+# What "list" gives back for every file, "modifiedAt" is a Unix timestamp
+class StoredFile(NamedTuple):
+    key: str
+    size: int
+    modifiedAt: float
+
+class LocalStorage:
+    def __init__(self, directory: str = "."):
+        self.directory = directory
+        # "url" gives the same URL for a key every time, so it's safe to keep in a cached response
+        self.stableUrls = True
+
+    def localPath(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    # Where "receiveImageUpload" (see utils/upload.py) writes an upload while it's still coming in. It's next to the final location, so moving it
+    # into place is an atomic rename instead of a copy.
+    def temporaryDirectory(self) -> str:
+        return self.localPath("static/uploads/blobs")
+
+    # Moves a finished local file to "key". The local file is gone afterwards either way.
+    async def putFile(self, key: str, sourcePath: str, contentType: Optional[str] = None) -> None:
+        await asyncio.to_thread(self.moveIntoPlace, sourcePath, self.localPath(key))
+
+    def moveIntoPlace(self, sourcePath: str, destination: str) -> None:
+        if os.path.exists(destination):
+            # We already have this exact file (uploads are named after their content)
+            os.remove(sourcePath)
+            return
+        os.makedirs(os.path.dirname(destination), exist_ok = True)
+        os.replace(sourcePath, destination)
+
+    async def exists(self, key: str) -> bool:
+        return await asyncio.to_thread(os.path.exists, self.localPath(key))
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(deleteFile, self.localPath(key))
+
+    # Streams the file a chunk at a time
+    async def get(self, key: str) -> AsyncIterator[bytes]:
+        async with aiofiles.open(self.localPath(key), "rb") as file:
+            while True:
+                chunk = await file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+
+    # Gives a path on this machine to read the file from, for things like Pillow that need a real file
+    @asynccontextmanager
+    async def localCopy(self, key: str) -> AsyncIterator[str]:
+        yield self.localPath(key)
+
+    # Every file whose key starts with "prefix" (a folder, like "static/uploads/"). Walking the folders is blocking, so it
+    # happens on a thread a batch at a time, and the whole listing is never held in memory.
+    async def list(self, prefix: str) -> AsyncIterator[StoredFile]:
+        files = self.listSync(prefix)
+        while True:
+            batch = await asyncio.to_thread(lambda: list(itertools.islice(files, LIST_BATCH_SIZE)))
+            if not batch:
+                break
+            for storedFile in batch:
+                yield storedFile
+
+    def listSync(self, prefix: str):
+        for directory, _, names in os.walk(self.localPath(prefix)):
+            for name in names:
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    # Deleted while we were walking
+                    continue
+                yield StoredFile(
+                    key = os.path.relpath(path, self.directory).replace(os.sep, "/"),
+                    size = stat.st_size,
+                    modifiedAt = stat.st_mtime
+                )
+
+    async def move(self, key: str, destinationKey: str) -> None:
+        await asyncio.to_thread(self.moveSync, self.localPath(key), self.localPath(destinationKey))
+
+    def moveSync(self, path: str, destination: str) -> None:
+        os.makedirs(os.path.dirname(destination), exist_ok = True)
+        os.replace(path, destination)
+
+    # The URL the frontend loads the file from, served by the "/static" mount in "app.py"
+    def url(self, key: str) -> str:
+        return f"/{key}"
+
+class S3Storage:
+    def __init__(self, bucket: str, endpointUrl: Optional[str], region: Optional[str], publicBaseUrl: Optional[str], presignedUrlExpires: int):
+        # Only needed when this backend is used
+        import boto3
+        from botocore.config import Config
+        self.bucket = bucket
+        self.publicBaseUrl = publicBaseUrl.rstrip("/") if publicBaseUrl else None
+        self.presignedUrlExpires = presignedUrlExpires
+        # A presigned URL is different every time it's made (it has the time it was signed in it) and stops working once it
+        # expires, so only a public/CDN URL can be kept in a cached response (see "utils/responseCache.py")
+        self.stableUrls = self.publicBaseUrl is not None
+        # boto3 clients are safe to share between threads. Its calls are blocking, so every one of them runs on a thread.
+        self.client = boto3.client(
+            "s3",
+            endpoint_url = endpointUrl,
+            region_name = region,
+            config = Config(max_pool_connections = 20, signature_version = "s3v4")
+        )
+
+    def temporaryDirectory(self) -> str:
+        return tempfile.gettempdir()
+
+    async def putFile(self, key: str, sourcePath: str, contentType: Optional[str] = None) -> None:
+        try:
+            if await self.exists(key):
+                return
+            extraArgs = {}
+            if contentType:
+                extraArgs["ContentType"] = contentType
+            if key.startswith("static/uploads/"):
+                # Same as "utils/cachedStaticFiles.py", an upload's key never gets reused for different content
+                extraArgs["CacheControl"] = "public, max-age=31536000, immutable"
+            # "upload_file" streams from the file on disk, and switches to a multipart upload for big files
+            await asyncio.to_thread(self.client.upload_file, sourcePath, self.bucket, key, ExtraArgs = extraArgs)
+        finally:
+            await asyncio.to_thread(deleteFile, sourcePath)
+
+    async def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+        try:
+            await asyncio.to_thread(self.client.head_object, Bucket = self.bucket, Key = key)
+            return True
+        except ClientError as error:
+            if error.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self.client.delete_object, Bucket = self.bucket, Key = key)
+
+    async def get(self, key: str) -> AsyncIterator[bytes]:
+        response = await asyncio.to_thread(self.client.get_object, Bucket = self.bucket, Key = key)
+        body = response["Body"]
+        try:
+            while True:
+                chunk = await asyncio.to_thread(body.read, CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            body.close()
+
+    @asynccontextmanager
+    async def localCopy(self, key: str) -> AsyncIterator[str]:
+        path = os.path.join(tempfile.gettempdir(), f"{uuid4()}{os.path.splitext(key)[1]}")
+        try:
+            await asyncio.to_thread(self.client.download_file, self.bucket, key, path)
+            yield path
+        finally:
+            await asyncio.to_thread(deleteFile, path)
+
+    # S3 hands out the listing a page (up to 1000 keys) at a time, each page is fetched on a thread when we get to it
+    async def list(self, prefix: str) -> AsyncIterator[StoredFile]:
+        pages = iter(self.client.get_paginator("list_objects_v2").paginate(Bucket = self.bucket, Prefix = prefix))
+        while True:
+            page = await asyncio.to_thread(next, pages, None)
+            if page is None:
+                break
+            for item in page.get("Contents", []):
+                yield StoredFile(key = item["Key"], size = item["Size"], modifiedAt = item["LastModified"].timestamp())
+
+    # S3 can't rename, so it's a copy (done inside S3, the bytes don't come through us) and then a delete
+    async def move(self, key: str, destinationKey: str) -> None:
+        await asyncio.to_thread(self.client.copy, {"Bucket": self.bucket, "Key": key}, self.bucket, destinationKey)
+        await self.delete(key)
+
+    def url(self, key: str) -> str:
+        if self.publicBaseUrl:
+            return f"{self.publicBaseUrl}/{key}"
+        # Signing happens locally, it doesn't make a request to S3
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params = {"Bucket": self.bucket, "Key": key},
+            ExpiresIn = self.presignedUrlExpires
+        )
+
+def createStorage():
+    if (os.getenv('STORAGE_BACKEND') or 'local').lower() == 's3':
+        return S3Storage(
+            bucket = os.getenv('S3_BUCKET'),
+            endpointUrl = os.getenv('S3_ENDPOINT_URL') or None,
+            region = os.getenv('S3_REGION') or None,
+            publicBaseUrl = os.getenv('S3_PUBLIC_BASE_URL') or None,
+            presignedUrlExpires = int(os.getenv('S3_PRESIGNED_URL_EXPIRES') or 3600)
+        )
+    return LocalStorage()
+
+storage = createStorage()
+
+# Turns a path saved in the database (like "/static/uploads/blobs/ab/ab12...ef.png") into the URL the frontend should use
+def fileUrl(path: Optional[str]) -> Optional[str]:
+    if not path:
+        return path
+    return storage.url(path.lstrip("/"))
@@ -1,7 +1,39 @@
+from typing import List, Tuple, Dict
+import asyncio
 import stripe
 import os
 
 def getStripe() -> stripe:
     # Set Stripe API Key
     stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
-    return stripe
\ No newline at end of file
+    return stripe
+
+# The most Stripe cancellations we have going at once, so deleting a Subscription with thousands of Purchases doesn't
+# hit Stripe's rate limit.
+STRIPE_CANCEL_CONCURRENCY = int(os.getenv('STRIPE_CANCEL_CONCURRENCY') or 10)
+# How many cancellations "deleteSubscription" sends before it saves which ones went through
+STRIPE_CANCEL_BATCH_SIZE = int(os.getenv('STRIPE_CANCEL_BATCH_SIZE') or 200)
+
+async def cancelStripeSubscriptions(stripeSubscriptionIds: List[str]) -> Tuple[List[str], List[Dict[str, str]]]:
+    # Returns the ids that were canceled, and the ids that failed along with why
+    stripe = getStripe()
+    semaphore = asyncio.Semaphore(STRIPE_CANCEL_CONCURRENCY)
+    async def cancel(stripeSubscriptionId: str) -> None:
+        async with semaphore:
+            await stripe.Subscription.cancel_async(stripeSubscriptionId)
+    results = await asyncio.gather(
+        *[cancel(stripeSubscriptionId) for stripeSubscriptionId in stripeSubscriptionIds],
+        return_exceptions = True
+    )
+    canceled = []
+    failed = []
+    for stripeSubscriptionId, result in zip(stripeSubscriptionIds, results):
+        if isinstance(result, Exception):
+            # Stripe says the Subscription was already canceled, so it's done as far as we care
+            if isinstance(result, stripe.InvalidRequestError) and result.code == 'resource_missing':
+                canceled.append(stripeSubscriptionId)
+            else:
+                failed.append({"stripe_subscription_id": stripeSubscriptionId, "error": str(result)})
+        else:
+            canceled.append(stripeSubscriptionId)
+    return (canceled, failed)
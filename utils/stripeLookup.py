@@ -0,0 +1,87 @@
+from database.models.User import User
+from database.models.Subscription import Subscription
+from utils.stripe import getStripe
+from sqlalchemy import select, event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from collections import OrderedDict
+from typing import Optional
+import os
+
+# Every Stripe webhook needs to know which User (from the "customer") and which Subscription (from the "product") it's
+# about. We used to ask Stripe for the Customer and the Product just to read the ids we put in their metadata, that's two
+# network round trips per event. But we already store that exact mapping ourselves in "User.customer_id" and
+# "Subscription.product_id". So now we look it up in our own (indexed) tables, remember the answer in memory, and only ask
+# Stripe when we can't find it locally.
+
+class LookupCache:
+    def __init__(self, maxSize: int):
+        self.maxSize = maxSize
+        self.entries: "OrderedDict[str, str]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxSize:
+            self.entries.popitem(last = False)
+
+    def delete(self, key: Optional[str]) -> None:
+        if key is not None:
+            self.entries.pop(key, None)
+
+# customer_id -> user_id
+customerCache = LookupCache(int(os.getenv('STRIPE_LOOKUP_CACHE_SIZE') or 10000))
+# product_id -> subscription_id
+productCache = LookupCache(int(os.getenv('STRIPE_LOOKUP_CACHE_SIZE') or 10000))
+
+async def resolveUserId(session: AsyncSession, customer_id: str) -> str:
+    user_id = customerCache.get(customer_id)
+    if user_id:
+        return user_id
+    user_id = (await session.execute(
+        select(User.id).filter(User.customer_id == customer_id)
+    )).scalar()
+    if not user_id:
+        stripe = getStripe()
+        user_id = (await stripe.Customer.retrieve_async(customer_id)).metadata.user_id
+    customerCache.set(customer_id, user_id)
+    return user_id
+
+async def resolveSubscriptionId(session: AsyncSession, product_id: str) -> str:
+    subscription_id = productCache.get(product_id)
+    if subscription_id:
+        return subscription_id
+    subscription_id = (await session.execute(
+        select(Subscription.id).filter(Subscription.product_id == product_id)
+    )).scalar()
+    if not subscription_id:
+        stripe = getStripe()
+        subscription_id = (await stripe.Product.retrieve_async(product_id)).metadata.subscription_id
+    productCache.set(product_id, subscription_id)
+    return subscription_id
+
+# Keep the caches correct when a User or Subscription changes. When a "customer_id"/"product_id" gets changed we forget
+# both the old value and the new one, and when a row gets deleted we forget its value. Note - each uvicorn worker has its
+# own cache, so this only clears the cache of the worker that made the change.
+def forgetValues(cache: LookupCache, target, key: str) -> None:
+    # We read the values through "inspect" so an attribute that isn't loaded doesn't trigger a query
+    state = inspect(target)
+    history = state.attrs[key].history
+    for value in [*history.deleted, *history.added, state.dict.get(key)]:
+        cache.delete(value)
+
+def afterChangingUserListener(mapper, connection, target):
+    forgetValues(customerCache, target, 'customer_id')
+
+def afterChangingSubscriptionListener(mapper, connection, target):
+    forgetValues(productCache, target, 'product_id')
+
+event.listen(User, 'after_update', afterChangingUserListener)
+event.listen(User, 'after_delete', afterChangingUserListener)
+event.listen(Subscription, 'after_update', afterChangingSubscriptionListener)
+event.listen(Subscription, 'after_delete', afterChangingSubscriptionListener)
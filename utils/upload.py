@@ -0,0 +1,120 @@
+from fastapi import UploadFile
+from utils.custom_error import CustomError
+from utils.status_codes import StatusCodes
+from utils.blobStore import blobLocation, retainBlob
+from utils.storage import storage
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import NamedTuple, Optional
+from uuid import uuid4
+import aiofiles
+import asyncio
+import hashlib
+import os
+
+# Every image upload (profile pictures, cover pictures and subscription images) is saved through "saveImageUpload" (or its two halves,
+# "receiveImageUpload" and "storeImageUpload", when the route has to call Stripe in between). It used
+# to be "content = await upload.read()" followed by a single write, so the entire file sat in memory, and the size limit was
+# checked with "upload.size" and the type with "content_type", both of which come from the client. Now we:
+# 1 - Read the upload a chunk at a time and write each chunk to a temporary file right away, so memory use per upload is
+#     one chunk no matter how big the file is.
+# 2 - Count the bytes as they come in and stop as soon as there are more than "maxSize". The whole request was already
+#     limited while it was being received (see middleware/upload_size_limit.py), this is the limit for each image.
+# 3 - Check the first bytes of the file (the "magic bytes") to know what kind of image it really is.
+# 4 - Hash the bytes as they come in, and save the image under that hash in the blob store (see utils/blobStore.py). If
+#     the exact same image was uploaded before we keep the copy we already have.
+# 5 - Hand the finished file to the storage (see utils/storage.py). On the local disk that's a rename, which is atomic, so
+#     nobody ever sees a half written image at a "static/uploads/..." URL, and a failed upload leaves nothing behind.
+
+MAX_IMAGE_SIZE = (1024 * 1024) * 2
+IMAGE_CONTENT_TYPES = {"jpg": "image/jpeg", "png": "image/png", "gif": "image/gif", "webp": "image/webp"}
+UPLOAD_CHUNK_SIZE = 1024 * 64
+
+# The bytes every file of each image type starts with, and the extension we save it with
+def sniffImageExtension(header: bytes) -> Optional[str]:
+    if header.startswith(b'\xff\xd8\xff'):
+        return 'jpg'
+    if header.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if header.startswith(b'GIF87a') or header.startswith(b'GIF89a'):
+        return 'gif'
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+# What "receiveImageUpload" gives back, a checked image sitting in a temporary file that isn't anywhere the frontend can see yet
+class ReceivedUpload(NamedTuple):
+    temporaryLocation: str
+    sha256: str
+    extension: str
+    size: int
+
+# Steps 1 to 3, the part that can reject the upload. It doesn't touch the database, so a route that also has to call
+# something slow (like Stripe) can do this first, and only call "storeImageUpload" (which locks the blob's row) once that's
+# done. "name" is what the upload is called in error messages, like "Profile Picture".
+async def receiveImageUpload(upload: UploadFile, name: str, maxSize: int = MAX_IMAGE_SIZE) -> ReceivedUpload:
+    # Cheap checks first, these come from the client so they only let us say no early, never yes
+    if upload.size == 0:
+        raise CustomError('Please check all inputs!', StatusCodes.BAD_REQUEST)
+    if upload.content_type and not upload.content_type.startswith('image'):
+        raise CustomError(f'{name} must be an Image!', StatusCodes.BAD_REQUEST)
+    if upload.size is not None and upload.size > maxSize:
+        raise CustomError(f'The {name.lower()} size must not exceed {maxSize // (1024 * 1024)}MB!', StatusCodes.BAD_REQUEST)
+    # Where the temporary file goes depends on the storage (see utils/storage.py), on the local disk it's right next to where
+    # the file ends up, that way moving it into place doesn't have to copy anything
+    temporaryDirectory = storage.temporaryDirectory()
+    await asyncio.to_thread(os.makedirs, temporaryDirectory, exist_ok = True)
+    temporaryLocation = os.path.join(temporaryDirectory, f".{uuid4()}.part")
+    size = 0
+    extension = None
+    sha256 = hashlib.sha256()
+    try:
+        async with aiofiles.open(temporaryLocation, "wb") as file:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                if extension is None:
+                    # The first chunk is always big enough to hold the magic bytes of every type we accept
+                    extension = sniffImageExtension(chunk)
+                    if extension is None:
+                        raise CustomError(f'{name} must be an Image!', StatusCodes.BAD_REQUEST)
+                size += len(chunk)
+                if size > maxSize:
+                    raise CustomError(f'The {name.lower()} size must not exceed {maxSize // (1024 * 1024)}MB!', StatusCodes.BAD_REQUEST)
+                sha256.update(chunk)
+                await file.write(chunk)
+        if size == 0:
+            raise CustomError('Please check all inputs!', StatusCodes.BAD_REQUEST)
+        return ReceivedUpload(temporaryLocation, sha256.hexdigest(), extension, size)
+    except BaseException:
+        # Too big, not an image or the client went away, either way don't leave the partial file behind
+        await discardImageUpload(temporaryLocation)
+        raise
+
+# Steps 4 and 5. Returns the location of the saved file, like "static/uploads/blobs/ab/ab12...ef.png". The upload counts as a
+# reference to that blob as soon as "session" commits, so it has to be the session that saves the row using it.
+async def storeImageUpload(session: AsyncSession, received: ReceivedUpload) -> str:
+    try:
+        # Name the file after its content, and give it the extension of what it really is, not what the client said it is
+        location = blobLocation(received.sha256, received.extension)
+        # Count the reference first, this locks the blob's row so it can't get deleted while we put the file in place
+        await retainBlob(session, received.sha256, location, received.size)
+        await storage.putFile(location, received.temporaryLocation, IMAGE_CONTENT_TYPES[received.extension])
+        return location
+    except BaseException:
+        await discardImageUpload(received.temporaryLocation)
+        raise
+
+# Both steps at once, for the routes that have nothing slow to do in between
+async def saveImageUpload(session: AsyncSession, upload: UploadFile, name: str, maxSize: int = MAX_IMAGE_SIZE) -> str:
+    return await storeImageUpload(session, await receiveImageUpload(upload, name, maxSize))
+
+# For a received upload that ends up not being used (like when the request fails after "receiveImageUpload")
+async def discardImageUpload(temporaryLocation: str) -> None:
+    await asyncio.to_thread(removeIfExists, temporaryLocation)
+
+def removeIfExists(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
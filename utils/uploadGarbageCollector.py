@@ -0,0 +1,169 @@
+# Finds uploaded files that nothing in the database points at anymore and gets rid of them. Run it from the root of the
+# project with "python -m utils.uploadGarbageCollector". By default it only reports what it would do, add:
+# --quarantine - to move every orphaned file to "quarantine/<its key>" instead, so it can be moved back if something breaks
+# --delete - to delete them for good
+# --grace-hours N - to only touch files older than N hours (24 by default, or UPLOAD_GC_GRACE_HOURS)
+# Files end up orphaned when a request fails after its upload was saved (the transaction rolls back but the file stays),
+# when a row is deleted without letting go of its image, or when a side effect that deletes a file runs out of retries.
+# How it works:
+# 1 - Every image referenced by "users.profilePicture", "users.coverPicture" and "subscriptions.image" is read into a set.
+#     The rows are streamed from a server side cursor ("yield_per"), so MySQL sends them in batches instead of us loading
+#     every row at once.
+# 2 - Every file under "static/uploads/" is listed from the storage (see utils/storage.py), a batch at a time. A file is
+#     in use if it's one of those images or a resized copy of one (see utils/imageVariants.py).
+# 3 - Files newer than the grace period are left alone, an upload that's still in the middle of its request has a file but
+#     no committed row yet.
+# 4 - Files in the blob store (see utils/blobStore.py) are only removed while holding a lock on their "upload_blobs" row
+#     and only if it doesn't count any references, the same as "collectBlobSideEffect". So a blob that's being uploaded again
+#     at the same time is never removed out from under that upload.
+from dotenv import load_dotenv
+load_dotenv()
+from utils.getDatabaseInformation import getDatabaseInformation
+from utils.blobStore import BLOB_DIRECTORY
+from utils.imageVariants import IMAGE_VARIANTS
+from utils.storage import storage, StoredFile
+from database.Session import engine
+from sqlalchemy import select
+from typing import List, Set
+import argparse
+import asyncio
+import time
+import os
+import re
+
+UPLOADS_PREFIX = "static/uploads/"
+QUARANTINE_PREFIX = "quarantine/"
+# Placeholders that keep the upload folders in git
+KEEP_FILES = {"note.txt"}
+# "<original without extension>_<variant>.<format>", see "variantLocation" in utils/imageVariants.py
+VARIANT_PATTERN = re.compile(rf"^(.*)_({'|'.join(IMAGE_VARIANTS)})$")
+# How often a progress line gets printed
+REPORT_EVERY = 10000
+
+class GarbageCollectionStatistics:
+    def __init__(self):
+        self.startedAt = time.monotonic()
+        self.scanned = 0
+        self.scannedBytes = 0
+        self.referenced = 0
+        self.tooNew = 0
+        # Orphaned files in the blob store whose "upload_blobs" row still counts references, the count is off (or a
+        # transaction using it hasn't committed yet) so we leave it to "utils/blobStore.py"
+        self.stillCounted = 0
+        self.orphaned = 0
+        self.orphanedBytes = 0
+        self.failed = 0
+
+    def report(self, prefix: str) -> None:
+        elapsed = time.monotonic() - self.startedAt
+        print(
+            f"{prefix}: scanned {self.scanned} file(s) ({self.scannedBytes / (1024 * 1024):.1f}MB) in {elapsed:.1f}s "
+            f"({self.scanned / elapsed if elapsed else 0:.0f} files/s), {self.referenced} in use, {self.tooNew} newer than "
+            f"the grace period, {self.stillCounted} still counted in upload_blobs, {self.orphaned} orphaned "
+            f"({self.orphanedBytes / (1024 * 1024):.1f}MB), {self.failed} failed"
+        )
+
+# The paths saved in the database, without the first slash and without the extension, so the variants (which have a
+# different extension) can be matched against them too
+async def referencedStems(batchSize: int) -> Set[str]:
+    Session, Models = getDatabaseInformation()
+    stems = set()
+    async with Session() as session:
+        for column in (Models.User.profilePicture, Models.User.coverPicture, Models.Subscription.image):
+            rows = await session.stream(
+                select(column).filter(column.is_not(None)).execution_options(yield_per = batchSize)
+            )
+            async for (path,) in rows:
+                if path:
+                    stems.add(os.path.splitext(path.lstrip("/"))[0])
+    return stems
+
+def isReferenced(key: str, stems: Set[str]) -> bool:
+    stem = os.path.splitext(key)[0]
+    if stem in stems:
+        return True
+    variant = VARIANT_PATTERN.match(stem)
+    return bool(variant) and variant.group(1) in stems
+
+# The SHA-256 a blob store file is named after, for the original and for its variants
+def blobHash(key: str) -> str:
+    return VARIANT_PATTERN.sub(r"\1", os.path.splitext(os.path.basename(key))[0])
+
+async def removeFile(storedFile: StoredFile, mode: str) -> None:
+    if mode == "quarantine":
+        await storage.move(storedFile.key, QUARANTINE_PREFIX + storedFile.key)
+    elif mode == "delete":
+        await storage.delete(storedFile.key)
+
+async def removeOrphans(orphans: List[StoredFile], mode: str, statistics: GarbageCollectionStatistics) -> None:
+    Session, Models = getDatabaseInformation()
+    blobFiles = [storedFile for storedFile in orphans if storedFile.key.startswith(BLOB_DIRECTORY + "/")]
+    async with Session() as session:
+        # Lock the rows of every blob in this batch (or the gap where a missing row would go) until we are done with the files
+        blobsRawQuery = await session.execute(
+            select(Models.UploadBlob).filter(
+                Models.UploadBlob.hash.in_({blobHash(storedFile.key) for storedFile in blobFiles})
+            ).with_for_update()
+        ) if blobFiles else None
+        blobs = {blob.hash: blob for blob in blobsRawQuery.scalars()} if blobsRawQuery else {}
+        for storedFile in orphans:
+            blob = blobs.get(blobHash(storedFile.key)) if storedFile.key.startswith(BLOB_DIRECTORY + "/") else None
+            if blob and blob.refCount > 0:
+                statistics.stillCounted += 1
+                continue
+            statistics.orphaned += 1
+            statistics.orphanedBytes += storedFile.size
+            print(f"{'Would remove' if mode == 'dry-run' else 'Removing'} {storedFile.key} ({storedFile.size} bytes)")
+            try:
+                await removeFile(storedFile, mode)
+            except Exception as error:
+                statistics.failed += 1
+                print(f"Could not remove {storedFile.key}: {error!r}")
+                continue
+            # The original is gone, so is the row counting it
+            if blob and mode != "dry-run" and blob.location == storedFile.key:
+                await session.delete(blob)
+        await session.commit()
+
+async def collectGarbage(mode: str, graceHours: float, batchSize: int) -> None:
+    statistics = GarbageCollectionStatistics()
+    stems = await referencedStems(batchSize)
+    print(f"{len(stems)} image(s) referenced in the database, read in {time.monotonic() - statistics.startedAt:.1f}s")
+    cutoff = time.time() - graceHours * 3600
+    orphans = []
+    async for storedFile in storage.list(UPLOADS_PREFIX):
+        statistics.scanned += 1
+        statistics.scannedBytes += storedFile.size
+        if statistics.scanned % REPORT_EVERY == 0:
+            statistics.report("Progress")
+        if os.path.basename(storedFile.key) in KEEP_FILES:
+            continue
+        if isReferenced(storedFile.key, stems):
+            statistics.referenced += 1
+            continue
+        if storedFile.modifiedAt > cutoff:
+            statistics.tooNew += 1
+            continue
+        orphans.append(storedFile)
+        if len(orphans) >= batchSize:
+            await removeOrphans(orphans, mode, statistics)
+            orphans = []
+    if orphans:
+        await removeOrphans(orphans, mode, statistics)
+    statistics.report("Done" if mode != "dry-run" else "Dry run, nothing was changed")
+
+async def main():
+    parser = argparse.ArgumentParser(description = "Removes uploaded files that nothing in the database uses")
+    action = parser.add_mutually_exclusive_group()
+    action.add_argument("--quarantine", action = "store_const", dest = "mode", const = "quarantine")
+    action.add_argument("--delete", action = "store_const", dest = "mode", const = "delete")
+    parser.add_argument("--grace-hours", type = float, default = float(os.getenv('UPLOAD_GC_GRACE_HOURS') or 24))
+    parser.add_argument("--batch-size", type = int, default = 1000)
+    arguments = parser.parse_args()
+    try:
+        await collectGarbage(arguments.mode or "dry-run", arguments.grace_hours, arguments.batch_size)
+    finally:
+        await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,163 @@
+from utils.getDatabaseInformation import getDatabaseInformation
+from utils.enums import WebhookEventStatus
+from utils.stripe import getStripe
+from stripeWebhookEventHandlers.subscription_created import subscriptionCreated
+from stripeWebhookEventHandlers.subscription_updated import subscriptionUpdated
+from sqlalchemy import select, update
+from datetime import datetime, timedelta
+from typing import Optional
+import asyncio
+import os
+
+# The Stripe Event types we care about, and the function that handles each one. Any other event type is
+# acknowledged and ignored without being saved.
+webhookEventHandlers = {
+    "customer.subscription.created": subscriptionCreated,
+    "customer.subscription.updated": subscriptionUpdated
+}
+
+# The Stripe webhook route only verifies the event, saves it to the "webhook_events" table and responds. Everything
+# else happens here, in a background task that runs in every uvicorn worker:
+# 1 - Claim a batch of events that are due. "FOR UPDATE SKIP LOCKED" makes sure two workers never claim the same event,
+#     and claiming pushes "nextAttemptAt" forward by "leaseTime" so if this worker dies mid way the event gets picked
+#     back up once the lease runs out.
+# 2 - Run the handler for each event, in the order Stripe created them.
+# 3 - Mark each event "PROCESSED", or "FAILED" with a growing delay before the next attempt, or "DEAD" once it failed
+#     "maxAttempts" times.
+# Events for the same Stripe Subscription can show up out of order (e.g. "updated" before "created"). That's fine, the
+# "updated" handler checks that the Purchase exists first and fails (raises) when it doesn't, so it's retried here after the
+# "created" event has saved it.
+class WebhookQueue:
+    def __init__(self, batchSize: int, pollInterval: float, leaseTime: float, maxAttempts: int, retryDelay: float):
+        self.batchSize = batchSize
+        self.pollInterval = pollInterval
+        self.leaseTime = leaseTime
+        self.maxAttempts = maxAttempts
+        self.retryDelay = retryDelay
+        self.task: Optional[asyncio.Task] = None
+        self.wakeUp: Optional[asyncio.Event] = None
+        # Metrics for this worker
+        self.received = 0
+        self.duplicates = 0
+        self.ignored = 0
+        self.processed = 0
+        self.failed = 0
+        self.dead = 0
+
+    # Called by the webhook route after saving an event, so this worker processes it right away instead of waiting
+    # for the next poll.
+    def notify(self) -> None:
+        if self.wakeUp:
+            self.wakeUp.set()
+
+    async def claimBatch(self):
+        Session, Models = getDatabaseInformation()
+        async with Session() as session:
+            now = datetime.now()
+            events = (await session.execute(
+                select(Models.WebhookEvent).filter(
+                    Models.WebhookEvent.status.in_([
+                        WebhookEventStatus.PENDING,
+                        WebhookEventStatus.FAILED,
+                        WebhookEventStatus.PROCESSING
+                    ]),
+                    Models.WebhookEvent.nextAttemptAt <= now
+                ).order_by(
+                    Models.WebhookEvent.createdAt
+                ).limit(self.batchSize).with_for_update(skip_locked = True)
+            )).scalars().all()
+            for event in events:
+                event.status = WebhookEventStatus.PROCESSING
+                event.attempts = event.attempts + 1
+                event.nextAttemptAt = now + timedelta(seconds = self.leaseTime)
+            # Stripe puts the time the event was created in the payload, which is a better order than when we received it
+            claimed = sorted(
+                [(event.id, event.type, event.payload, event.attempts) for event in events],
+                key = lambda claimedEvent: claimedEvent[2].get('created', 0)
+            )
+            await session.commit()
+            return claimed
+
+    async def finish(self, id: str, values: dict) -> None:
+        Session, Models = getDatabaseInformation()
+        async with Session() as session:
+            await session.execute(
+                update(Models.WebhookEvent).filter(
+                    Models.WebhookEvent.id == id
+                ).values(**values)
+            )
+            await session.commit()
+
+    async def processEvent(self, id: str, type: str, payload: dict, attempts: int) -> None:
+        stripe = getStripe()
+        try:
+            # Turn the saved payload back into the same "Event" object "stripe.Webhook.construct_event" gave us
+            event = stripe.Event.construct_from(payload, stripe.api_key)
+            await webhookEventHandlers[type](event, getDatabaseInformation())
+        except Exception as error:
+            lastError = repr(error)[:1000]
+            if attempts >= self.maxAttempts:
+                self.dead += 1
+                print(f"Webhook Event {id} ({type}) failed {attempts} times, giving up: {lastError}")
+                await self.finish(id, {"status": WebhookEventStatus.DEAD, "lastError": lastError})
+            else:
+                self.failed += 1
+                await self.finish(id, {
+                    "status": WebhookEventStatus.FAILED,
+                    "lastError": lastError,
+                    "nextAttemptAt": datetime.now() + timedelta(seconds = self.retryDelay * (2 ** (attempts - 1)))
+                })
+            return
+        self.processed += 1
+        await self.finish(id, {"status": WebhookEventStatus.PROCESSED, "lastError": None})
+
+    async def run(self) -> None:
+        while True:
+            # Cleared before claiming, not after, so a "notify()" for an event saved while we are busy with this batch is
+            # still set when we get to the wait below, and that event gets picked up right away instead of after "pollInterval"
+            self.wakeUp.clear()
+            try:
+                claimed = await self.claimBatch()
+                for claimedEvent in claimed:
+                    await self.processEvent(*claimedEvent)
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                # Something like the database being unreachable, just wait and try again
+                print(f"Webhook Queue Error: {error}")
+                claimed = []
+            # If we got a full batch there is probably more waiting, so go again right away
+            if len(claimed) == self.batchSize:
+                continue
+            try:
+                await asyncio.wait_for(self.wakeUp.wait(), self.pollInterval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def start(self) -> None:
+        self.wakeUp = asyncio.Event()
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions = True)
+            self.task = None
+
+    def toDict(self):
+        return {
+            "received": self.received,
+            "duplicates": self.duplicates,
+            "ignored": self.ignored,
+            "processed": self.processed,
+            "failed": self.failed,
+            "dead": self.dead
+        }
+
+webhookQueue = WebhookQueue(
+    batchSize = int(os.getenv('WEBHOOK_QUEUE_BATCH_SIZE') or 20),
+    pollInterval = float(os.getenv('WEBHOOK_QUEUE_POLL_INTERVAL') or 5),
+    leaseTime = float(os.getenv('WEBHOOK_QUEUE_LEASE_TIME') or 300),
+    maxAttempts = int(os.getenv('WEBHOOK_QUEUE_MAX_ATTEMPTS') or 8),
+    retryDelay = float(os.getenv('WEBHOOK_QUEUE_RETRY_DELAY') or 5)
+)